@@ -25,12 +25,27 @@ INSTALLED_APPS = [
 ]
 
 CRONJOBS = [
-    ('00 00 * * *', 'django.core.management.call_command', ['build_models'], {},
+    # 平时增量构建特征模型，每周日全量构建一次以处理删除类的变化
+    ('00 00 * * 1-6', 'django.core.management.call_command', ['build_models'],
+     {'incremental': True}, '>> /var/log/run.log'),
+    ('00 00 * * 0', 'django.core.management.call_command', ['build_models'], {},
      '>> /var/log/run.log'),
+    # 修正冗余计数字段的偏差
+    ('30 00 * * 0', 'django.core.management.call_command', ['reconcile_counters'], {},
+     '>> /var/log/run.log'),
+    # 截断动态收件箱
+    ('00 01 * * *', 'django.core.management.call_command', ['build_timelines'], {},
+     '>> /var/log/run.log'),
+    # 清理过期的通知
+    ('30 01 * * *', 'django.core.management.call_command', ['send_notifications'],
+     {'purge': True}, '>> /var/log/run.log'),
 ]
 
 ROOT_URLCONF = 'ChuangYi.urls'
-MIDDLEWARE_CLASSES = ['main.utils.abort.AbortExceptionHandler']
+MIDDLEWARE_CLASSES = [
+    'main.utils.query_budget.QueryBudgetMiddleware',
+    'main.utils.abort.AbortExceptionHandler',
+]
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -96,6 +111,68 @@ UPLOADED_ROOT = os.path.join(BASE_DIR, 'uploaded')
 SERVER_URL = 'http://chuangyh.com:8000/'
 DEFAULT_ICON_URL = 'http://chuangyh.com:8000/uploaded/default_icon.jpg'
 
+# Token cache
+TOKEN_CACHE_SIZE = 100000           # 进程内令牌缓存的最大条目数
+TOKEN_CACHE_TTL = 60                # 令牌缓存的有效期（秒）
+TOKEN_VERSION_CHECK_INTERVAL = 10   # 检查令牌版本的间隔（秒），其他进程的修改在此时间后生效
+
+# System snapshot
+SYSTEM_VERSION_CHECK_INTERVAL = 10  # 检查系统设定版本的间隔（秒）
+PERMISSION_VERSION_CHECK_INTERVAL = 10  # 检查管理端权限版本的间隔（秒）
+
+# App log
+APP_LOG_BUFFER_SIZE = 100000        # 日志缓冲区的最大条数，写入跟不上时丢弃最早的日志
+APP_LOG_FLUSH_SIZE = 500            # 缓冲日志达到此数量时立即写入
+APP_LOG_FLUSH_INTERVAL = 5          # 日志最长缓冲时间（秒）
+APP_EVENT_CACHE_TTL = 300           # 事件奖励积分缓存的有效期（秒）
+
+# IP limit
+IP_LIMIT_SYNC_INTERVAL = 10         # 同步限流参数和锁定名单的间隔（秒）
+IP_LIMIT_CACHE_SIZE = 100000        # 进程内限流计数器的最大 IP 数
+IP_LIMIT_REDIS_URL = None           # 设置后使用 Redis 保存限流计数，各进程共享，如 'redis://localhost:6379/0'
+
+# Query stats
+QUERY_STATS = False                 # 是否统计每个请求的 SQL 查询数与耗时，关闭时中间件不做任何事
+QUERY_BUDGET = None                 # 单个请求允许的最大查询数，None 表示不限
+QUERY_BUDGET_STRICT = False         # 超出查询数时是否抛出异常（测试中开启）
+QUERY_REPEAT_THRESHOLD = 5          # 同一形状的查询出现多少次视为 N+1 查询
+
+# Pagination
+COUNT_CACHE_SIZE = 10000            # 进程内列表总数缓存的最大条目数
+COUNT_CACHE_TTL = 60                # 列表总数缓存的有效期（秒），期间返回的总数可能略有偏差
+
+# Timeline
+TIMELINE_FANOUT_LIMIT = 1000        # 关注者超过此数量的对象不写入收件箱，读取时直接拉取其动态
+TIMELINE_SIZE = 1000                # 每个收件箱保留的最近动态数
+TIMELINE_BACKFILL = 50              # 关注对象时补写其最近的动态数
+TIMELINE_BATCH_SIZE = 1000          # 写入收件箱时每批插入的行数
+
+# Notification
+NOTIFY_URL = 'http://127.0.0.1:7999/index.php'  # 个推转发服务地址
+NOTIFY_DISPATCHER_THREAD = True     # 是否在 Web 进程中启动发送线程，关闭时需单独运行 send_notifications
+NOTIFY_POLL_INTERVAL = 5            # 发送线程检查到期通知的间隔（秒）
+NOTIFY_BATCH_SIZE = 500             # 每次认领的通知数
+NOTIFY_CLAIM_TIMEOUT = 300          # 认领后超过此时间（秒）未发送完成的通知可被重新认领
+NOTIFY_MAX_ATTEMPTS = 5             # 最多发送次数，超过后标记为失败
+NOTIFY_RETRY_BASE = 10              # 首次重试的等待时间（秒），之后每次加倍
+NOTIFY_RETRY_MAX = 3600             # 重试等待时间的上限（秒）
+NOTIFY_SHUTDOWN_TIMEOUT = 15        # 进程退出时等待发送线程完成当前批次的时间（秒）
+NOTIFY_RETENTION_DAYS = 7           # 已发送和已失败的通知保留的天数
+NOTIFY_STATS_SIZE = 1000            # 统计发送延迟时取最近已发送的通知数
+
+# Integration
+INTEGRATION_CONNECT_TIMEOUT = 3     # 第三方接口的连接超时（秒）
+INTEGRATION_READ_TIMEOUT = 10       # 第三方接口的读取超时（秒）
+INTEGRATION_TIMEOUTS = {}           # 按上游单独设置 (连接超时, 读取超时)，如 {'huanxin': (3, 20)}
+INTEGRATION_POOL_HOSTS = 10         # 保持连接池的主机数
+INTEGRATION_POOL_SIZE = 10          # 每个主机的最大空闲连接数
+INTEGRATION_BREAKER_THRESHOLD = 5   # 连续失败多少次后熔断
+INTEGRATION_BREAKER_COOLDOWN = 30   # 熔断持续时间（秒），之后放行一个试探请求
+
+# Huanxin
+HUANXIN_TOKEN_REFRESH_AHEAD = 86400 # 环信 token 距过期不足此时间（秒）时在后台提前刷新
+HUANXIN_TOKEN_RETRIES = 1           # 环信接口返回 401 时刷新 token 后重试的次数
+
 # Recommender arguments
 USER_TAG_SCORE = 100                # 用户标签的特征模型贡献度
 USER_TEAM_TAG_SCORE = 10            # 用户所在团队标签的特征模型贡献度
@@ -108,3 +185,10 @@ USER_BEHAVIOR_ANALYSIS_CIRCLE = 7   # 用户模型可变部分行为分析周期
 
 TEAM_TAG_SCORE = 100                # 团队标签的特征模型贡献度
 TEAM_MEMBER_TAG_SCORE = 2           # 团队成员标签的特征模型贡献度
+
+FEATURE_CACHE_SIZE = 50000          # 进程内特征向量缓存的最大条目数
+FEATURE_VERSION_CHECK_INTERVAL = 10 # 检查特征模型版本的间隔（秒）
+
+TAG_INDEX_REFRESH_INTERVAL = 300    # 标签倒排索引全量重建的间隔（秒）
+
+USER_SIM_FILE = os.path.join(BASE_DIR, 'data', 'user_sim.bin')  # 用户相似度结果文件
@@ -5,8 +5,8 @@ from django.views.generic import View
 
 from admin.utils.decorators import *
 from main.models.report import Report as ReportModel
-from main.models.system import System
 from main.models.user import User, UserFeedback
+from main.utils.system import system_snapshot
 from util.decorator.auth import admin_auth
 from util.decorator.param import old_validate_args
 
@@ -42,7 +42,7 @@ class ReportDeal(View):
             if kwargs['ban'] == 'true':
                 user = User.objects.filter(id=model.object_id)[0]
                 user.reported_count = user.reported_count + 1
-                if user.reported_count >= System.objects.get(id=1).MAX_REPORTED:
+                if user.reported_count >= system_snapshot.get().MAX_REPORTED:
                     user.is_enabled = False
                 user.save()
         model.is_enabled = False
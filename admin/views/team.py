@@ -10,6 +10,7 @@ from main.models.action import TeamAction, TeamActionComment, TeamActionLiker
 from main.models.need import TeamNeed
 from main.models.task import ExternalTask, InternalTask
 from main.models.team import *
+from main.utils.recommender import bump_feature_version
 from util.decorator.auth import admin_auth
 from util.decorator.param import old_validate_args
 
@@ -597,6 +598,7 @@ class TeamFeatureView(View):
         for k in kwargs:
             setattr(mod, k, kwargs[k])
         mod.save()
+        bump_feature_version()
 
         admin_log("team_feature", mod.id, 1, request.user)
 
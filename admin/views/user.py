@@ -7,6 +7,7 @@ from django.views.generic import View
 from admin.utils.decorators import *
 from main.models.action import UserAction, UserActionLiker, UserActionComment
 from main.models.user import *
+from main.utils.recommender import bump_feature_version
 from util.decorator.auth import admin_auth
 from util.decorator.param import old_validate_args
 from util.decorator.permission import admin_permission
@@ -580,6 +581,7 @@ class UserFeatureView(View):
         for k in kwargs:
             setattr(mod, k, kwargs[k])
         mod.save()
+        bump_feature_version()
 
         admin_log("user_feature", mod.id, 1, request.user)
 
@@ -4,6 +4,7 @@ from django.http import JsonResponse
 
 from cms.util.role import compare_role
 from util.code import error
+from util.permission import permission_matrix
 
 
 def cms_permission_role(role_param='role'):
@@ -64,8 +65,8 @@ def cms_permission_role_function(function_param='function'):
         @wraps(function)
         def inner(self, request, *args, **kwargs):
             f = kwargs[function_param]
-            role = request.user.system_role
-            if not role.is_admin() and not role.functions.filter(id=f.id).exists():
+            role_id = request.user.system_role_id
+            if not permission_matrix.is_admin(role_id) and not permission_matrix.has(role_id, f.id):
                 return JsonResponse({
                     'code': 1,
                     'msg': '当前用户没有这个功能，所以不能对该功能进行操作'
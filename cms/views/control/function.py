@@ -7,6 +7,7 @@ from util.constant.param import CONSTANT_DEFAULT_LIMIT
 from util.decorator.auth import cms_auth
 from util.decorator.param import validate_args, fetch_object
 from util.decorator.permission import cms_permission
+from util.permission import bump_permission_version
 
 
 class AllFunctionList(BaseView):
@@ -110,6 +111,7 @@ class FunctionDetail(BaseView):
                 update_param[p] = kwargs[p]
         if len(update_param) > 0:
             CMSFunction.objects.filter(id=function.id).update(**update_param)
+            bump_permission_version()
         return self.success()
 
 
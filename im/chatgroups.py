@@ -2,30 +2,12 @@ import json
 
 import requests
 from im import *
-from modellib.models.config import ServerConfig
-
-
-def __refresh_access_token():
-    url = URL + 'token'
-    param = {
-        "grant_type": "client_credentials",
-        "client_id": CLIENT_ID,
-        "client_secret": SECRET
-    }
-    response = requests.post(url, data=json.dumps(param), headers=JSON_HEADER)
-    if response.status_code == requests.codes.ok:
-        ServerConfig.objects.update(huanxin_token=response.json().get('access_token'))
-
+from im.token import huanxin_request
 
 
 def CreateChatGroups(group_name, desc, owner, members):
     url = URL + "chatgroups/"
 
-    token = ServerConfig.objects.first().huanxin_token
-    header = {
-        **JSON_HEADER,
-        'Authorization': "Bearer " + token
-    }
     param = {
             "groupname": group_name,
             "desc": desc,
@@ -35,14 +17,11 @@ def CreateChatGroups(group_name, desc, owner, members):
             "members": members,
         }
 
-    response = requests.post(url, data=json.dumps(param), headers=header)
+    response = huanxin_request('POST', url, data=json.dumps(param))
     if response.status_code == requests.codes.ok:
         return 200, response.json().get('data')
     elif response.status_code == 400:
         return response.status_code, response.json().get('error_description')
-    elif response.status_code == 401:
-        __refresh_access_token()
-        return CreateChatGroups(group_name, desc, owner, members)
     else:
         return response.status_code, 'too fast'
 
@@ -50,20 +29,11 @@ def CreateChatGroups(group_name, desc, owner, members):
 def JoinedChatGroups(username):
     url = URL + "users/" + username + "/joined_chatgroups"
 
-    token = ServerConfig.objects.first().huanxin_token
-    header = {
-        **JSON_HEADER,
-        'Authorization': "Bearer " + token
-    }
-
-    response = requests.get(url, headers=header)
+    response = huanxin_request('GET', url)
     if response.status_code == requests.codes.ok:
         return 200, response.json().get('data')
     elif response.status_code == 400:
         return response.status_code, response.json().get('error_description')
-    elif response.status_code == 401:
-        __refresh_access_token()
-        return JoinedChatGroups(username)
     else:
         return response.status_code, 'too fast'
 
@@ -71,40 +41,22 @@ def JoinedChatGroups(username):
 def DeleteChatGroups(group_id):
     url = URL + "chatgroups/" + group_id
 
-    token = ServerConfig.objects.first().huanxin_token
-    header = {
-        **JSON_HEADER,
-        'Authorization': "Bearer " + token
-    }
-
-    response = requests.delete(url, headers=header)
+    response = huanxin_request('DELETE', url)
     if response.status_code == requests.codes.ok:
         return 200, response.json().get('data')
     elif response.status_code == 400:
         return response.status_code, response.json().get('error_description')
-    elif response.status_code == 401:
-        __refresh_access_token()
-        return DeleteChatGroups(group_id)
     else:
         return response.status_code, 'too fast'
 
 def GetChatGroupsMembers(group_id):
     url = URL + "chatgroups/"+ group_id + "/users"
 
-    token = ServerConfig.objects.first().huanxin_token
-    header = {
-        **JSON_HEADER,
-        'Authorization': "Bearer " + token
-    }
-
-    response = requests.get(url, headers=header)
+    response = huanxin_request('GET', url)
     if response.status_code == requests.codes.ok:
         return 200, response.json().get('data')
     elif response.status_code == 400:
         return response.status_code, response.json().get('error_description')
-    elif response.status_code == 401:
-        __refresh_access_token()
-        return DeleteChatGroups(group_id)
     elif response.status_code == 404:
         return response.status_code, "群组不存在"
     else:
@@ -114,20 +66,11 @@ def GetChatGroupsMembers(group_id):
 def AddUserToGroups(group_id, user_name):
     url = URL + "chatgroups/" + group_id + "/users/" + user_name
 
-    token = ServerConfig.objects.first().huanxin_token
-    header = {
-        **JSON_HEADER,
-        'Authorization': "Bearer " + token
-    }
-
-    response = requests.post(url, headers=header)
+    response = huanxin_request('POST', url)
     if response.status_code == requests.codes.ok:
         return 200, response.json().get('data')
     elif response.status_code == 400:
         return response.status_code, response.json().get('error_description')
-    elif response.status_code == 401:
-        __refresh_access_token()
-        return DeleteChatGroups(group_id)
     elif response.status_code == 404:
         return response.status_code, "用户不存在或已添加"
     else:
@@ -137,20 +80,11 @@ def AddUserToGroups(group_id, user_name):
 def DeleteUserToGroups(group_id, user_name):
     url = URL + "chatgroups/" + group_id + "/users/" + user_name
 
-    token = ServerConfig.objects.first().huanxin_token
-    header = {
-        **JSON_HEADER,
-        'Authorization': "Bearer " + token
-    }
-
-    response = requests.delete(url, headers=header)
+    response = huanxin_request('DELETE', url)
     if response.status_code == requests.codes.ok:
         return 200, response.json().get('data')
     elif response.status_code == 400:
         return response.status_code, response.json().get('error_description')
-    elif response.status_code == 401:
-        __refresh_access_token()
-        return DeleteChatGroups(group_id)
     elif response.status_code == 404:
         return response.status_code, "群组不存在"
     else:
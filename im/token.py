@@ -0,0 +1,93 @@
+import json
+import threading
+from datetime import timedelta
+
+from django.utils import timezone
+
+from ChuangYi import settings
+from im import URL, CLIENT_ID, SECRET, JSON_HEADER
+from modellib.models.config import ServerConfig
+from util.integration import integration
+
+
+class HuanxinToken(object):
+    """环信 access_token 的进程内缓存
+
+    进程内第一次使用时从 ServerConfig 读取，之后只在刷新时写回；
+    距过期不足 HUANXIN_TOKEN_REFRESH_AHEAD 秒时由一个后台线程提前刷新，期间继续使用旧 token；
+    已过期或被环信拒绝时同步刷新，同一时间只有一个线程请求新 token，其他线程等待其结果
+    """
+
+    def __init__(self):
+        self.token = None
+        self.expires = None
+        self.refreshes = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def get(self):
+        token = self.token
+        if token is None:
+            with self._lock:
+                if self.token is None:
+                    self.token, self.expires = ServerConfig.objects.values_list(
+                        'huanxin_token', 'huanxin_token_expires').first() or ('', None)
+            token = self.token
+        if self.expires is not None:
+            now = timezone.now()
+            if now >= self.expires:
+                return self.refresh(token)
+            if now >= self.expires - timedelta(seconds=settings.HUANXIN_TOKEN_REFRESH_AHEAD):
+                self._refresh_in_background(token)
+        return token
+
+    def _refresh_in_background(self, stale):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh(stale)
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name='huanxin-token-refresh', daemon=True).start()
+
+    def refresh(self, stale):
+        """刷新 token，stale 为调用方手中已失效的 token，若已被其他线程刷新则直接返回新 token"""
+
+        with self._lock:
+            if self.token is not None and self.token != stale:
+                return self.token
+            response = integration.post('huanxin', URL + 'token', headers=JSON_HEADER, data=json.dumps({
+                "grant_type": "client_credentials",
+                "client_id": CLIENT_ID,
+                "client_secret": SECRET
+            }))
+            if response.status_code != 200:
+                return stale
+            data = response.json()
+            self.token = data.get('access_token') or ''
+            expires_in = data.get('expires_in')
+            self.expires = timezone.now() + timedelta(seconds=expires_in) if expires_in else None
+            self.refreshes += 1
+            ServerConfig.objects.update(huanxin_token=self.token, huanxin_token_expires=self.expires)
+            return self.token
+
+
+huanxin_token = HuanxinToken()
+
+
+def huanxin_request(method, url, **kwargs):
+    """带 token 调用环信接口，返回 401 时刷新 token 后最多重试 HUANXIN_TOKEN_RETRIES 次"""
+
+    token = huanxin_token.get()
+    for attempt in range(settings.HUANXIN_TOKEN_RETRIES + 1):
+        headers = {**JSON_HEADER, 'Authorization': "Bearer " + token}
+        response = integration.request('huanxin', method, url, headers=headers, **kwargs)
+        if response.status_code != 401 or attempt == settings.HUANXIN_TOKEN_RETRIES:
+            break
+        token = huanxin_token.refresh(token)
+    return response
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class ChuangYi(AppConfig):
     name = 'main'
+
+    def ready(self):
+        # 注册维护标签倒排索引、需求匹配记录、计数字段、动态收件箱、令牌缓存的信号
+        from .utils import tag_index, need_match, counters, timeline
+        from util import auth
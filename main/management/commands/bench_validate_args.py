@@ -0,0 +1,96 @@
+import timeit
+
+from django import forms
+from django.core.management import BaseCommand
+from django.core.urlresolvers import get_resolver, RegexURLResolver
+
+from util.decorator.param import compile_schema, compile_field
+
+HTTP_METHODS = ('get', 'post', 'put', 'patch', 'delete')
+
+
+def iter_callbacks(patterns):
+    for p in patterns:
+        if isinstance(p, RegexURLResolver):
+            yield from iter_callbacks(p.url_patterns)
+        else:
+            yield p.callback
+
+
+def iter_schemas():
+    """返回所有视图中 validate_args 的参数定义"""
+
+    seen = set()
+    for callback in iter_callbacks(get_resolver(None).url_patterns):
+        view_class = getattr(callback, 'view_class', None)
+        if view_class is None:
+            continue
+        for method in HTTP_METHODS:
+            f = getattr(view_class, method, None)
+            while f is not None:
+                schema = getattr(f, 'arg_schema', None)
+                if schema is not None and id(schema) not in seen:
+                    seen.add(id(schema))
+                    yield schema
+                f = getattr(f, '__wrapped__', None)
+
+
+def sample_value(field):
+    """构造一个能通过校验的参数值，无法构造时返回 None"""
+
+    if isinstance(field, forms.BooleanField):
+        return 'true'
+    if isinstance(field, forms.IntegerField):
+        if field.min_value is not None:
+            value = field.min_value
+        elif field.max_value is not None:
+            value = min(field.max_value, 1)
+        else:
+            value = 1
+        value = str(value)
+    elif type(field) is forms.CharField:
+        value = 'a' * (field.min_length or 1)
+    else:
+        return None
+    # 还有其他校验器时构造的值不一定能通过，跳过这样的参数
+    try:
+        field.clean(value)
+    except forms.ValidationError:
+        return None
+    return value
+
+
+class Command(BaseCommand):
+    """比较 validate_args 编译前后每次调用的参数校验耗时"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=1000, help='每个视图的调用次数')
+
+    def handle(self, *args, **kwargs):
+        number = kwargs['number']
+        schemas = []
+        fields = fast = 0
+        for d in iter_schemas():
+            values = {k: sample_value(v) for k, v in d.items()}
+            values = {k: v for k, v in values.items() if v is not None}
+            d = {k: v for k, v in d.items() if k in values}
+            fields += len(d)
+            fast += sum(compile_field(v) != v.clean for v in d.values())
+            schemas.append((d, compile_schema(d), values))
+
+        def before():
+            for d, _, values in schemas:
+                for k, v in d.items():
+                    v.clean(values[k])
+
+        def after():
+            for _, schema, values in schemas:
+                for k, _, clean, _ in schema:
+                    clean(values[k])
+
+        t0 = min(timeit.repeat(before, number=number, repeat=3))
+        t1 = min(timeit.repeat(after, number=number, repeat=3))
+        n = max(len(schemas), 1) * number
+        self.stdout.write('%d schemas, %d fields (%d fast path)' % (len(schemas), fields, fast))
+        self.stdout.write('before: %.2f us/call' % (t0 / n * 1e6))
+        self.stdout.write('after:  %.2f us/call' % (t1 / n * 1e6))
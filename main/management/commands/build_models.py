@@ -1,105 +1,329 @@
-import json
+import multiprocessing
+import time
+from collections import defaultdict
 from datetime import timedelta
 
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Case, When, Value, BinaryField, Max
 from django.utils import timezone
 
-from ...models import User, Team, UserFeature, TeamFeature
+from modellib.models import ServerConfig
+from ...utils.recommender import bump_feature_version
+from ...models import User, Team, UserFeature, TeamFeature, UserTag, \
+    TeamTag, TeamMember, UserFollower, TeamFollower, UserBehavior, FeatureTag
 from ChuangYi import settings
 
+# 单次 id__in 查询及批量写入的记录数
+CHUNK_SIZE = 1000
+
+# 行为类型对应的标签分数
+BEHAVIOR_SCORES = {
+    'like': settings.USER_LIKE_SCORE,
+    'view': settings.USER_VIEW_SCORE,
+}
+
 
 class Command(BaseCommand):
     """构建用户、团队等实体的特征模型"""
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental', action='store_true', dest='incremental',
+            default=False, help='只重建上次构建之后有变化的实体')
+        parser.add_argument(
+            '--workers', type=int, dest='workers', default=1,
+            help='并行构建的进程数')
+        parser.add_argument(
+            '--shard', dest='shard', default=None,
+            help='按 id 范围将实体分为 N 份，只构建其中第 i 份（1 <= i <= N），格式为 i/N')
+
     def handle(self, *args, **kwargs):
         self.time_started = timezone.now()
-        self.build_user_models()
-        self.stdout.write("%s: user models updated" % timezone.now())
-        self.build_team_models()
-        self.stdout.write("%s: team models updated" % timezone.now())
-
-    def build_user_models(self):
-        users = User.enabled.all()
-        for u in users:
-            model = dict()
-
-            # 固定部分
-            for i in u.tags.all():
-                model[i.name] = settings.USER_TAG_SCORE
-
-            for i in u.teams.all():
-                for j in i.team.tags.all():
-                    if j.name in model:
-                        model[j.name] += settings.USER_TEAM_TAG_SCORE
-                    else:
-                        model[j.name] = settings.USER_TEAM_TAG_SCORE
-
-            for i in u.followed_users.all():
-                for j in i.followed.tags.all():
-                    if j.name in model:
-                        model[j.name] += settings.USER_FOLLOWED_TAG_SCORE
-                    else:
-                        model[j.name] = settings.USER_FOLLOWED_TAG_SCORE
-
-            for i in u.followed_teams.all():
-                for j in i.followed.tags.all():
-                    if j.name in model:
-                        model[j.name] += settings.USER_FOLLOWED_TAG_SCORE
-                    else:
-                        model[j.name] = settings.USER_FOLLOWED_TAG_SCORE
-
-            # 可变部分
-            t = self.time_started - \
-                timedelta(days=settings.USER_BEHAVIOR_ANALYSIS_CIRCLE)
-            behaviors = u.behaviors.filter(time_created__gte=t)
-            for b in behaviors:
-                # 行为类型判断
-                if b.behavior == 'like':
-                    score = settings.USER_LIKE_SCORE
-                elif b.behavior == 'view':
-                    score = settings.USER_VIEW_SCORE
-                else:
-                    raise Exception
-
-                # 交互对象类型判断
-                if b.object_type == 'user':
-                    try:
-                        obj = User.enabled.get(id=b.object_id)
-                    except User.DoesNotExist:
-                        continue
-                elif b.object_type == 'team':
-                    try:
-                        obj = User.enabled.get(id=b.object_id)
-                    except User.DoesNotExist:
-                        continue
-                else:
-                    raise Exception
-
-                # 记录标签分数
-                for i in obj.tags.all():
-                    if i.name in model:
-                        model[i.name] += score
-                    else:
-                        model[i.name] = score
-            # 保存
-            user_model, created = UserFeature.objects.get_or_create(user=u)
-            user_model.data = json.dumps(model)
-            user_model.save()
-
-    def build_team_models(self):
-        teams = Team.enabled.all()
-        for t in teams:
-            model = dict()
-            for i in t.tags.all():
-                model[i.name] = settings.TEAM_TAG_SCORE
-
-            for i in t.members.all():
-                for j in i.user.tags.all():
-                    if j.name in model:
-                        model[j.name] += settings.TEAM_MEMBER_TAG_SCORE
-                    else:
-                        model[j.name] = settings.TEAM_MEMBER_TAG_SCORE
-
-            team_model, created = TeamFeature.objects.get_or_create(team=t)
-            team_model.data = json.dumps(model)
-            team_model.save()
+        self.workers = kwargs['workers']
+        self.shard = self.parse_shard(kwargs['shard'])
+        if self.workers < 1:
+            raise CommandError('--workers must be at least 1')
+        if self.shard is not None and kwargs['incremental']:
+            # 各分片共用一个 watermark，无法单独推进
+            raise CommandError('--shard can not be used with --incremental')
+
+        config = ServerConfig.objects.first()
+        watermark = config.feature_watermark if config else None
+
+        # None 表示全量构建
+        user_ids = team_ids = None
+        if kwargs['incremental'] and watermark is not None:
+            user_ids, team_ids = self.changed_entities(watermark)
+            user_ids = [i for i, in scan(User.enabled.all(), 'id', user_ids, 'id')]
+            team_ids = [i for i, in scan(Team.enabled.all(), 'id', team_ids, 'id')]
+            self.stdout.write("%s: %d users, %d teams changed since %s" % (
+                timezone.now(), len(user_ids), len(team_ids), watermark))
+
+        self.report('user', build_user_features, User, user_ids, self.time_started)
+        self.report('team', build_team_features, Team, team_ids)
+        bump_feature_version()
+
+        # 本次构建开始后发生的变化留给下一次处理，只构建部分分片时不推进
+        if self.shard is None:
+            ServerConfig.objects.update(feature_watermark=self.time_started)
+
+    @staticmethod
+    def parse_shard(value):
+        """解析 i/N 格式的分片参数，返回 (i - 1, N)"""
+
+        if value is None:
+            return None
+        try:
+            i, n = (int(x) for x in value.split('/'))
+        except ValueError:
+            raise CommandError('--shard must look like i/N')
+        if not 1 <= i <= n:
+            raise CommandError('--shard requires 1 <= i <= N')
+        return i - 1, n
+
+    def report(self, name, build, model, ids, *args):
+        """执行构建并输出处理速度，用于估算定时任务所需时间"""
+
+        started = time.time()
+        count = self.run(build, model, ids, *args)
+        elapsed = time.time() - started
+        self.stdout.write("%s: %d %s models updated in %.1fs (%.1f rows/s)" % (
+            timezone.now(), count, name, elapsed,
+            count / elapsed if elapsed > 0 else count))
+
+    def run(self, build, model, ids, *args):
+        """按分片、进程数拆分实体并执行构建，返回构建的总数"""
+
+        if self.shard is None and self.workers == 1:
+            return build(ids, *args)
+
+        if ids is None:
+            ids = list(model.enabled.values_list('id', flat=True))
+        if self.shard is not None:
+            index, count = self.shard
+            ids = shard_ids(ids, model.objects.aggregate(Max('id'))['id__max'] or 0, count)[index]
+        if self.workers == 1:
+            return build(ids, *args)
+
+        # 预先登记标签词表，避免各子进程同时插入相同的标签
+        FeatureTag.get_ids(set(UserTag.objects.values_list('name', flat=True)) |
+                           set(TeamTag.objects.values_list('name', flat=True)))
+        # 子进程继承父进程的数据库连接会相互干扰，先关闭，各子进程会建立自己的连接
+        connections.close_all()
+        parts = list(chunks(sorted(ids), len(ids) // self.workers + 1))
+        with multiprocessing.Pool(self.workers) as pool:
+            counts = pool.starmap(build, [(part,) + args for part in parts])
+        return sum(counts)
+
+    def changed_entities(self, watermark):
+        """找出 watermark 之后特征模型可能变化的用户和团队
+
+        删除类的变化（取消关注、退出团队、清空标签）没有时间记录，由全量构建处理
+        """
+
+        circle = timedelta(days=settings.USER_BEHAVIOR_ANALYSIS_CIRCLE)
+        t = self.time_started - circle
+
+        tagged_users = set(UserTag.objects.filter(
+            time_created__gt=watermark).values_list('entity_id', flat=True))
+        tagged_teams = set(TeamTag.objects.filter(
+            time_created__gt=watermark).values_list('entity_id', flat=True))
+        new_members = TeamMember.objects.filter(
+            time_created__gt=watermark).values_list('user_id', 'team_id')
+
+        user_ids = set(tagged_users)
+        team_ids = set(tagged_teams)
+        for user_id, team_id in new_members:
+            user_ids.add(user_id)
+            team_ids.add(team_id)
+
+        # 新增的关注、行为，以及滑出分析周期的行为
+        user_ids.update(UserFollower.objects.filter(
+            time_created__gt=watermark).values_list('follower_id', flat=True))
+        user_ids.update(TeamFollower.objects.filter(
+            time_created__gt=watermark).values_list('follower_id', flat=True))
+        user_ids.update(UserBehavior.objects.filter(
+            time_created__gt=watermark).values_list('user_id', flat=True))
+        user_ids.update(UserBehavior.objects.filter(
+            time_created__gte=watermark - circle,
+            time_created__lt=t).values_list('user_id', flat=True))
+
+        # 标签变化会传递给所在团队的成员、关注者以及近期与之交互的用户
+        if tagged_users:
+            team_ids.update(TeamMember.objects.filter(
+                user_id__in=tagged_users).values_list('team_id', flat=True))
+            user_ids.update(UserFollower.objects.filter(
+                followed_id__in=tagged_users).values_list('follower_id', flat=True))
+            user_ids.update(UserBehavior.objects.filter(
+                time_created__gte=t, object_type='user',
+                object_id__in=tagged_users).values_list('user_id', flat=True))
+        if tagged_teams:
+            user_ids.update(TeamMember.objects.filter(
+                team_id__in=tagged_teams).values_list('user_id', flat=True))
+            user_ids.update(TeamFollower.objects.filter(
+                followed_id__in=tagged_teams).values_list('follower_id', flat=True))
+            user_ids.update(UserBehavior.objects.filter(
+                time_created__gte=t, object_type='team',
+                object_id__in=tagged_teams).values_list('user_id', flat=True))
+
+        # 还没有特征模型的实体
+        user_ids.update(User.enabled.filter(
+            feature_model__isnull=True).values_list('id', flat=True))
+        team_ids.update(Team.enabled.filter(
+            feature_model__isnull=True).values_list('id', flat=True))
+        return user_ids, team_ids
+
+
+def chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def shard_ids(ids, max_id, count):
+    """按 id 范围将 ids 划分为 count 份，相同 max_id 下划分结果固定"""
+
+    step = max_id // count + 1
+    parts = [[] for _ in range(count)]
+    for i in ids:
+        parts[min(i // step, count - 1)].append(i)
+    return parts
+
+
+def scan(queryset, field, ids, *fields):
+    """以 values_list 扫描 queryset，ids 为 None 时扫描全部，否则按 field__in 分批扫描"""
+
+    queryset = queryset.order_by()
+    if ids is None:
+        yield from queryset.values_list(*fields)
+    else:
+        for chunk in chunks(ids):
+            yield from queryset.filter(**{field + '__in': chunk}).values_list(*fields)
+
+
+def load_tags(model, ids):
+    """读取实体的标签，返回 实体id -> 标签名列表"""
+
+    tags = defaultdict(list)
+    for entity_id, name in scan(model.objects.all(), 'entity_id', ids, 'entity_id', 'name'):
+        tags[entity_id].append(name)
+    return tags
+
+
+def add_scores(model, names, score):
+    for name in names:
+        model[name] = model.get(name, 0) + score
+
+
+def build_user_features(user_ids, time_started):
+    """构建用户特征模型，user_ids 为 None 时构建全部用户，返回构建的数量"""
+
+    if user_ids is None:
+        targets = list(User.enabled.values_list('id', flat=True))
+    else:
+        targets = user_ids
+    t = time_started - timedelta(days=settings.USER_BEHAVIOR_ANALYSIS_CIRCLE)
+
+    memberships = list(scan(TeamMember.objects.all(), 'user_id', user_ids,
+                            'user_id', 'team_id'))
+    followed_users = list(scan(UserFollower.objects.all(), 'follower_id', user_ids,
+                               'follower_id', 'followed_id'))
+    followed_teams = list(scan(TeamFollower.objects.all(), 'follower_id', user_ids,
+                               'follower_id', 'followed_id'))
+    behaviors = list(scan(UserBehavior.objects.filter(
+        time_created__gte=t, behavior__in=list(BEHAVIOR_SCORES),
+        object_type__in=('user', 'team')), 'user_id', user_ids,
+        'user_id', 'behavior', 'object_type', 'object_id'))
+
+    if user_ids is None:
+        user_tags = load_tags(UserTag, None)
+        team_tags = load_tags(TeamTag, None)
+    else:
+        # 增量构建时只读取涉及到的实体的标签
+        related_users = set(user_ids)
+        related_users.update(i for _, i in followed_users)
+        related_teams = set(i for _, i in memberships)
+        related_teams.update(i for _, i in followed_teams)
+        for _, _, object_type, object_id in behaviors:
+            (related_users if object_type == 'user' else related_teams).add(object_id)
+        user_tags = load_tags(UserTag, related_users)
+        team_tags = load_tags(TeamTag, related_teams)
+
+    # 行为只统计未被删除的交互对象
+    behavior_objects = {'user': None, 'team': None}
+    if user_ids is not None:
+        behavior_objects = {'user': [], 'team': []}
+        for _, _, object_type, object_id in behaviors:
+            behavior_objects[object_type].append(object_id)
+    enabled = {
+        'user': set(i for i, in scan(User.enabled.all(), 'id', behavior_objects['user'], 'id')),
+        'team': set(i for i, in scan(Team.enabled.all(), 'id', behavior_objects['team'], 'id')),
+    }
+    tags = {'user': user_tags, 'team': team_tags}
+
+    # 固定部分
+    models = {i: dict.fromkeys(user_tags.get(i, ()), settings.USER_TAG_SCORE)
+              for i in targets}
+    for user_id, team_id in memberships:
+        if user_id in models:
+            add_scores(models[user_id], team_tags.get(team_id, ()), settings.USER_TEAM_TAG_SCORE)
+    for user_id, followed_id in followed_users:
+        if user_id in models:
+            add_scores(models[user_id], user_tags.get(followed_id, ()), settings.USER_FOLLOWED_TAG_SCORE)
+    for user_id, followed_id in followed_teams:
+        if user_id in models:
+            add_scores(models[user_id], team_tags.get(followed_id, ()), settings.USER_FOLLOWED_TAG_SCORE)
+
+    # 可变部分
+    for user_id, behavior, object_type, object_id in behaviors:
+        if user_id in models and object_id in enabled[object_type]:
+            add_scores(models[user_id], tags[object_type].get(object_id, ()), BEHAVIOR_SCORES[behavior])
+
+    save_features(UserFeature, 'user_id', models)
+    return len(models)
+
+
+def build_team_features(team_ids):
+    """构建团队特征模型，team_ids 为 None 时构建全部团队，返回构建的数量"""
+
+    if team_ids is None:
+        targets = list(Team.enabled.values_list('id', flat=True))
+    else:
+        targets = team_ids
+
+    members = list(scan(TeamMember.objects.all(), 'team_id', team_ids,
+                        'team_id', 'user_id'))
+    team_tags = load_tags(TeamTag, team_ids)
+    user_tags = load_tags(UserTag, None if team_ids is None else set(i for _, i in members))
+
+    models = {i: dict.fromkeys(team_tags.get(i, ()), settings.TEAM_TAG_SCORE)
+              for i in targets}
+    for team_id, user_id in members:
+        if team_id in models:
+            add_scores(models[team_id], user_tags.get(user_id, ()), settings.TEAM_MEMBER_TAG_SCORE)
+
+    save_features(TeamFeature, 'team_id', models)
+    return len(models)
+
+
+@transaction.atomic
+def save_features(model, field, models):
+    """分批写入特征模型：已存在的记录用 CASE WHEN 批量更新，其余批量创建"""
+
+    names = set()
+    for m in models.values():
+        names.update(m)
+    tag_ids = FeatureTag.get_ids(names)
+    vectors = {i: model.pack({tag_ids[k]: v for k, v in m.items()})
+               for i, m in models.items()}
+
+    existing = set(i for i, in scan(model.objects.all(), field, models.keys(), field))
+    for chunk in chunks(existing):
+        model.objects.filter(**{field + '__in': chunk}).update(vector=Case(
+            *[When(then=Value(vectors[i], output_field=BinaryField()), **{field: i})
+              for i in chunk],
+            output_field=BinaryField()))
+    model.objects.bulk_create(
+        [model(vector=v, **{field: i}) for i, v in vectors.items() if i not in existing],
+        batch_size=CHUNK_SIZE)
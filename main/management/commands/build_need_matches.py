@@ -0,0 +1,12 @@
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from ...utils.need_match import rebuild_need_matches
+
+
+class Command(BaseCommand):
+    """重建外包、承接需求与团队的匹配记录"""
+
+    def handle(self, *args, **kwargs):
+        count = rebuild_need_matches()
+        self.stdout.write("%s: %d need matches rebuilt" % (timezone.now(), count))
@@ -0,0 +1,32 @@
+from django.core.management import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from ChuangYi import settings
+from ...utils.timeline import TIMELINES
+
+
+class Command(BaseCommand):
+    """截断动态收件箱，只保留每个用户最近的 TIMELINE_SIZE 条动态
+
+    首次部署或收件箱数据丢失时使用 --rebuild，按现有的关注关系重新写入
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', dest='rebuild',
+                            help='按关注关系重新写入所有收件箱')
+
+    def handle(self, *args, **kwargs):
+        for timeline in TIMELINES:
+            name = timeline.inbox.__name__
+            if kwargs['rebuild']:
+                timeline.inbox.objects.all().delete()
+                follows = timeline.follower_model.objects.select_related('followed')
+                for f in follows.iterator():
+                    timeline.backfill(f.follower_id, f.followed, settings.TIMELINE_SIZE)
+                self.stdout.write("%s: rebuilt" % name)
+
+            users = timeline.inbox.objects.order_by().values('user').annotate(
+                n=Count('id')).filter(n__gt=settings.TIMELINE_SIZE).values_list('user', flat=True)
+            deleted = sum(timeline.trim(u) for u in users)
+            self.stdout.write("%s: %s: %d entries trimmed" % (timezone.now(), name, deleted))
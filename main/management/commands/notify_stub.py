@@ -0,0 +1,49 @@
+import random
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+
+from django.core.management import BaseCommand
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """按个推转发服务的格式接收通知，只输出收到的内容"""
+
+    # 保持长连接，与发送线程的连接池配合
+    protocol_version = 'HTTP/1.1'
+    fail_rate = 0
+    stdout = None
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        data = parse_qs(body.decode('utf-8'))
+        status = 500 if random.random() < self.fail_rate else 200
+        self.stdout.write('%d %s %s' % (status, data.get('client', [''])[0], data.get('msg', [''])[0]))
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    """在本地模拟个推转发服务，用于开发和测试通知发送
+
+    把 NOTIFY_URL 设为 http://127.0.0.1:<port>/index.php 后运行，
+    --fail-rate 指定返回 500 的比例，用于检查重试和失败处理
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=7999, help='监听端口')
+        parser.add_argument('--fail-rate', type=float, default=0, dest='fail_rate',
+                            help='返回 500 的比例，0 到 1')
+
+    def handle(self, *args, **kwargs):
+        handler = type('Handler', (StubHandler,), {
+            'fail_rate': kwargs['fail_rate'], 'stdout': self.stdout})
+        server = HTTPServer(('127.0.0.1', kwargs['port']), handler)
+        self.stdout.write('listening on 127.0.0.1:%d' % kwargs['port'])
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
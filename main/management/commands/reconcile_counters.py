@@ -0,0 +1,53 @@
+from collections import defaultdict
+
+from django.core.management import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+
+from ...utils.counters import COUNTERS
+
+CHUNK_SIZE = 1000
+
+
+def actual_counts(model, field):
+    """关系模型中每个实体的记录数"""
+
+    return dict(model.objects.order_by().values_list(field).annotate(n=Count('id')))
+
+
+def reconcile(model, field, entity, counter, dry_run=False):
+    """将计数字段修正为实际的记录数，返回修正的实体数"""
+
+    counts = actual_counts(model, field)
+    # 正确值 -> 需要修正的实体 id
+    wrong = defaultdict(list)
+    for i, value in entity.objects.values_list('id', counter):
+        if counts.get(i, 0) != value:
+            wrong[counts.get(i, 0)].append(i)
+    if not dry_run:
+        for value, ids in wrong.items():
+            for k in range(0, len(ids), CHUNK_SIZE):
+                entity.objects.filter(id__in=ids[k:k + CHUNK_SIZE]).update(**{counter: value})
+    return sum(len(ids) for ids in wrong.values())
+
+
+class Command(BaseCommand):
+    """修正点赞、关注、访客、成员、评论等冗余计数字段
+
+    计数字段由信号维护，批量删除、直接执行 SQL 等不触发信号的操作会造成偏差，
+    新增计数字段后也需要执行一次以初始化
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', dest='dry_run',
+                            help='只统计偏差，不修改数据')
+
+    def handle(self, *args, **kwargs):
+        total = 0
+        for model, field, entity, counter in COUNTERS:
+            n = reconcile(model, field, entity, counter, kwargs['dry_run'])
+            if n:
+                self.stdout.write("%s.%s: %d" % (entity.__name__, counter, n))
+            total += n
+        self.stdout.write("%s: %d counters %s" % (
+            timezone.now(), total, 'drifted' if kwargs['dry_run'] else 'reconciled'))
@@ -0,0 +1,33 @@
+import json
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from ...utils.notification import dispatcher
+
+
+class Command(BaseCommand):
+    """在单独的进程中发送发件箱中的通知
+
+    NOTIFY_DISPATCHER_THREAD 关闭时需要常驻运行；也可以与 Web 进程中的发送线程同时运行。
+    --purge 删除 NOTIFY_RETENTION_DAYS 天前已发送或已失败的通知，由定时任务每天执行
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stats', action='store_true', dest='stats',
+                            help='只输出队列长度等统计信息')
+        parser.add_argument('--purge', action='store_true', dest='purge',
+                            help='删除过期的已发送和已失败通知')
+
+    def handle(self, *args, **kwargs):
+        if kwargs['stats']:
+            self.stdout.write(json.dumps(dispatcher.stats()))
+            return
+        if kwargs['purge']:
+            deleted = dispatcher.purge()
+            self.stdout.write("%s: %d notifications purged" % (timezone.now(), deleted))
+            return
+        try:
+            dispatcher.run()
+        except KeyboardInterrupt:
+            dispatcher.close()
@@ -3,10 +3,10 @@
 from django.db import models
 from django.utils import timezone
 
-from main.models import Liker, Comment, Favorer
+from main.models import Liker, Comment, Favorer, Counted, CounterField
 
 
-class Action(models.Model):
+class Action(Counted):
     """动态"""
 
     entity = None
@@ -19,6 +19,10 @@ class Action(models.Model):
     related_object_type = models.CharField(default=None, null=True, max_length=20)
     related_object_id = models.IntegerField(default=None, null=True, db_index=True)
 
+    # 计数，由 main.utils.counters 维护
+    comment_count = CounterField()  # 评论数
+    liker_count = CounterField()  # 点赞数
+
     class Meta:
         abstract = True
         ordering = ['-time_created']
@@ -138,4 +142,56 @@ class LabActionFavorer(Favorer):
     favorer = models.ForeignKey('User', models.CASCADE, 'favored_lab_actions')
 
     class Meta:
-        db_table = 'lab_action_favorer'
\ No newline at end of file
+        db_table = 'lab_action_favorer'
+
+
+class Timeline(models.Model):
+    """动态收件箱
+
+    关注对象产生动态时写入关注者的收件箱，由 main.utils.timeline 维护
+    """
+
+    user = None
+    entity = None
+    action = None
+    # 与动态的创建时间相同，用于按时间范围读取
+    time_created = models.DateTimeField()
+
+    class Meta:
+        abstract = True
+
+
+class UserTimeline(Timeline):
+    """关注的用户的动态收件箱"""
+
+    user = models.ForeignKey('User', models.CASCADE, '+')
+    entity = models.ForeignKey('User', models.CASCADE, '+')
+    action = models.ForeignKey('UserAction', models.CASCADE, '+')
+
+    class Meta:
+        db_table = 'user_timeline'
+        index_together = [('user', 'time_created', 'action')]
+
+
+class TeamTimeline(Timeline):
+    """关注的团队的动态收件箱"""
+
+    user = models.ForeignKey('User', models.CASCADE, '+')
+    entity = models.ForeignKey('Team', models.CASCADE, '+')
+    action = models.ForeignKey('TeamAction', models.CASCADE, '+')
+
+    class Meta:
+        db_table = 'team_timeline'
+        index_together = [('user', 'time_created', 'action')]
+
+
+class LabTimeline(Timeline):
+    """关注的实验室的动态收件箱"""
+
+    user = models.ForeignKey('User', models.CASCADE, '+')
+    entity = models.ForeignKey('Lab', models.CASCADE, '+')
+    action = models.ForeignKey('LabAction', models.CASCADE, '+')
+
+    class Meta:
+        db_table = 'lab_timeline'
+        index_together = [('user', 'time_created', 'action')]
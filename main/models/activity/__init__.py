@@ -3,12 +3,12 @@
 from django.db import models
 from django.utils import timezone
 
-from main.models import EnabledManager, Comment
+from main.models import EnabledManager, Comment, Counted, CounterField
 
 __all__ = ['Activity', 'ActivityStage', 'ActivityComment']
 
 
-class Activity(models.Model):
+class Activity(Counted):
     """活动基本信息"""
 
     # 活动状态
@@ -64,6 +64,11 @@ class Activity(models.Model):
     # 标签
     tags = models.CharField(max_length=255, default='')
 
+    # 计数，由 main.utils.counters 维护
+    comment_count = CounterField()  # 评论数
+    follower_count = CounterField()  # 关注数
+    liker_count = CounterField()  # 点赞数
+
     objects = models.Manager()
     enabled = EnabledManager()
 
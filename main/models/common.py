@@ -1,10 +1,43 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from django.db import models
+import json
+
+import numpy as np
+from django.db import models, transaction, IntegrityError
 from django.utils import timezone
 
-__all__ = ['Comment', 'Follower', 'Liker', 'Tag', 'Visitor', 'Favorer']
+__all__ = ['Comment', 'Follower', 'Liker', 'Tag', 'Visitor', 'Favorer',
+           'Feature', 'FeatureTag', 'CounterField', 'Counted']
+
+
+class CounterField(models.IntegerField):
+    """冗余的计数字段，只通过 F() 表达式增减，由 main.utils.counters 维护"""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('default', 0)
+        super().__init__(*args, **kwargs)
+
+
+class Counted(models.Model):
+    """带有计数字段的模型
+
+    保存已有记录时不写入计数字段，避免用读出时的旧值覆盖其他请求累加的结果；
+    延迟加载（only/defer）的字段也不写入，避免保存前逐个读取
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args and not kwargs.get('force_insert') \
+                and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and not isinstance(f, CounterField)
+                and f.attname not in deferred]
+        super().save(*args, **kwargs)
 
 
 class Comment(models.Model):
@@ -51,6 +84,7 @@ class Tag(models.Model):
     entity = None
     name = models.CharField(max_length=20)
     order = models.IntegerField(db_index=True)
+    time_created = models.DateTimeField(default=timezone.now, db_index=True)
 
     class Meta:
         abstract = True
@@ -79,3 +113,76 @@ class Favorer(models.Model):
     class Meta:
         abstract = True
         ordering = ['-time_created']
+
+
+class FeatureTag(models.Model):
+    """特征模型的标签词表，特征向量中以 id 代替标签名"""
+
+    name = models.CharField(max_length=20, unique=True)
+
+    class Meta:
+        db_table = 'feature_tag'
+
+    @classmethod
+    def get_ids(cls, names):
+        """返回 标签名 -> id 字典，不存在的标签会被加入词表"""
+
+        names = set(names)
+        ids = dict(cls.objects.filter(name__in=names).values_list('name', 'id'))
+        missing = names - set(ids)
+        if missing:
+            try:
+                with transaction.atomic():
+                    cls.objects.bulk_create([cls(name=n) for n in missing])
+            except IntegrityError:
+                # 其他进程同时加入了部分标签
+                for n in missing:
+                    cls.objects.get_or_create(name=n)
+            ids.update(cls.objects.filter(name__in=missing).values_list('name', 'id'))
+        return ids
+
+
+class Feature(models.Model):
+    """特征模型
+
+    以稀疏向量存储：n 个按升序排列的 uint32 标签 id，随后是 n 个对应的 float32 分数
+    """
+
+    vector = models.BinaryField(default=b'')
+
+    class Meta:
+        abstract = True
+
+    @staticmethod
+    def pack(model):
+        """将 标签id -> 分数 字典编码为特征向量"""
+
+        ids = np.array(sorted(model), dtype='<u4')
+        weights = np.array([model[i] for i in ids], dtype='<f4')
+        return ids.tobytes() + weights.tobytes()
+
+    def unpack(self):
+        """返回 (标签id数组, 分数数组)，直接引用原始数据，无需解析"""
+
+        return self.unpack_vector(self.vector)
+
+    @staticmethod
+    def unpack_vector(buf):
+        n = len(buf) // 8
+        return np.frombuffer(buf, dtype='<u4', count=n), \
+            np.frombuffer(buf, dtype='<f4', count=n, offset=n * 4)
+
+    @property
+    def data(self):
+        """以 标签名 -> 分数 的 JSON 文本表示的特征模型，供后台查看和编辑"""
+
+        ids, weights = self.unpack()
+        names = dict(FeatureTag.objects.filter(id__in=ids.tolist()).values_list('id', 'name'))
+        return json.dumps({names[i]: float(w) for i, w in zip(ids.tolist(), weights) if i in names},
+                          ensure_ascii=False)
+
+    @data.setter
+    def data(self, value):
+        model = json.loads(value) if value else {}
+        ids = FeatureTag.get_ids(model.keys())
+        self.vector = self.pack({ids[k]: v for k, v in model.items()})
@@ -4,7 +4,7 @@
 from django.db import models
 from django.utils import timezone
 
-from . import EnabledManager, Comment, Liker, Follower, Favorer
+from . import EnabledManager, Comment, Liker, Follower, Favorer, Counted, CounterField
 
 __all__ = ['Competition', 'CompetitionStage', 'CompetitionTeamParticipator',
            'CompetitionComment', 'CompetitionLiker', 'CompetitionFile',
@@ -21,7 +21,7 @@ class CompetitionSign(models.Model):
     time_created = models.DateTimeField(default=timezone.now, db_index=True)
 
 
-class Competition(models.Model):
+class Competition(Counted):
     """竞赛基本信息"""
 
     name = models.CharField(max_length=50, null=True)
@@ -53,6 +53,11 @@ class Competition(models.Model):
     # 标签
     tags = models.CharField(max_length=255, default='')
 
+    # 计数，由 main.utils.counters 维护
+    comment_count = CounterField()  # 评论数
+    follower_count = CounterField()  # 关注数
+    liker_count = CounterField()  # 点赞数
+
     objects = models.Manager()
     enabled = EnabledManager()
 
@@ -5,7 +5,7 @@ from django.db import models
 from django.utils import timezone
 
 from . import EnabledManager, Comment, Follower, Liker, Tag, \
-    Visitor
+    Visitor, Feature, Counted, CounterField
 
 __all__ = ['Lab', 'LabAchievement', 'LabComment', 'LabFollower', 'LabInvitation',
            'LabLiker', 'LabMember', 'LabMemberRequest', 'LabNeed',
@@ -13,7 +13,7 @@ __all__ = ['Lab', 'LabAchievement', 'LabComment', 'LabFollower', 'LabInvitation'
            'LabFeature', 'LabScore', 'LabNeedFollower', 'LabTagLiker', 'LabAchievementLiker']
 
 
-class Lab(models.Model):
+class Lab(Counted):
     owner = models.ForeignKey('User', models.CASCADE, 'owned_labs')
     name = models.CharField(max_length=20)
     icon = models.CharField(max_length=100, default='')
@@ -41,6 +41,13 @@ class Lab(models.Model):
 
     time_created = models.DateTimeField(default=timezone.now, db_index=True)
 
+    # 计数，由 main.utils.counters 维护
+    comment_count = CounterField()  # 评论数
+    follower_count = CounterField()  # 关注数
+    liker_count = CounterField()  # 点赞数
+    member_count = CounterField()  # 成员数
+    visitor_count = CounterField()  # 访客数
+
     objects = models.Manager()
     enabled = EnabledManager()
 
@@ -223,11 +230,10 @@ class LabScore(models.Model):
         db_table = 'lab_score_record'
 
 
-class LabFeature(models.Model):
+class LabFeature(Feature):
     """团队特征模型"""
 
     lab = models.OneToOneField('Lab', models.CASCADE, related_name='feature_model')
-    data = models.TextField(default="{}")
 
     class Meta:
         db_table = 'lab_feature'
@@ -50,6 +50,22 @@ class TeamNeed(models.Model):
         ordering = ['-time_created']
 
 
+class TeamNeedMatch(models.Model):
+    """外包、承接需求与可合作团队的匹配记录，由 main.utils.need_match 维护"""
+
+    need = models.ForeignKey('TeamNeed', models.CASCADE, 'team_matches')
+    # 与 need 匹配的对方需求及其所属团队
+    matched_need = models.ForeignKey('TeamNeed', models.CASCADE, '+')
+    team = models.ForeignKey('Team', models.CASCADE, '+')
+    score = models.IntegerField()
+    # 对方需求的截止日期，查询时再按当前时间过滤
+    deadline = models.DateField(default=None, null=True)
+
+    class Meta:
+        db_table = 'team_need_match'
+        index_together = [('need', 'deadline')]
+
+
 class TeamNeedFollower(Follower):
     """团队需求关注记录"""
 
@@ -5,13 +5,13 @@ from django.db import models
 from django.utils import timezone
 
 from . import EnabledManager, Comment, Follower, Liker, Tag, \
-    Visitor
+    Visitor, Feature, Counted, CounterField
 
 __all__ = ['Team', 'TeamComment', 'TeamFollower', 'TeamInvitation',
            'TeamLiker', 'TeamMember', 'TeamMemberRequest', 'TeamTag', 'TeamVisitor', 'TeamFeature', 'TeamScore', 'TeamTagLiker']
 
 
-class Team(models.Model):
+class Team(Counted):
     """团队模型"""
 
     owner = models.ForeignKey('User', models.CASCADE, 'owned_teams')
@@ -45,6 +45,13 @@ class Team(models.Model):
 
     group_id = models.CharField(default='', max_length=20)
 
+    # 计数，由 main.utils.counters 维护
+    comment_count = CounterField()  # 评论数
+    follower_count = CounterField()  # 关注数
+    liker_count = CounterField()  # 点赞数
+    member_count = CounterField()  # 成员数
+    visitor_count = CounterField()  # 访客数
+
     objects = models.Manager()
     enabled = EnabledManager()
 
@@ -155,12 +162,11 @@ class TeamScore(models.Model):
         db_table = 'team_score_record'
 
 
-class TeamFeature(models.Model):
+class TeamFeature(Feature):
     """团队特征模型"""
 
     team = models.OneToOneField('Team', models.CASCADE,
                                 related_name='feature_model')
-    data = models.TextField(default="{}")
 
     class Meta:
         db_table = 'team_feature'
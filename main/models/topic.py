@@ -4,7 +4,7 @@
 from django.db import models
 from django.utils import timezone
 
-from . import EnabledManager, Comment, Liker, Follower, Favorer
+from . import EnabledManager, Comment, Liker, Follower, Favorer, Counted, CounterField
 
 
 __all__ = ['Topic', 'TopicStage', 'TopicUserParticipator',
@@ -12,7 +12,7 @@ __all__ = ['Topic', 'TopicStage', 'TopicUserParticipator',
            'TopicFavorer']
 
 
-class Topic(models.Model):
+class Topic(Counted):
     """活动基本信息"""
 
     name = models.CharField(max_length=50)
@@ -35,6 +35,11 @@ class Topic(models.Model):
     lab_sponsor = models.ForeignKey('Lab', related_name='lab_sponsored_topics', null=True)
     expert_sponsor = models.ForeignKey('User', related_name='expert_sponsored_topics', null=True)
 
+    # 计数，由 main.utils.counters 维护
+    comment_count = CounterField()  # 评论数
+    follower_count = CounterField()  # 关注数
+    liker_count = CounterField()  # 点赞数
+
     objects = models.Manager()
     enabled = EnabledManager()
 
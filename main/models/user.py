@@ -6,7 +6,8 @@ import hashlib
 from django.db import models
 from django.utils import timezone
 
-from ..models import EnabledManager, Comment, Follower, Liker, Tag, Visitor
+from ..models import EnabledManager, Comment, Follower, Liker, Tag, Visitor, Feature, \
+    Counted, CounterField
 
 __all__ = ['User', 'UserComment', 'UserExperience', 'UserFollower', 'UserFriend',
            'UserFriendRequest', 'UserLiker', 'UserTag', 'UserValidationCode',
@@ -14,7 +15,7 @@ __all__ = ['User', 'UserComment', 'UserExperience', 'UserFollower', 'UserFriend'
            'UserScore', 'UserTagLiker']
 
 
-class User(models.Model):
+class User(Counted):
     """用户模型"""
 
     GENDERS = ['未知', '男', '女']
@@ -25,6 +26,8 @@ class User(models.Model):
     password = models.CharField(max_length=128)
     phone_number = models.CharField(max_length=11, unique=True)
     token = models.CharField(max_length=256)
+    # token 的 md5，用于按令牌查找用户
+    token_hash = models.CharField(max_length=32, default='', db_index=True)
     time_created = models.DateTimeField(default=timezone.now, db_index=True)
 
     # 昵称
@@ -96,6 +99,12 @@ class User(models.Model):
     # 微信id
     wechat_id = models.CharField(max_length=28, default=None, null=True, blank=True)
 
+    # 计数，由 main.utils.counters 维护
+    comment_count = CounterField()  # 评论数
+    follower_count = CounterField()  # 关注数
+    liker_count = CounterField()  # 点赞数
+    visitor_count = CounterField()  # 访客数
+
     objects = models.Manager()
     enabled = EnabledManager()
 
@@ -129,6 +138,7 @@ class User(models.Model):
         hasher = hashlib.md5()
         hasher.update(random_content.encode())
         self.token = hasher.hexdigest()
+        self.token_hash = hashlib.md5(self.token.encode()).hexdigest()
 
     def save_and_generate_name(self, nickname=None):
         """保存当前实例并生成序列用户名"""
@@ -323,11 +333,10 @@ class UserScore(models.Model):
         db_table = 'user_score_record'
 
 
-class UserFeature(models.Model):
+class UserFeature(Feature):
     """用户特征模型"""
 
     user = models.OneToOneField('User', models.CASCADE, related_name='feature_model')
-    data = models.TextField(default="{}")
 
     class Meta:
         db_table = 'user_feature'
@@ -1,9 +1,8 @@
 # todo 完善事件记录辅助函数与其他相关说明
 from django.db import transaction
-from django.core.exceptions import ObjectDoesNotExist
 
 import json
-from main.utils.http import notify_user
+from main.utils.notification import notify_followers
 
 from main.models import User, Team, SystemAction, Activity, \
     Competition, ForumBoard
@@ -11,81 +10,129 @@ from main.models.task import InternalTask, ExternalTask
 from main.models.need import TeamNeed
 
 
-@transaction.atomic
+# 对象来源：来源名 -> (管理器, 名称字段, 是否有头像)
+OBJECT_SOURCES = {
+    'user': (User.enabled, 'name', True),
+    'team': (Team.enabled, 'name', True),
+    'need': (TeamNeed.objects, 'title', False),
+    'internal_task': (InternalTask.objects, 'title', False),
+    'external_task': (ExternalTask.objects, 'title', False),
+    'activity': (Activity.enabled, 'name', False),
+    'competition': (Competition.enabled, 'name', False),
+    'forum': (ForumBoard.enabled, 'name', False),
+}
+# 对象类型 -> 来源名
+OBJECT_TYPES = {
+    'user': 'user',
+    'team': 'team',
+    'member_need': 'need',
+    'outsource_need': 'need',
+    'undertake_need': 'need',
+    'internal_task': 'internal_task',
+    'external_task': 'external_task',
+    'activity': 'activity',
+    'competition': 'competition',
+    'forum': 'forum',
+}
+NEED_TYPES = ('member_need', 'outsource_need', 'undertake_need')
+TASK_TYPES = ('internal_task', 'external_task')
+SYSTEM_TYPES = ('activity', 'competition', 'forum')
+
+
+def object_ref(action):
+    """动态的对象名称取自哪个对象，返回 (类型, ID) 或 None"""
+
+    if action.object_type in ('user', 'team') + NEED_TYPES + TASK_TYPES:
+        return action.object_type, action.object_id
+    if action.related_object_type in SYSTEM_TYPES:
+        return action.related_object_type, action.related_object_id
+    return None
+
+
+def related_object_ref(action):
+    """动态的相关对象名称取自哪个对象，返回 (类型, ID) 或 None"""
+
+    if action.related_object_type in ('user', 'team') + NEED_TYPES:
+        return action.related_object_type, action.related_object_id
+    if action.object_type in TASK_TYPES:
+        return action.object_type, action.object_id
+    if action.related_object_type in SYSTEM_TYPES:
+        return action.related_object_type, action.related_object_id
+    return None
+
+
+def object_icon_ref(action):
+    """动态的对象头像取自哪个对象，返回 (类型, ID) 或 None"""
+
+    if action.object_type in ('user', 'team'):
+        return action.object_type, action.object_id
+    return None
+
+
+class ActionObjects(object):
+    """批量读取一页动态涉及的对象
+
+    按来源归并所有对象 ID，每个来源只执行一次 id__in 查询，
+    序列化时用 object_name、related_object_name、object_icon 查表
+    """
+
+    def __init__(self, actions):
+        ids = {}
+        for a in actions:
+            for ref in (object_ref(a), related_object_ref(a), object_icon_ref(a)):
+                if ref is not None and ref[1] is not None:
+                    ids.setdefault(OBJECT_TYPES[ref[0]], set()).add(ref[1])
+        self._objects = {}
+        for source, source_ids in ids.items():
+            manager, field, has_icon = OBJECT_SOURCES[source]
+            fields = ('id', field, 'icon') if has_icon else ('id', field)
+            self._objects[source] = {
+                o.id: o for o in manager.filter(id__in=source_ids).only(*fields)}
+
+    def _get(self, ref):
+        if ref is None:
+            return None
+        return self._objects.get(OBJECT_TYPES[ref[0]], {}).get(ref[1])
+
+    def _name(self, ref):
+        o = self._get(ref)
+        if o is None:
+            return ""
+        return getattr(o, OBJECT_SOURCES[OBJECT_TYPES[ref[0]]][1])
+
+    def object_name(self, action):
+        """获取对象的名称（或者标题）"""
+
+        return self._name(object_ref(action))
+
+    def related_object_name(self, action):
+        """获取相关对象的名称（或者标题）"""
+
+        return self._name(related_object_ref(action))
+
+    def object_icon(self, action):
+        """获取对象的头像"""
+
+        o = self._get(object_icon_ref(action))
+        return o.icon if o is not None else ""
+
+
 def get_object_name(action):
-    """ 获取对象的名称（或者标题）"""
-
-    try:
-        if action.object_type == "user":
-            name = User.enabled.get(id=action.object_id).name
-        elif action.object_type == "team":
-            name = Team.enabled.get(id=action.object_id).name
-        elif action.object_type == "member_need":
-            name = TeamNeed.objects.get(id=action.object_id).title
-        elif action.object_type == "outsource_need":
-            name = TeamNeed.objects.get(id=action.object_id).title
-        elif action.object_type == "undertake_need":
-            name = TeamNeed.objects.get(id=action.object_id).title
-        elif action.object_type == "internal_task":
-            name = InternalTask.objects.get(id=action.object_id).title
-        elif action.object_type == "external_task":
-            name = ExternalTask.objects.get(id=action.object_id).title
-        elif action.related_object_type == "activity":
-            name = Activity.enabled.get(id=action.related_object_id).name
-        elif action.related_object_type == "competition":
-            name = Competition.enabled.get(id=action.related_object_id).name
-        elif action.related_object_type == "forum":
-            name = ForumBoard.enabled.get(id=action.related_object_id).name
-        else:
-            name = ""
-        return name
-    except ObjectDoesNotExist:
-        return ""
+    """ 获取对象的名称（或者标题），多条动态请使用 ActionObjects"""
+
+    return ActionObjects([action]).object_name(action)
 
 
-@transaction.atomic
 def get_related_object_name(action):
-    """ 获取相关对象的名称（或者标题）"""
-
-    try:
-        if action.related_object_type == "user":
-            name = User.enabled.get(id=action.related_object_id).name
-        elif action.related_object_type == "team":
-            name = Team.enabled.get(id=action.related_object_id).name
-        elif action.related_object_type == "member_need":
-            name = TeamNeed.objects.get(id=action.related_object_id).title
-        elif action.related_object_type == "outsource_need":
-            name = TeamNeed.objects.get(id=action.related_object_id).title
-        elif action.related_object_type == "undertake_need":
-            name = TeamNeed.objects.get(id=action.related_object_id).title
-        elif action.object_type == "internal_task":
-            name = InternalTask.objects.get(id=action.object_id).title
-        elif action.object_type == "external_task":
-            name = ExternalTask.objects.get(id=action.object_id).title
-        elif action.related_object_type == "activity":
-            name = Activity.enabled.get(id=action.related_object_id).name
-        elif action.related_object_type == "competition":
-            name = Competition.enabled.get(id=action.related_object_id).name
-        elif action.related_object_type == "forum":
-            name = ForumBoard.enabled.get(id=action.related_object_id).name
-        else:
-            name = ""
-        return name
-    except ObjectDoesNotExist:
-        return ""
+    """ 获取相关对象的名称（或者标题），多条动态请使用 ActionObjects"""
+
+    return ActionObjects([action]).related_object_name(action)
 
 
-@transaction.atomic
 def get_object_icon(action):
-    """ 获取对象的头像"""
+    """ 获取对象的头像，多条动态请使用 ActionObjects"""
 
-    if action.object_type == "user":
-        icon = User.enabled.get(id=action.object_id).icon
-    elif action.object_type == "team":
-        icon = Team.enabled.get(id=action.object_id).icon
-    else:
-        icon = ""
-    return icon
+    return ActionObjects([action]).object_icon(action)
 
 
 @transaction.atomic
@@ -96,16 +143,14 @@ def create_team(user, team):
                         object_type='team', object_id=team.id)
     team.actions.create(action='create_team',
                         object_type='user', object_id=user.id)
-    for u in user.followers.all():
-        notify_user(u.follower, json.dumps({
-            'type': 'user_action',
-            'content': user.name + '创建了团队' + team.name
-        }))
-    for t in team.followers.all():
-        notify_user(t.follower, json.dumps({
-            'type': 'team_action',
-            'content': user.name + '创建了团队' + team.name
-        }))
+    notify_followers(user.followers, json.dumps({
+        'type': 'user_action',
+        'content': user.name + '创建了团队' + team.name
+    }))
+    notify_followers(team.followers, json.dumps({
+        'type': 'team_action',
+        'content': user.name + '创建了团队' + team.name
+    }))
 
 
 @transaction.atomic
@@ -114,11 +159,10 @@ def send_forum(user, forum):
 
     user.actions.create(action='create',
                         object_type='forum', object_id=forum.id)
-    for u in user.followers.all():
-        notify_user(u.follower, json.dumps({
-            'type': 'user_action',
-            'content': user.name + '创建了论坛' + forum.name
-        }))
+    notify_followers(user.followers, json.dumps({
+        'type': 'user_action',
+        'content': user.name + '创建了论坛' + forum.name
+    }))
 
 
 @transaction.atomic
@@ -129,16 +173,14 @@ def join_team(user, team):
                         object_type='team', object_id=team.id)
     team.actions.create(action='join',
                         object_type='user', object_id=user.id)
-    for u in user.followers.all():
-        notify_user(u.follower, json.dumps({
-            'type': 'user_action',
-            'content': user.name + '加入了团队' + team.name
-        }))
-    for t in team.followers.all():
-        notify_user(t.follower, json.dumps({
-            'type': 'team_action',
-            'content': user.name + '加入了团队' + team.name
-        }))
+    notify_followers(user.followers, json.dumps({
+        'type': 'user_action',
+        'content': user.name + '加入了团队' + team.name
+    }))
+    notify_followers(team.followers, json.dumps({
+        'type': 'team_action',
+        'content': user.name + '加入了团队' + team.name
+    }))
 
 
 @transaction.atomic
@@ -149,16 +191,14 @@ def leave_team(user, team):
                         object_type='team', object_id=team.id)
     team.actions.create(action='leave',
                         object_type='user', object_id=user.id)
-    for u in user.followers.all():
-        notify_user(u.follower, json.dumps({
-            'type': 'user_action',
-            'content': user.name + '退出了团队' + team.name
-        }))
-    for t in team.followers.all():
-        notify_user(t.follower, json.dumps({
-            'type': 'team_action',
-            'content': user.name + '退出了团队' + team.name
-        }))
+    notify_followers(user.followers, json.dumps({
+        'type': 'user_action',
+        'content': user.name + '退出了团队' + team.name
+    }))
+    notify_followers(team.followers, json.dumps({
+        'type': 'team_action',
+        'content': user.name + '退出了团队' + team.name
+    }))
 
 
 @transaction.atomic
@@ -173,11 +213,10 @@ def finish_external_task(team, task):
                              object_type='team', object_id=team.id,
                              related_object_type='external_task',
                              related_object_id=task.id)
-    for t in team.followers.all():
-        notify_user(t.follower, json.dumps({
-            'type': 'team_action',
-            'content': team.name + '完成了任务' + task.title
-        }))
+    notify_followers(team.followers, json.dumps({
+        'type': 'team_action',
+        'content': team.name + '完成了任务' + task.title
+    }))
 
 
 @transaction.atomic
@@ -186,11 +225,10 @@ def send_member_need(team, need):
 
     team.actions.create(action='send',
                         object_type='member_need', object_id=need.id)
-    for t in team.followers.all():
-        notify_user(t.follower, json.dumps({
-            'type': 'team_action',
-            'content': team.name + '发布了需求' + need.title
-        }))
+    notify_followers(team.followers, json.dumps({
+        'type': 'team_action',
+        'content': team.name + '发布了需求' + need.title
+    }))
 
 
 @transaction.atomic
@@ -199,11 +237,10 @@ def send_outsource_need(team, need):
 
     team.actions.create(action='send',
                         object_type='outsource_need', object_id=need.id)
-    for t in team.followers.all():
-        notify_user(t.follower, json.dumps({
-            'type': 'team_action',
-            'content': team.name + '发布了需求' + need.title
-        }))
+    notify_followers(team.followers, json.dumps({
+        'type': 'team_action',
+        'content': team.name + '发布了需求' + need.title
+    }))
 
 
 @transaction.atomic
@@ -212,11 +249,10 @@ def send_undertake_need(team, need):
 
     team.actions.create(action='send',
                         object_type='undertake_need', object_id=need.id)
-    for t in team.followers.all():
-        notify_user(t.follower, json.dumps({
-            'type': 'team_action',
-            'content': team.name + '发布了需求' + need.title
-        }))
+    notify_followers(team.followers, json.dumps({
+        'type': 'team_action',
+        'content': team.name + '发布了需求' + need.title
+    }))
 
 
 @transaction.atomic
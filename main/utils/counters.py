@@ -0,0 +1,71 @@
+# 冗余计数字段的维护
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+
+from main.models import User, UserComment, UserFollower, UserLiker, UserVisitor, \
+    Team, TeamComment, TeamFollower, TeamLiker, TeamMember, TeamVisitor, \
+    Lab, LabComment, LabFollower, LabLiker, LabMember, LabVisitor, \
+    Activity, ActivityComment, Competition, CompetitionComment, CompetitionFollower, \
+    CompetitionLiker, Topic, TopicComment, TopicFollower, TopicLiker, \
+    UserAction, UserActionComment, UserActionLiker, TeamAction, TeamActionComment, \
+    TeamActionLiker, LabAction, LabActionComment, LabActionLiker, \
+    SystemAction, SystemActionComment, SystemActionLiker
+from main.models.activity.people import ActivityFollower, ActivityLiker
+
+# (关系模型, 指向实体的外键字段, 实体模型, 计数字段)
+COUNTERS = [
+    (UserComment, 'entity', User, 'comment_count'),
+    (UserFollower, 'followed', User, 'follower_count'),
+    (UserLiker, 'liked', User, 'liker_count'),
+    (UserVisitor, 'visited', User, 'visitor_count'),
+    (TeamComment, 'entity', Team, 'comment_count'),
+    (TeamFollower, 'followed', Team, 'follower_count'),
+    (TeamLiker, 'liked', Team, 'liker_count'),
+    (TeamMember, 'team', Team, 'member_count'),
+    (TeamVisitor, 'visited', Team, 'visitor_count'),
+    (LabComment, 'entity', Lab, 'comment_count'),
+    (LabFollower, 'followed', Lab, 'follower_count'),
+    (LabLiker, 'liked', Lab, 'liker_count'),
+    (LabMember, 'lab', Lab, 'member_count'),
+    (LabVisitor, 'visited', Lab, 'visitor_count'),
+    (ActivityComment, 'entity', Activity, 'comment_count'),
+    (ActivityFollower, 'followed', Activity, 'follower_count'),
+    (ActivityLiker, 'liked', Activity, 'liker_count'),
+    (CompetitionComment, 'entity', Competition, 'comment_count'),
+    (CompetitionFollower, 'followed', Competition, 'follower_count'),
+    (CompetitionLiker, 'liked', Competition, 'liker_count'),
+    (TopicComment, 'entity', Topic, 'comment_count'),
+    (TopicFollower, 'followed', Topic, 'follower_count'),
+    (TopicLiker, 'liked', Topic, 'liker_count'),
+    (UserActionComment, 'entity', UserAction, 'comment_count'),
+    (UserActionLiker, 'liked', UserAction, 'liker_count'),
+    (TeamActionComment, 'entity', TeamAction, 'comment_count'),
+    (TeamActionLiker, 'liked', TeamAction, 'liker_count'),
+    (LabActionComment, 'entity', LabAction, 'comment_count'),
+    (LabActionLiker, 'liked', LabAction, 'liker_count'),
+    (SystemActionComment, 'entity', SystemAction, 'comment_count'),
+    (SystemActionLiker, 'liked', SystemAction, 'liker_count'),
+]
+
+
+def counter_receivers(field, entity, counter):
+    """关系记录创建时计数加一，删除时减一"""
+
+    attname = field + '_id'
+
+    def created(sender, instance, created, **kwargs):
+        if created:
+            entity.objects.filter(id=getattr(instance, attname)).update(**{counter: F(counter) + 1})
+
+    def deleted(sender, instance, **kwargs):
+        entity.objects.filter(id=getattr(instance, attname)).update(**{counter: F(counter) - 1})
+
+    return created, deleted
+
+
+for _model, _field, _entity, _counter in COUNTERS:
+    _created, _deleted = counter_receivers(_field, _entity, _counter)
+    post_save.connect(_created, sender=_model, weak=False,
+                      dispatch_uid='counter_%s_created' % _model.__name__)
+    post_delete.connect(_deleted, sender=_model, weak=False,
+                        dispatch_uid='counter_%s_deleted' % _model.__name__)
@@ -1,9 +1,8 @@
 from functools import wraps
 
-from main.models import System
-from main.models.role import Role
-from ..models.user import User
+from util.auth import token_cache, lazy_user
 from ..utils import abort
+from ..utils.system import system_snapshot
 
 __all__ = ['require_role_token', 'require_verification_token', 'fetch_user_by_token']
 
@@ -18,18 +17,17 @@ def require_verification_token(function):
         token = request.META.get('HTTP_X_USER_TOKEN')
         if not token:
             abort(401, '缺少参数token')
-        try:
-            user = User.objects.get(token=token)
-            if user.is_enabled:
-                if user.is_verified not in [2, 4]:
-                    abort(403, '请先实名认证')
-                request.user = user
-                request.param = System.objects.get(
-                    role__name=user.role if user.role else Role.objects.get(name__isnull=True).name)
-                return function(self, request, *args, **kwargs)
-            abort(403, '用户已删除')
-        except User.DoesNotExist:
+        entry = token_cache.get(token)
+        if entry is None:
             abort(404, '用户不存在')
+        if not entry.is_enabled:
+            abort(403, '用户已删除')
+        if entry.is_verified not in [2, 4]:
+            abort(403, '请先实名认证')
+        request.user = lazy_user(entry)
+        request.user_id = entry.user_id
+        request.param = system_snapshot.role_param(entry.role)
+        return function(self, request, *args, **kwargs)
 
     return decorator
 
@@ -42,20 +40,19 @@ def require_role_token(function):
         token = request.META.get('HTTP_X_USER_TOKEN')
         if not token:
             abort(401, '缺少参数token')
-        try:
-            user = User.objects.get(token=token)
-            if user.is_enabled:
-                if user.is_verified not in [2, 4]:
-                    abort(403, '请先实名认证')
-                elif user.is_role_verified != 2:
-                    abort(403, '请先资格认证')
-                request.user = user
-                request.param = System.objects.get(
-                    role__name=user.role if user.role else Role.objects.get(name__isnull=True).name)
-                return function(self, request, *args, **kwargs)
-            abort(403, '用户已删除')
-        except User.DoesNotExist:
+        entry = token_cache.get(token)
+        if entry is None:
             abort(404, '用户不存在')
+        if not entry.is_enabled:
+            abort(403, '用户已删除')
+        if entry.is_verified not in [2, 4]:
+            abort(403, '请先实名认证')
+        elif entry.is_role_verified != 2:
+            abort(403, '请先资格认证')
+        request.user = lazy_user(entry)
+        request.user_id = entry.user_id
+        request.param = system_snapshot.role_param(entry.role)
+        return function(self, request, *args, **kwargs)
 
     return decorator
 
@@ -66,15 +63,15 @@ def fetch_user_by_token(request, force=False):
         if force:
             abort(401, '缺少参数token')
         return False
-    try:
-        user = User.objects.get(token=token)
-        if user.is_enabled:
-            request.user = user
-            return True
-        if force:
-            abort(403, '用户已删除')
-        return False
-    except User.DoesNotExist:
+    entry = token_cache.get(token)
+    if entry is None:
         if force:
             abort(404, '用户不存在')
         return False
+    if entry.is_enabled:
+        request.user = lazy_user(entry)
+        request.user_id = entry.user_id
+        return True
+    if force:
+        abort(403, '用户已删除')
+    return False
@@ -1,10 +1,12 @@
-import urllib.parse, http.client
-import urllib.request
 import json
 import tencentyun
 from qcloud_image import Client
 from qcloud_image import CIUrls
 
+from ChuangYi import settings
+from util.integration import integration, UpstreamUnavailable
+from .abort import abort
+
 
 def identity_verify(id_number, real_number, m="GET"):
     """第三方身份证实名认证api(聚合数据)"""
@@ -15,13 +17,15 @@ def identity_verify(id_number, real_number, m="GET"):
         "realname": real_number,  # 真实姓名
         "key": appkey,  # 申请的appkey
     }
-    params = urllib.parse.urlencode(params)
-    if m == "GET":
-        f = urllib.request.urlopen("%s?%s" % (url, params))
-    else:
-        f = urllib.request.urlopen(url, params)
-    content = f.read().decode('utf-8')
-    res = json.loads(content)
+    # 接口熔断、超时或返回非 JSON 的错误页时快速失败
+    try:
+        if m == "GET":
+            f = integration.get('juhe_idcard', url, params=params)
+        else:
+            f = integration.post('juhe_idcard', url, data=params)
+        res = f.json()
+    except (UpstreamUnavailable, ValueError):
+        abort(503, '实名认证服务暂不可用，请稍后再试')
     if res['error_code'] == 0:
         if res['result']['res'] == 1:
             return 1
@@ -58,25 +62,25 @@ def picture_verify(picture):
 
 def eid_verify(data):
     """调用eID接口进行认证"""
-    url = "127.0.0.1"
+    url = "http://127.0.0.1:8080/apserver/login"
     data = json.dumps(data)
     headers = {"Content-type": "application/json"}
-    conn = http.client.HTTPConnection(url, 8080)
-    conn.request('POST', '/apserver/login', data, headers)
-    response = conn.getresponse()
-    content = response.read().decode('utf-8')
-    res = json.loads(content)
+    try:
+        res = integration.post('eid', url, data=data, headers=headers).json()
+    except (UpstreamUnavailable, ValueError):
+        abort(503, 'eID认证服务暂不可用，请稍后再试')
     if res['result'] == "00":
         return 1
     else:
         return int(res['result_detail'])
 
 
-def notify_user(user, msg):
-    """调用个推通知"""
-    if user.getui_id != "":
-        url = "127.0.0.1"
-        data = "client=" + user.getui_id + "&msg=" + msg
-        conn = http.client.HTTPConnection(url, 7999)
-        conn.request('POST', '/index.php', data)
-        response = conn.getresponse()
+def send_notification(client, msg):
+    """调用个推通知，返回是否成功"""
+
+    data = "client=" + client + "&msg=" + msg
+    try:
+        response = integration.post('getui', settings.NOTIFY_URL, data=data.encode('utf-8'))
+    except UpstreamUnavailable:
+        return False
+    return response.status_code == 200
@@ -1,9 +1,140 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
 from functools import wraps
 
+from django.db import close_old_connections
+from django.db.models import F
+
+from ChuangYi import settings
 from main.models import User
 from modellib.models.log import AppLog
 from modellib.models.recommend.event import AppEvent
 
+logger = logging.getLogger(__name__)
+
+
+class AppEventCache(object):
+    """事件名 -> 奖励积分，每隔 APP_EVENT_CACHE_TTL 秒整体重新读取"""
+
+    def __init__(self):
+        self.time_loaded = 0
+        self._grades = {}
+
+    def grade(self, event_name):
+        now = time.time()
+        if now - self.time_loaded >= settings.APP_EVENT_CACHE_TTL:
+            self._grades = dict(AppEvent.objects.values_list('name', 'grade'))
+            self.time_loaded = now
+        return self._grades.get(event_name, 0)
+
+
+app_event_cache = AppEventCache()
+
+
+class AppLogBuffer(object):
+    """日志缓冲区
+
+    请求线程只把日志追加到环形缓冲区，由后台线程在数量达到 APP_LOG_FLUSH_SIZE
+    或距上次写入超过 APP_LOG_FLUSH_INTERVAL 秒时批量写入；
+    缓冲区已满时丢弃最早的日志。积分按用户合并后用一条 UPDATE 累加。
+    进程退出时写入剩余的日志。
+    """
+
+    def __init__(self, maxsize):
+        self.dropped = 0
+        self._logs = deque(maxlen=maxsize)
+        self._scores = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+    def add(self, log, user_id=None, grade=0):
+        with self._lock:
+            if len(self._logs) == self._logs.maxlen:
+                self.dropped += 1
+            self._logs.append(log)
+            if user_id is not None and grade != 0:
+                self._scores[user_id] = self._scores.get(user_id, 0) + grade
+            size = len(self._logs)
+        self._ensure_thread()
+        if size >= settings.APP_LOG_FLUSH_SIZE:
+            self._wakeup.set()
+
+    def _ensure_thread(self):
+        # 多进程部署时在 fork 之后的子进程中启动线程
+        if self._pid == os.getpid() or self._closed:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='app-log-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(settings.APP_LOG_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('failed to write app logs')
+
+    def flush(self):
+        with self._lock:
+            logs = list(self._logs)
+            self._logs.clear()
+            scores, self._scores = self._scores, {}
+        # 日志和积分分别写入，任何一方失败时放回缓冲区，下次再写
+        try:
+            if logs:
+                AppLog.objects.bulk_create(logs, batch_size=settings.APP_LOG_FLUSH_SIZE)
+        except Exception:
+            self._requeue_logs(logs)
+            logger.exception('failed to write app logs')
+        applied = []
+        try:
+            for user_id, grade in scores.items():
+                User.objects.filter(id=user_id).update(score=F('score') + grade)
+                applied.append(user_id)
+        except Exception:
+            for user_id in applied:
+                del scores[user_id]
+            self._requeue_scores(scores)
+            logger.exception('failed to update user scores')
+
+    def _requeue_logs(self, logs):
+        with self._lock:
+            # 放在新日志之前，缓冲区放不下时丢弃最早的日志
+            room = self._logs.maxlen - len(self._logs)
+            if room < len(logs):
+                self.dropped += len(logs) - room
+                logs = logs[len(logs) - room:] if room > 0 else []
+            self._logs.extendleft(reversed(logs))
+
+    def _requeue_scores(self, scores):
+        with self._lock:
+            for user_id, grade in scores.items():
+                self._scores[user_id] = self._scores.get(user_id, 0) + grade
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(settings.APP_LOG_FLUSH_INTERVAL)
+        self.flush()
+
+
+app_log_buffer = AppLogBuffer(settings.APP_LOG_BUFFER_SIZE)
+atexit.register(app_log_buffer.close)
+
 
 def app_log(event_name=None):
     def decorator(function):
@@ -11,24 +142,24 @@ def app_log(event_name=None):
         def inner(self, request, *args, **kwargs):
             response = function(self, request, *args, **kwargs)
 
-            user = request.user if hasattr(request, 'user') else None
+            # 认证时已从令牌得到用户 id，不必为此读取用户
+            user_id = getattr(request, 'user_id', None)
+            if user_id is None and getattr(request, 'user', None) is not None:
+                user_id = request.user.id
 
             # 记录日志
             log = AppLog()
             log.url = request.path_info
-            log.user = user
+            log.user_id = user_id
             log.event = event_name
             log.ip = request.META['HTTP_X_REAL_IP']
             log.mac = request.META['HTTP_X_MAC']
             log.location = request.META['HTTP_X_LOCATION']
             log.manufacturers = request.META['HTTP_X_MANUFACTURERS']
-            log.save()
 
             # 记录积分
-            if event_name and user is not None:
-                a = AppEvent.objects.filter(name=event_name).first()
-                if a is not None and a.grade != 0:
-                    User.objects.filter(id=user.id).update(score=user.score + a.grade)
+            grade = app_event_cache.grade(event_name) if event_name and user_id is not None else 0
+            app_log_buffer.add(log, user_id, grade)
             return response
 
         return inner
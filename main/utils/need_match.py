@@ -0,0 +1,81 @@
+# 外包需求与承接需求的匹配记录维护
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from main.models.need import TeamNeed, TeamNeedMatch
+
+# 需求类型 -> 可与之匹配的需求类型
+OPPOSITE_TYPES = {
+    TeamNeed.TYPE_OUTSOURCE: TeamNeed.TYPE_UNDERTAKE,
+    TeamNeed.TYPE_UNDERTAKE: TeamNeed.TYPE_OUTSOURCE,
+}
+
+MATCH_FIELDS = ('id', 'team_id', 'type', 'field', 'status', 'deadline',
+                'time_started', 'time_ended')
+
+
+def match_score(need, other):
+    """other 所属团队对 need 的匹配分数"""
+
+    score = 1
+    if need.time_started is not None and other.time_started is not None \
+            and need.time_started >= other.time_started:
+        score += 1
+    if need.time_ended is not None and other.time_ended is not None \
+            and need.time_ended <= other.time_ended:
+        score += 1
+    return score
+
+
+def match(need, other):
+    return TeamNeedMatch(need_id=need.id, matched_need_id=other.id,
+                         team_id=other.team_id, score=match_score(need, other),
+                         deadline=other.deadline)
+
+
+def opposite_needs(need):
+    return TeamNeed.objects.filter(
+        type=OPPOSITE_TYPES[need.type], field=need.field).only(*MATCH_FIELDS)
+
+
+def need_matches(need):
+    """need 的候选：领域相同、未关闭、在 need 开始前结束的对方需求"""
+
+    if need.type not in OPPOSITE_TYPES or need.time_started is None:
+        return []
+    return [match(need, other) for other in opposite_needs(need).filter(
+        status=0, time_ended__lt=need.time_started)]
+
+
+@transaction.atomic
+def update_need_matches(need):
+    """需求创建、修改或关闭后，重新计算与之相关的匹配记录"""
+
+    TeamNeedMatch.objects.filter(Q(need=need) | Q(matched_need=need)).delete()
+    if need.type not in OPPOSITE_TYPES:
+        return
+    matches = need_matches(need)
+    # need 作为其他需求的候选
+    if need.status == 0 and need.time_ended is not None:
+        matches.extend(match(other, need) for other in opposite_needs(need).filter(
+            time_started__gt=need.time_ended))
+    TeamNeedMatch.objects.bulk_create(matches)
+
+
+@transaction.atomic
+def rebuild_need_matches():
+    """重建全部匹配记录，返回记录数"""
+
+    TeamNeedMatch.objects.all().delete()
+    matches = []
+    for need in TeamNeed.objects.filter(type__in=list(OPPOSITE_TYPES)).only(*MATCH_FIELDS):
+        matches.extend(need_matches(need))
+    TeamNeedMatch.objects.bulk_create(matches, batch_size=1000)
+    return len(matches)
+
+
+@receiver(post_save, sender=TeamNeed)
+def need_saved(sender, instance, **kwargs):
+    update_need_matches(instance)
@@ -0,0 +1,195 @@
+# 个推通知的发件箱与后台发送
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from ChuangYi import settings
+from main.utils.http import send_notification
+from modellib.models.notification import Notification
+
+logger = logging.getLogger(__name__)
+
+
+def notify_user(user, msg):
+    """通知一个用户，在当前事务提交后由后台线程发送"""
+
+    if user.getui_id != "":
+        enqueue([user.getui_id], msg)
+
+
+def notify_followers(followers, msg):
+    """通知所有关注者，followers 为关注记录的查询集，如 user.followers"""
+
+    enqueue(followers.exclude(follower__getui_id='').values_list(
+        'follower__getui_id', flat=True), msg)
+
+
+def enqueue(clients, msg):
+    Notification.objects.bulk_create(
+        [Notification(client=c, msg=msg) for c in clients],
+        batch_size=settings.NOTIFY_BATCH_SIZE)
+    transaction.on_commit(dispatcher.wakeup)
+
+
+class NotificationDispatcher(object):
+    """发件箱的发送线程
+
+    每次认领一批到期的通知，按目标分组并去掉重复的消息后逐条发送
+    （转发服务每个请求只接受一条消息，同一目标的消息无法合并为一个请求）；
+    失败的通知按 NOTIFY_RETRY_BASE * 2^重试次数 秒退避重试，
+    超过 NOTIFY_MAX_ATTEMPTS 次后标记为失败。
+    认领通过更新 claim 和 time_next 完成，多个进程可以同时运行。
+    统计信息从发件箱读取，任何进程中都能得到；每批的发送结果另记一行 JSON 日志
+    """
+
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+    def stats(self):
+        """发件箱的统计信息，延迟为最近 NOTIFY_STATS_SIZE 条已发送通知从入队到发送完成的秒数"""
+
+        counts = dict(Notification.objects.order_by().values_list('status').annotate(n=Count('id')))
+        delays = sorted((t1 - t0).total_seconds() for t0, t1 in Notification.objects.filter(
+            status=Notification.STATUS_SENT).order_by('-time_sent').values_list(
+            'time_created', 'time_sent')[:settings.NOTIFY_STATS_SIZE])
+        return {
+            'queue_depth': counts.get(Notification.STATUS_PENDING, 0) +
+                           counts.get(Notification.STATUS_SENDING, 0),
+            'sent': counts.get(Notification.STATUS_SENT, 0),
+            'failed': counts.get(Notification.STATUS_FAILED, 0),
+            'retrying': Notification.objects.filter(
+                status=Notification.STATUS_PENDING, attempts__gt=0).count(),
+            'delay_avg': sum(delays) / len(delays) if delays else 0,
+            'delay_p95': delays[int(len(delays) * 0.95)] if delays else 0,
+        }
+
+    def purge(self, days=None):
+        """删除 days 天前已发送或已失败的通知，返回删除的条数"""
+
+        days = days or settings.NOTIFY_RETENTION_DAYS
+        before = timezone.now() - timedelta(days=days)
+        deleted = 0
+        for qs in (Notification.objects.filter(status=Notification.STATUS_SENT, time_sent__lt=before),
+                   Notification.objects.filter(status=Notification.STATUS_FAILED, time_created__lt=before)):
+            # 分批删除，避免长时间锁表
+            while True:
+                ids = list(qs.values_list('id', flat=True)[:settings.NOTIFY_BATCH_SIZE])
+                if not ids:
+                    break
+                deleted += Notification.objects.filter(id__in=ids).delete()[0]
+        return deleted
+
+    def wakeup(self):
+        if settings.NOTIFY_DISPATCHER_THREAD:
+            self._ensure_thread()
+        self._wakeup.set()
+
+    def _ensure_thread(self):
+        # 多进程部署时在 fork 之后的子进程中启动线程
+        if self._pid == os.getpid() or self._closed:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.run, name='notification-dispatcher', daemon=True)
+            self._thread.start()
+
+    def run(self):
+        while not self._closed:
+            self._wakeup.wait(settings.NOTIFY_POLL_INTERVAL)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                # 一直发送到没有到期的通知为止
+                while not self._closed and self.dispatch():
+                    pass
+            except Exception:
+                logger.exception('failed to dispatch notifications')
+
+    def claim(self):
+        """认领一批到期的通知"""
+
+        now = timezone.now()
+        due = Q(status__in=(Notification.STATUS_PENDING, Notification.STATUS_SENDING),
+                time_next__lte=now)
+        ids = list(Notification.objects.filter(due).order_by('time_next').values_list(
+            'id', flat=True)[:settings.NOTIFY_BATCH_SIZE])
+        if not ids:
+            return []
+        token = uuid.uuid4().hex
+        Notification.objects.filter(due, id__in=ids).update(
+            status=Notification.STATUS_SENDING, claim=token,
+            time_next=now + timedelta(seconds=settings.NOTIFY_CLAIM_TIMEOUT))
+        return list(Notification.objects.filter(claim=token, status=Notification.STATUS_SENDING))
+
+    def dispatch(self):
+        """发送一批通知，返回本批的通知数"""
+
+        notifications = self.claim()
+        # 目标 -> 消息 -> 通知
+        targets = OrderedDict()
+        for n in notifications:
+            targets.setdefault(n.client, OrderedDict()).setdefault(n.msg, []).append(n)
+
+        sent, failed = [], []
+        latencies = []
+        for client, messages in targets.items():
+            for msg, group in messages.items():
+                started = time.time()
+                ok = send_notification(client, msg)
+                latencies.append((time.time() - started) * 1000)
+                (sent if ok else failed).extend(group)
+
+        now = timezone.now()
+        if sent:
+            Notification.objects.filter(id__in=[n.id for n in sent]).update(
+                status=Notification.STATUS_SENT, time_sent=now)
+        # 按重试次数分组更新
+        given_up = retried = 0
+        retries = {}
+        for n in failed:
+            retries.setdefault(n.attempts + 1, []).append(n.id)
+        for attempts, ids in retries.items():
+            if attempts >= settings.NOTIFY_MAX_ATTEMPTS:
+                Notification.objects.filter(id__in=ids).update(
+                    status=Notification.STATUS_FAILED, attempts=attempts)
+                given_up += len(ids)
+            else:
+                delay = min(settings.NOTIFY_RETRY_BASE * 2 ** (attempts - 1), settings.NOTIFY_RETRY_MAX)
+                Notification.objects.filter(id__in=ids).update(
+                    status=Notification.STATUS_PENDING, attempts=attempts,
+                    time_next=now + timedelta(seconds=delay))
+                retried += len(ids)
+        if notifications:
+            logger.info(json.dumps({
+                'notifications': len(notifications), 'requests': len(latencies),
+                'sent': len(sent), 'failed': given_up, 'retried': retried,
+                'latency_avg': round(sum(latencies) / len(latencies), 1) if latencies else 0,
+                'latency_max': round(max(latencies), 1) if latencies else 0,
+            }))
+        return len(notifications)
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(settings.NOTIFY_SHUTDOWN_TIMEOUT)
+
+
+dispatcher = NotificationDispatcher()
+atexit.register(dispatcher.close)
@@ -0,0 +1,89 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# 把 SQL 中的字面量替换为占位符，得到查询的“形状”
+SQL_STRING = re.compile(r"'(?:[^'\\]|\\.)*'")
+SQL_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+SQL_IN_LIST = re.compile(r'IN \((?:\?, )*\?\)')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """请求的查询数超过 QUERY_BUDGET，QUERY_BUDGET_STRICT 开启时抛出，用于在测试中发现问题"""
+
+
+def query_shape(sql):
+    sql = SQL_STRING.sub('?', sql)
+    sql = SQL_NUMBER.sub('?', sql)
+    return SQL_IN_LIST.sub('IN (...)', sql)
+
+
+# noinspection PyMethodMayBeStatic
+class QueryBudgetMiddleware(object):
+    """统计每个请求的 SQL 查询数与耗时
+
+    在响应头 X-Query-Count、X-DB-Time（毫秒）中返回，并为每个请求记录一行 JSON 日志；
+    同一形状的查询出现 QUERY_REPEAT_THRESHOLD 次以上时视为 N+1 查询一并记录，
+    超出 QUERY_BUDGET 的请求以 WARNING 级别记录。
+    需要记录 SQL，有额外开销，只在 QUERY_STATS 开启时统计；
+    设置从 django.conf 读取，测试中可以用 override_settings 开启
+    """
+
+    def process_request(self, request):
+        if not settings.QUERY_STATS:
+            return
+        marks = {}
+        for conn in connections.all():
+            # queries_log 是有长度上限的 deque，写满后按下标截取会错位，
+            # 连接是线程独占的，在请求开始时清空即可
+            marks[conn.alias] = conn.force_debug_cursor
+            conn.force_debug_cursor = True
+            conn.queries_log.clear()
+        request.query_marks = marks
+        request.time_started = time.time()
+
+    def process_response(self, request, response):
+        marks = getattr(request, 'query_marks', None)
+        if marks is None:
+            return response
+        queries = []
+        for conn in connections.all():
+            if conn.alias not in marks:
+                continue
+            conn.force_debug_cursor = marks[conn.alias]
+            queries.extend(conn.queries_log)
+
+        db_time = sum(float(q['time']) for q in queries) * 1000
+        shapes = Counter(query_shape(q['sql']) for q in queries)
+        repeated = [{'sql': sql, 'count': count} for sql, count in shapes.most_common()
+                    if count >= settings.QUERY_REPEAT_THRESHOLD]
+        response['X-Query-Count'] = str(len(queries))
+        response['X-DB-Time'] = '%.1f' % db_time
+
+        budget = settings.QUERY_BUDGET
+        over_budget = budget is not None and len(queries) > budget
+        logger.log(logging.WARNING if over_budget else logging.INFO, json.dumps({
+            'method': request.method,
+            'path': request.path_info,
+            'status': response.status_code,
+            'queries': len(queries),
+            'db_time': round(db_time, 1),
+            'time': round((time.time() - request.time_started) * 1000, 1),
+            'fetch_queries_saved': getattr(request, 'fetch_queries_saved', 0),
+            'budget': budget,
+            'over_budget': over_budget,
+            'repeated': repeated,
+        }, ensure_ascii=False))
+
+        if over_budget and settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded('%s %s: %d queries, budget %d, repeated: %s' % (
+                request.method, request.path_info, len(queries), budget,
+                ', '.join('%d x %s' % (r['count'], r['sql']) for r in repeated)))
+        return response
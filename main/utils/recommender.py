@@ -1,24 +1,246 @@
 # 个性化推荐相关函数
-import json
+import heapq
+import logging
+import threading
+import time
+from collections import OrderedDict
 
-from django.core.exceptions import ObjectDoesNotExist
-from main.models import UserBehavior
+import numpy as np
+from django.db import connection
+from django.db.models import F
+
+from ChuangYi import settings
+from main.models import UserBehavior, UserFeature, TeamFeature, LabFeature
+from modellib.models import ServerConfig
+
+logger = logging.getLogger(__name__)
+
+# 实体类型 -> (特征模型, 外键字段)
+FEATURE_MODELS = {
+    'user': (UserFeature, 'user_id'),
+    'team': (TeamFeature, 'team_id'),
+    'lab': (LabFeature, 'lab_id'),
+}
+
+# 单次查询读取的特征向量数
+FEATURE_QUERY_CHUNK_SIZE = 1000
+
+EMPTY_VECTOR = (np.zeros(0, dtype='<u4'), np.zeros(0, dtype='<f4'))
+
+
+class FeatureCache(object):
+    """进程内的特征向量 LRU 缓存
+
+    键为 (实体类型, 实体id, 特征版本)，特征版本由 build_models 在写入新数据后递增，
+    每隔 FEATURE_VERSION_CHECK_INTERVAL 秒检查一次，版本变化时清空缓存
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.version = None
+        self.time_checked = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def stats(self):
+        return {'size': len(self._data), 'maxsize': self.maxsize,
+                'hits': self.hits, 'misses': self.misses, 'version': self.version}
+
+    def invalidate(self):
+        with self._lock:
+            self._data.clear()
+            self.version = None
+            self.time_checked = 0
+
+    def sync(self):
+        """检查特征版本，版本变化时清空缓存"""
+
+        now = time.time()
+        if now - self.time_checked < settings.FEATURE_VERSION_CHECK_INTERVAL:
+            return
+        version = ServerConfig.objects.values_list('feature_version', flat=True).first()
+        with self._lock:
+            if version != self.version:
+                self._data.clear()
+                self.version = version
+            self.time_checked = now
+
+    def get(self, entity_type, entity_id):
+        """返回实体的特征向量 (标签id数组, 分数数组)，没有特征模型时返回空向量"""
+
+        return self.get_many(entity_type, [entity_id])[entity_id]
+
+    def get_many(self, entity_type, ids):
+        """批量返回特征向量，未缓存的用一次查询读取"""
+
+        self.sync()
+        result = {}
+        missing = []
+        with self._lock:
+            for i in ids:
+                key = (entity_type, i, self.version)
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    result[i] = self._data[key]
+                    self.hits += 1
+                else:
+                    missing.append(i)
+                    self.misses += 1
+        if missing:
+            model, field = FEATURE_MODELS[entity_type]
+            for k in range(0, len(missing), FEATURE_QUERY_CHUNK_SIZE):
+                chunk = missing[k:k + FEATURE_QUERY_CHUNK_SIZE]
+                for i, vector in model.objects.filter(
+                        **{field + '__in': chunk}).values_list(field, 'vector'):
+                    result[i] = model.unpack_vector(vector)
+            with self._lock:
+                for i in missing:
+                    result.setdefault(i, EMPTY_VECTOR)
+                    self._data[(entity_type, i, self.version)] = result[i]
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return result
+
+
+feature_cache = FeatureCache(settings.FEATURE_CACHE_SIZE)
+
+
+def bump_feature_version():
+    """特征模型有更新时调用，使各进程的特征向量缓存失效"""
+
+    ServerConfig.objects.update(feature_version=F('feature_version') + 1)
+    feature_cache.invalidate()
+
+
+class FeatureIndex(object):
+    """特征标签的倒排索引
+
+    实体类型 -> 标签id -> 升序排列的实体 id 数组。进程内首次使用时同步构建；
+    特征版本变化后由后台线程重建，重建完成前继续使用旧索引，不在请求中扫描全表
+    """
+
+    def __init__(self):
+        # 实体类型 -> (特征版本, 倒排索引)
+        self._postings = {}
+        self._building = set()
+        self._lock = threading.Lock()
+
+    def candidates(self, entity_type, tag_ids):
+        """返回至少含有 tag_ids 中一个标签的实体 id 数组（升序）"""
+
+        postings = self.postings(entity_type)
+        arrays = [postings[t] for t in tag_ids.tolist() if t in postings]
+        if not arrays:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(arrays))
+
+    def postings(self, entity_type):
+        feature_cache.sync()
+        version = feature_cache.version
+        with self._lock:
+            current = self._postings.get(entity_type)
+            if current is None:
+                current = self._postings[entity_type] = (version, self.build(entity_type))
+            elif current[0] != version and entity_type not in self._building:
+                self._building.add(entity_type)
+                threading.Thread(target=self._rebuild, args=(entity_type, version),
+                                 name='feature-index-%s' % entity_type, daemon=True).start()
+            return current[1]
+
+    def _rebuild(self, entity_type, version):
+        try:
+            postings = self.build(entity_type)
+            with self._lock:
+                self._postings[entity_type] = (version, postings)
+        except Exception:
+            logger.exception('failed to rebuild feature index')
+        finally:
+            with self._lock:
+                self._building.discard(entity_type)
+            connection.close()
+
+    @staticmethod
+    def build(entity_type):
+        model, field = FEATURE_MODELS[entity_type]
+        tags, ids = [], []
+        for i, vector in model.objects.values_list(field, 'vector').iterator():
+            tag_ids, _ = model.unpack_vector(vector)
+            tags.append(tag_ids.astype(np.int64))
+            ids.append(np.full(len(tag_ids), i, dtype=np.int64))
+        if not tags:
+            return {}
+        tags, ids = np.concatenate(tags), np.concatenate(ids)
+        order = np.lexsort((ids, tags))
+        tags, ids = tags[order], ids[order]
+        boundaries = np.flatnonzero(np.diff(tags)) + 1
+        starts = np.concatenate(([0], boundaries)).astype(np.int64)
+        return dict(zip(tags[starts].tolist(), np.split(ids, boundaries)))
+
+
+feature_index = FeatureIndex()
+
+
+def rank_by_feature(queryset, entity_type, viewer, offset, limit):
+    """按与 viewer 的特征相似度对 queryset 排序，返回 [offset, offset + limit) 的实体
+
+    结果与对全部实体打分后稳定排序再切片一致：只有与 viewer 有共同标签的实体分数大于 0，
+    用倒排索引找出这些实体并用堆保留前 offset + limit 个，其余实体分数为 0，
+    保持 queryset 原有顺序排在后面
+    """
+
+    end = offset + limit
+    viewer_vector = feature_cache.get('user', viewer.id)
+    candidates = feature_index.candidates(entity_type, viewer_vector[0]).tolist()
+
+    # 只保留满足筛选条件的候选实体
+    rows = []
+    for k in range(0, len(candidates), FEATURE_QUERY_CHUNK_SIZE):
+        rows.extend(queryset.filter(
+            id__in=candidates[k:k + FEATURE_QUERY_CHUNK_SIZE]).values_list('id', 'time_created'))
+    vectors = feature_cache.get_many(entity_type, [i for i, _ in rows])
+    scored = []
+    for i, time_created in rows:
+        score = ranking_score(viewer_vector, vectors[i])
+        if score > 0:
+            scored.append((score, time_created, i))
+    top = heapq.nlargest(end, scored)
+    ids = [i for _, _, i in top[offset:end]]
+
+    # 分数为 0 的实体
+    if len(ids) < limit:
+        start = max(offset - len(scored), 0)
+        zero = queryset.exclude(id__in=[i for _, _, i in scored])
+        ids.extend(zero.values_list('id', flat=True)[start:start + limit - len(ids)])
+
+    objects = queryset.in_bulk(ids)
+    return [objects[i] for i in ids if i in objects]
 
 
 def calculate_ranking_score(object0, object1):
     """计算排序分数"""
 
-    try:
-        m0 = json.loads(object0.feature_model.data)
-        m1 = json.loads(object1.feature_model.data)
-    except ObjectDoesNotExist:
-        return 0
+    v0 = feature_cache.get(object0._meta.model_name, object0.id)
+    v1 = feature_cache.get(object1._meta.model_name, object1.id)
+    return ranking_score(v0, v1)
+
+
+def ranking_score(v0, v1):
+    """两个特征向量共同标签的分数较小值之和
 
-    score = 0
-    common_tags = set(m0.keys()) & set(m1.keys())
-    for t in common_tags:
-        score += min(m0[t], m1[t])
-    return score
+    特征向量为 (标签id数组, 分数数组)，标签 id 升序排列，
+    在 v1 中二分查找 v0 的各个标签即可得到共同标签
+    """
+
+    ids0, weights0 = v0
+    ids1, weights1 = v1
+    if len(ids0) == 0 or len(ids1) == 0:
+        return 0
+    pos = np.searchsorted(ids1, ids0)
+    pos[pos == len(ids1)] = 0
+    common = ids1[pos] == ids0
+    return float(np.minimum(weights0[common], weights1[pos[common]]).sum())
 
 
 def record_view_user(current_user, user):
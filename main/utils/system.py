@@ -1,9 +1,94 @@
+import threading
+import time
+
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from ChuangYi import settings
+from modellib.models import ServerConfig
+from ..models.role import Role
 from ..models.system import System
 from ..utils import abort
 
 
+class SystemSnapshot(object):
+    """进程内的系统设定量快照
+
+    首次使用时一次性读取全部 System 及其对应的角色名，此后只读快照；
+    系统设定或角色保存时递增 ServerConfig.system_version，
+    各进程每隔 SYSTEM_VERSION_CHECK_INTERVAL 秒检查一次版本，版本变化时重新读取。
+    快照中的 System 实例由各请求共享，只能读取，不能修改。
+    """
+
+    def __init__(self):
+        self.version = None
+        self.time_checked = 0
+        self._by_id = {}
+        self._by_role = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self.version = None
+            self.time_checked = 0
+
+    def sync(self):
+        """检查系统设定版本，版本变化时重新读取"""
+
+        now = time.time()
+        if self.version is not None and \
+                now - self.time_checked < settings.SYSTEM_VERSION_CHECK_INTERVAL:
+            return
+        version = ServerConfig.objects.values_list('system_version', flat=True).first() or 0
+        with self._lock:
+            if version != self.version:
+                by_id = {s.id: s for s in System.objects.all()}
+                self._by_role = {name: by_id[param_id] for name, param_id in
+                                 Role.objects.values_list('name', 'param_id') if param_id in by_id}
+                self._by_id = by_id
+                self.version = version
+            self.time_checked = now
+
+    def get(self, system_id=1):
+        """按 id 返回系统设定，默认为全局设定"""
+
+        self.sync()
+        system = self._by_id.get(system_id)
+        if system is None:
+            abort(500, '系统设定不存在')
+        return system
+
+    def role_param(self, role):
+        """角色对应的系统设定，没有角色的用户使用名称为空的角色"""
+
+        self.sync()
+        system = self._by_role.get(role or None)
+        if system is None:
+            abort(500, '角色的系统设定不存在')
+        return system
+
+
+system_snapshot = SystemSnapshot()
+
+
+def bump_system_version():
+    """系统设定或角色有更新时调用，使各进程的快照失效"""
+
+    ServerConfig.objects.update(system_version=F('system_version') + 1)
+    system_snapshot.invalidate()
+
+
+@receiver(post_save, sender=System)
+@receiver(post_delete, sender=System)
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def system_changed(sender, **kwargs):
+    bump_system_version()
+
+
 def get_score_stage(stage=1):
-    system = System.objects.get(id=1)
+    system = system_snapshot.get()
     if stage == 1:
         return system.SCORE_VALUE_ONE
     elif stage == 2:
@@ -0,0 +1,133 @@
+# 标签倒排索引，用于按标签推荐用户、团队、实验室
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from ChuangYi import settings
+from main.models import UserTag, TeamTag, LabTag
+
+# 实体类型 -> 标签模型
+TAG_MODELS = {
+    'user': UserTag,
+    'team': TeamTag,
+    'lab': LabTag,
+}
+TAG_KINDS = {model: kind for kind, model in TAG_MODELS.items()}
+
+
+class MemoryTagIndexBackend(object):
+    """进程内的索引存储
+
+    接口与 Redis 的有序集合操作对应（标签名作为键，实体 id 作为成员），
+    需要多进程共享时可替换为同样接口的实现
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._attrs = {}
+
+    def clear(self, kind):
+        self._postings[kind] = {}
+        self._attrs[kind] = {}
+
+    def add(self, kind, name, entity_id, attrs):
+        ids = self._postings[kind].setdefault(name, [])
+        i = bisect_left(ids, entity_id)
+        if i == len(ids) or ids[i] != entity_id:
+            insort(ids, entity_id)
+        self._attrs[kind][entity_id] = attrs
+
+    def remove(self, kind, name, entity_id):
+        ids = self._postings[kind].get(name, [])
+        i = bisect_left(ids, entity_id)
+        if i < len(ids) and ids[i] == entity_id:
+            del ids[i]
+
+    def members(self, kind, name):
+        return self._postings[kind].get(name, [])
+
+    def attrs(self, kind, entity_id):
+        return self._attrs[kind].get(entity_id)
+
+
+class TagIndex(object):
+    """标签名 -> 升序排列的实体 id 列表
+
+    首次使用时一次性读取全部标签，此后由标签的保存、删除信号增量维护；
+    信号只在当前进程触发，因此每隔 TAG_INDEX_REFRESH_INTERVAL 秒全量重建一次，
+    以同步其他进程的修改
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._time_loaded = {}
+        self._lock = threading.RLock()
+
+    def ensure_loaded(self, kind):
+        now = time.time()
+        if now - self._time_loaded.get(kind, 0) < settings.TAG_INDEX_REFRESH_INTERVAL:
+            return
+        with self._lock:
+            rows = TAG_MODELS[kind].objects.filter(entity__is_enabled=True).order_by().values_list(
+                'entity_id', 'name', 'entity__time_created', 'entity__name')
+            self.backend.clear(kind)
+            for entity_id, name, time_created, entity_name in rows:
+                self.backend.add(kind, name, entity_id, (time_created, entity_name))
+            self._time_loaded[kind] = now
+
+    def add(self, kind, tag):
+        if kind not in self._time_loaded:
+            return
+        with self._lock:
+            entity = tag.entity
+            self.backend.add(kind, tag.name, entity.id, (entity.time_created, entity.name))
+
+    def remove(self, kind, tag):
+        if kind not in self._time_loaded:
+            return
+        with self._lock:
+            self.backend.remove(kind, tag.name, tag.entity_id)
+
+    def match(self, kind, names, order):
+        """返回与 names 有共同标签的实体 id，按共同标签数降序、再按 order 排序
+
+        :param order: time_created, -time_created, name, -name 之一
+        """
+
+        self.ensure_loaded(kind)
+        with self._lock:
+            postings = [list(self.backend.members(kind, n)) for n in set(names)]
+            # 多路归并有序的 id 列表，相邻的相同 id 即为共同标签
+            counts = []
+            for entity_id in heapq.merge(*postings):
+                if counts and counts[-1][0] == entity_id:
+                    counts[-1][1] += 1
+                else:
+                    counts.append([entity_id, 1])
+            attrs = {i: self.backend.attrs(kind, i) for i, _ in counts}
+
+        field = 1 if order.lstrip('-') == 'name' else 0
+        counts.sort(key=lambda x: attrs[x[0]][field], reverse=order.startswith('-'))
+        counts.sort(key=lambda x: x[1], reverse=True)
+        return [i for i, _ in counts]
+
+
+tag_index = TagIndex(MemoryTagIndexBackend())
+
+
+@receiver(post_save, sender=UserTag)
+@receiver(post_save, sender=TeamTag)
+@receiver(post_save, sender=LabTag)
+def tag_saved(sender, instance, **kwargs):
+    tag_index.add(TAG_KINDS[sender], instance)
+
+
+@receiver(post_delete, sender=UserTag)
+@receiver(post_delete, sender=TeamTag)
+@receiver(post_delete, sender=LabTag)
+def tag_deleted(sender, instance, **kwargs):
+    tag_index.remove(TAG_KINDS[sender], instance)
@@ -0,0 +1,198 @@
+# 动态收件箱（写扩散）
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+
+from ChuangYi import settings
+from main.models import UserAction, TeamAction, LabAction, UserFollower, \
+    TeamFollower, LabFollower, UserTimeline, TeamTimeline, LabTimeline
+from main.utils import abort
+from util.paginator import Page, count_cache, encode_cursor, decode_cursor
+
+
+class TimelinePage(Page):
+    """收件箱与拉取部分合并后的一页动态
+
+    count 为合并后可以翻到的动态数：收件箱中的动态加上拉取部分中不在收件箱里的动态，
+    收件箱截断掉的旧动态不计入
+    """
+
+    def __init__(self, items, next_cursor, inbox, pulled):
+        super(TimelinePage, self).__init__(items, next_cursor, None)
+        self._inbox = inbox
+        self._pulled = pulled
+
+    @property
+    def count(self):
+        c = count_cache.count(self._inbox)
+        if self._pulled is not None:
+            c += count_cache.count(self._pulled.exclude(id__in=self._inbox.values('action_id')))
+        return c
+
+
+class Timeline(object):
+    """一类动态的收件箱
+
+    对象产生动态时把动态写入所有关注者的收件箱，读取时按 (time_created, action_id)
+    倒序范围扫描收件箱；关注者超过 TIMELINE_FANOUT_LIMIT 的对象不写入收件箱，
+    读取时从动态表拉取其动态后合并。收件箱只保留最近 TIMELINE_SIZE 条，由 build_timelines 截断
+    """
+
+    def __init__(self, inbox, action_model, follower_model):
+        self.inbox = inbox
+        self.action_model = action_model
+        self.follower_model = follower_model
+
+    @staticmethod
+    def is_hot(entity):
+        return entity.follower_count > settings.TIMELINE_FANOUT_LIMIT
+
+    def push(self, action):
+        """把新动态写入主语的所有关注者的收件箱"""
+
+        if self.is_hot(action.entity):
+            return
+        followers = self.follower_model.objects.filter(
+            followed_id=action.entity_id).values_list('follower_id', flat=True)
+        self.inbox.objects.bulk_create(
+            [self.inbox(user_id=i, entity_id=action.entity_id, action_id=action.id,
+                        time_created=action.time_created) for i in followers],
+            batch_size=settings.TIMELINE_BATCH_SIZE)
+
+    def backfill(self, user_id, entity, size=None):
+        """关注对象时把其最近的动态补写到收件箱"""
+
+        if self.is_hot(entity):
+            return
+        size = size or settings.TIMELINE_BACKFILL
+        recent = list(self.action_model.objects.filter(entity=entity).order_by(
+            '-time_created', '-id').values_list('id', 'time_created')[:size])
+        existing = set(self.inbox.objects.filter(
+            user_id=user_id, action_id__in=[i for i, _ in recent]).values_list('action_id', flat=True))
+        self.inbox.objects.bulk_create(
+            [self.inbox(user_id=user_id, entity_id=entity.id, action_id=i, time_created=t)
+             for i, t in recent if i not in existing],
+            batch_size=settings.TIMELINE_BATCH_SIZE)
+
+    def refill(self, entity_id, size=None):
+        """对象的关注者数降回 TIMELINE_FANOUT_LIMIT 时，把其最近的动态补写到所有关注者的收件箱
+
+        超过阈值期间产生的动态没有写入收件箱，降回后读取时也不再拉取
+        """
+
+        size = size or settings.TIMELINE_BACKFILL
+        recent = list(self.action_model.objects.filter(entity_id=entity_id).order_by(
+            '-time_created', '-id').values_list('id', 'time_created')[:size])
+        if not recent:
+            return
+        followers = self.follower_model.objects.filter(
+            followed_id=entity_id).values_list('follower_id', flat=True)
+        existing = set(self.inbox.objects.filter(
+            entity_id=entity_id, action_id__in=[i for i, _ in recent]).values_list('user_id', 'action_id'))
+        self.inbox.objects.bulk_create(
+            [self.inbox(user_id=u, entity_id=entity_id, action_id=i, time_created=t)
+             for u in followers for i, t in recent if (u, i) not in existing],
+            batch_size=settings.TIMELINE_BATCH_SIZE)
+
+    def remove(self, user_id, entity_id):
+        """取消关注时从收件箱删除该对象的动态"""
+
+        self.inbox.objects.filter(user_id=user_id, entity_id=entity_id).delete()
+
+    def trim(self, user_id, size=None):
+        """只保留收件箱中最近的 size 条动态，返回删除的条数"""
+
+        size = size or settings.TIMELINE_SIZE
+        qs = self.inbox.objects.filter(user_id=user_id)
+        boundary = qs.order_by('-time_created', '-action_id').values_list(
+            'time_created', 'action_id')[size:size + 1]
+        if not boundary:
+            return 0
+        t, i = boundary[0]
+        deleted = qs.filter(Q(time_created__lt=t) | Q(time_created=t, action_id__lte=i)).delete()
+        return deleted[0]
+
+    def page(self, user, cursor=None, offset=0, limit=10, condition=None):
+        """读取用户的一页动态，返回按创建时间倒序的动态列表
+
+        condition 为作用于动态主语的查询条件，如 Q(entity__role__contains='专家')
+        """
+
+        condition = condition or Q()
+        inbox = self.inbox.objects.filter(user=user).filter(condition)
+        hot = list(self.follower_model.objects.filter(
+            follower=user, followed__follower_count__gt=settings.TIMELINE_FANOUT_LIMIT
+        ).values_list('followed_id', flat=True))
+        pulled = self.action_model.objects.filter(entity_id__in=hot).filter(condition) if hot else None
+
+        inbox_rows, pulled_rows = inbox, pulled
+        if cursor:
+            try:
+                t, i = decode_cursor(cursor)
+                t = self.inbox._meta.get_field('time_created').to_python(t)
+                i = int(i)
+            except (ValueError, TypeError, ValidationError):
+                abort(400, 'invalid cursor')
+            inbox_rows = inbox_rows.filter(Q(time_created__lt=t) | Q(time_created=t, action_id__lt=i))
+            if pulled_rows is not None:
+                pulled_rows = pulled_rows.filter(Q(time_created__lt=t) | Q(time_created=t, id__lt=i))
+            offset = 0
+
+        n = offset + limit + 1
+        rows = list(inbox_rows.order_by('-time_created', '-action_id').values_list(
+            'time_created', 'action_id')[:n])
+        if pulled_rows is not None:
+            rows.extend(pulled_rows.order_by('-time_created', '-id').values_list(
+                'time_created', 'id')[:n])
+            rows.sort(reverse=True)
+        # 对象关注者数越过阈值前写入收件箱的动态也会被拉取，按动态 ID 去重
+        seen = set()
+        rows = [r for r in rows if not (r[1] in seen or seen.add(r[1]))]
+        rows = rows[offset:offset + limit + 1]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            if rows:
+                next_cursor = encode_cursor(list(rows[-1]))
+        actions = self.action_model.objects.select_related('entity').in_bulk([i for _, i in rows])
+        items = [actions[i] for _, i in rows if i in actions]
+        return TimelinePage(items, next_cursor, inbox, pulled)
+
+
+user_timeline = Timeline(UserTimeline, UserAction, UserFollower)
+team_timeline = Timeline(TeamTimeline, TeamAction, TeamFollower)
+lab_timeline = Timeline(LabTimeline, LabAction, LabFollower)
+TIMELINES = [user_timeline, team_timeline, lab_timeline]
+
+
+def timeline_receivers(timeline):
+    def action_created(sender, instance, created, **kwargs):
+        if created:
+            timeline.push(instance)
+
+    def followed(sender, instance, created, **kwargs):
+        if created:
+            timeline.backfill(instance.follower_id, instance.followed)
+
+    def unfollowed(sender, instance, **kwargs):
+        timeline.remove(instance.follower_id, instance.followed_id)
+        # 计数字段的信号先于此处执行，读到的是取消关注后的关注者数
+        entity = sender._meta.get_field('followed').related_model
+        count = entity.objects.filter(id=instance.followed_id).values_list(
+            'follower_count', flat=True).first()
+        if count == settings.TIMELINE_FANOUT_LIMIT:
+            timeline.refill(instance.followed_id)
+
+    return action_created, followed, unfollowed
+
+
+for _timeline in TIMELINES:
+    _action_created, _followed, _unfollowed = timeline_receivers(_timeline)
+    _name = _timeline.inbox.__name__
+    post_save.connect(_action_created, sender=_timeline.action_model, weak=False,
+                      dispatch_uid='timeline_%s_push' % _name)
+    post_save.connect(_followed, sender=_timeline.follower_model, weak=False,
+                      dispatch_uid='timeline_%s_backfill' % _name)
+    post_delete.connect(_unfollowed, sender=_timeline.follower_model, weak=False,
+                        dispatch_uid='timeline_%s_remove' % _name)
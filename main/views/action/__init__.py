@@ -6,12 +6,14 @@ from django.views.generic import View
 from main.models import UserAction
 from main.utils import action
 from util.decorator.param import validate_args
+from util.paginator import CURSOR_FIELD, paginate
 
 
 class ScreenUserActionList(View):
     @validate_args({
         'offset': forms.IntegerField(required=False, min_value=0),
         'limit': forms.IntegerField(required=False, min_value=0),
+        'cursor': CURSOR_FIELD,
         'name': forms.CharField(required=False, max_length=20),
         'gender': forms.IntegerField(required=False, min_value=0, max_value=2),
         'province': forms.CharField(required=False, max_length=20),
@@ -21,11 +23,12 @@ class ScreenUserActionList(View):
         'unit1': forms.CharField(required=False, max_length=20),
         'action': forms.CharField(required=False, max_length=20),
     })
-    def get(self, request, offset=0, limit=10, **kwargs):
+    def get(self, request, offset=0, limit=10, cursor=None, **kwargs):
         """筛选与用户名或者动态名相关的动态列表
 
         :param offset: 偏移量
         :param limit: 数量上限
+        :param cursor: 上一页返回的 next_cursor，传入时忽略 offset
         :param kwargs: 筛选条件
             name: 用户名或动态名包含字段
             gender: 主体的性别
@@ -38,6 +41,7 @@ class ScreenUserActionList(View):
 
         :return:
             count: 动态总数（包括标记为disabled的内容）
+            next_cursor: 下一页的游标，没有下一页时为 null
             last_time_created: 最近更新时间
             list: 动态列表
                 action_id: 动态id
@@ -93,8 +97,9 @@ class ScreenUserActionList(View):
             r = r.filter(action__icontains=act)
 
         r = r.all()
-        c = r.count()
-        records = (i for i in r[offset:offset + limit])
+        page = paginate(r, cursor, offset, limit)
+        records = page.items
+        names = action.ActionObjects(records)
         l = [{'id': i.entity.id,
               'action_id': i.id,
               'name': i.entity.name,
@@ -102,13 +107,13 @@ class ScreenUserActionList(View):
               'action': i.action,
               'object_type': i.object_type,
               'object_id': i.object_id,
-              'object_name': action.get_object_name(i),
-              'icon_url': action.get_object_icon(i),
+              'object_name': names.object_name(i),
+              'icon_url': names.object_icon(i),
               'related_object_type': i.related_object_type,
               'related_object_id': i.related_object_id,
-              'related_object_name': action.get_related_object_name(i),
-              'liker_count': i.likers.count(),
-              'comment_count': i.comments.count(),
+              'related_object_name': names.related_object_name(i),
+              'liker_count': i.liker_count,
+              'comment_count': i.comment_count,
               'time_created': i.time_created,
               } for i in records]
-        return JsonResponse({'count': c, 'list': l})
\ No newline at end of file
+        return JsonResponse({'count': page.count, 'next_cursor': page.next_cursor, 'list': l})
\ No newline at end of file
@@ -5,8 +5,10 @@ from django.views.generic import View
 
 from main.models import TeamAction
 from main.utils import action
+from main.utils.timeline import team_timeline
 from util.decorator.auth import app_auth
 from util.decorator.param import validate_args
+from util.paginator import CURSOR_FIELD, paginate
 
 
 class FollowedTeamActionList(View):
@@ -14,14 +16,17 @@ class FollowedTeamActionList(View):
     @validate_args({
         'offset': forms.IntegerField(required=False, min_value=0),
         'limit': forms.IntegerField(required=False, min_value=0),
+        'cursor': CURSOR_FIELD,
     })
-    def get(self, request, offset=0, limit=10):
+    def get(self, request, offset=0, limit=10, cursor=None):
         """获取当前用户所关注的团队的动态列表
 
         :param offset: 偏移量
         :param limit: 数量上限
+        :param cursor: 上一页返回的 next_cursor，传入时忽略 offset
         :return:
             count: 动态总数（包括标记为disabled的内容）
+            next_cursor: 下一页的游标，没有下一页时为 null
             last_time_created: 最近更新时间
             list: 动态列表
                 action_id: 动态id
@@ -41,10 +46,9 @@ class FollowedTeamActionList(View):
                 time_created: 创建时间
         """
 
-        r = TeamAction.objects.filter(
-            Q(entity__followers__follower=request.user))
-        c = r.count()
-        records = (i for i in r[offset:offset + limit])
+        page = team_timeline.page(request.user, cursor, offset, limit)
+        records = page.items
+        names = action.ActionObjects(records)
         l = [{'id': i.entity.id,
               'action_id': i.id,
               'name': i.entity.name,
@@ -52,22 +56,23 @@ class FollowedTeamActionList(View):
               'action': i.action,
               'object_type': i.object_type,
               'object_id': i.object_id,
-              'object_name': action.get_object_name(i),
-              'icon_url': action.get_object_icon(i),
+              'object_name': names.object_name(i),
+              'icon_url': names.object_icon(i),
               'related_object_type': i.related_object_type,
               'related_object_id': i.related_object_id,
-              'related_object_name': action.get_related_object_name(i),
-              'liker_count': i.likers.count(),
-              'comment_count': i.comments.count(),
+              'related_object_name': names.related_object_name(i),
+              'liker_count': i.liker_count,
+              'comment_count': i.comment_count,
               'time_created': i.time_created,
               } for i in records]
-        return JsonResponse({'count': c, 'list': l, 'code': 0})
+        return JsonResponse({'count': page.count, 'next_cursor': page.next_cursor, 'list': l, 'code': 0})
 
 
 class ScreenTeamActionList(View):
     @validate_args({
         'offset': forms.IntegerField(required=False, min_value=0),
         'limit': forms.IntegerField(required=False, min_value=0),
+        'cursor': CURSOR_FIELD,
         'name': forms.CharField(required=False, max_length=20),
         'province': forms.CharField(required=False, max_length=20),
         'city': forms.CharField(required=False, max_length=20),
@@ -75,11 +80,12 @@ class ScreenTeamActionList(View):
         'field': forms.CharField(required=False, max_length=10),
         'action': forms.CharField(required=False, max_length=20),
     })
-    def get(self, request, offset=0, limit=10, **kwargs):
+    def get(self, request, offset=0, limit=10, cursor=None, **kwargs):
         """筛选与团队名或者动态名相关的动态列表
 
         :param offset: 偏移量
         :param limit: 数量上限
+        :param cursor: 上一页返回的 next_cursor，传入时忽略 offset
         :param kwargs: 筛选条件
             name: 团队名或动态名包含字段
             province: 主体的省
@@ -90,6 +96,7 @@ class ScreenTeamActionList(View):
 
         :return:
             count: 动态总数（包括标记为disabled的内容）
+            next_cursor: 下一页的游标，没有下一页时为 null
             last_time_created: 最近更新时间
             list: 动态列表
                 action_id: 动态id
@@ -137,8 +144,9 @@ class ScreenTeamActionList(View):
             r = r.filter(action__icontains=act)
 
         r = r.all()
-        c = r.count()
-        records = (i for i in r[offset:offset + limit])
+        page = paginate(r, cursor, offset, limit)
+        records = page.items
+        names = action.ActionObjects(records)
         l = [{'id': i.entity.id,
               'action_id': i.id,
               'name': i.entity.name,
@@ -146,13 +154,13 @@ class ScreenTeamActionList(View):
               'action': i.action,
               'object_type': i.object_type,
               'object_id': i.object_id,
-              'object_name': action.get_object_name(i),
-              'icon_url': action.get_object_icon(i),
+              'object_name': names.object_name(i),
+              'icon_url': names.object_icon(i),
               'related_object_type': i.related_object_type,
               'related_object_id': i.related_object_id,
-              'related_object_name': action.get_related_object_name(i),
-              'liker_count': i.likers.count(),
-              'comment_count': i.comments.count(),
+              'related_object_name': names.related_object_name(i),
+              'liker_count': i.liker_count,
+              'comment_count': i.comment_count,
               'time_created': i.time_created,
               } for i in records]
-        return JsonResponse({'count': c, 'list': l, 'code': 0})
\ No newline at end of file
+        return JsonResponse({'count': page.count, 'next_cursor': page.next_cursor, 'list': l, 'code': 0})
\ No newline at end of file
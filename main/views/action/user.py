@@ -5,9 +5,11 @@ from django.views.generic import View
 
 from main.models import UserAction, User
 from main.utils import action
+from main.utils.timeline import user_timeline
 from main.views.common import ActionList
 from util.decorator.auth import app_auth
 from util.decorator.param import validate_args, fetch_object
+from util.paginator import CURSOR_FIELD, paginate
 
 
 class FollowedUserActionList(View):
@@ -15,15 +17,18 @@ class FollowedUserActionList(View):
     @validate_args({
         'offset': forms.IntegerField(required=False, min_value=0),
         'limit': forms.IntegerField(required=False, min_value=0),
+        'cursor': CURSOR_FIELD,
         'is_expert': forms.IntegerField(required=False),
     })
-    def get(self, request, offset=0, limit=10, is_expert=0):
+    def get(self, request, offset=0, limit=10, cursor=None, is_expert=0):
         """获取当前用户所关注的用户的动态列表
 
         :param offset: 偏移量
         :param limit: 数量上限
+        :param cursor: 上一页返回的 next_cursor，传入时忽略 offset
         :return:
             count: 动态总数（包括标记为disabled的内容）
+            next_cursor: 下一页的游标，没有下一页时为 null
             last_time_created: 最近更新时间
             list: 动态列表
                 action_id: 动态id
@@ -43,14 +48,12 @@ class FollowedUserActionList(View):
                 time_created: 创建时间
         """
 
-        r = UserAction.objects.filter(Q(
-            entity__followers__follower=request.user))
-        if is_expert == 1:
-            r = r.filter(entity__role__contains='专家')
-        else:
-            r = r.exclude(entity__role__contains='专家')
-        c = r.count()
-        records = (i for i in r[offset:offset + limit])
+        condition = Q(entity__role__contains='专家')
+        if is_expert != 1:
+            condition = ~condition
+        page = user_timeline.page(request.user, cursor, offset, limit, condition)
+        records = page.items
+        names = action.ActionObjects(records)
         l = [{'id': i.entity.id,
               'action_id': i.id,
               'name': i.entity.name,
@@ -58,16 +61,16 @@ class FollowedUserActionList(View):
               'action': i.action,
               'object_type': i.object_type,
               'object_id': i.object_id,
-              'object_name': action.get_object_name(i),
-              'icon_url': action.get_object_icon(i),
+              'object_name': names.object_name(i),
+              'icon_url': names.object_icon(i),
               'related_object_type': i.related_object_type,
               'related_object_id': i.related_object_id,
-              'related_object_name': action.get_related_object_name(i),
-              'liker_count': i.likers.count(),
-              'comment_count': i.comments.count(),
+              'related_object_name': names.related_object_name(i),
+              'liker_count': i.liker_count,
+              'comment_count': i.comment_count,
               'time_created': i.time_created,
               } for i in records]
-        return JsonResponse({'count': c, 'list': l, 'code': 0})
+        return JsonResponse({'count': page.count, 'next_cursor': page.next_cursor, 'list': l, 'code': 0})
 
 
 class FriendActionList(View):
@@ -75,15 +78,18 @@ class FriendActionList(View):
     @validate_args({
         'offset': forms.IntegerField(required=False, min_value=0),
         'limit': forms.IntegerField(required=False, min_value=0),
+        'cursor': CURSOR_FIELD,
         'is_expert': forms.IntegerField(required=False),
     })
-    def get(self, request, offset=0, limit=10, is_expert=1):
+    def get(self, request, offset=0, limit=10, cursor=None, is_expert=1):
         """获取当前用户好友的动态列表
 
         :param offset: 偏移量
         :param limit: 数量上限
+        :param cursor: 上一页返回的 next_cursor，传入时忽略 offset
         :return:
             count: 动态总数（包括标记为disabled的内容）
+            next_cursor: 下一页的游标，没有下一页时为 null
             last_time_created: 最近更新时间
             list: 动态列表
                 action_id: 动态id
@@ -109,8 +115,9 @@ class FriendActionList(View):
             r = r.filter(entity__role__contains='专家')
         else:
             r = r.exclude(entity__role__contains='专家')
-        c = r.count()
-        records = (i for i in r[offset:offset + limit])
+        page = paginate(r, cursor, offset, limit)
+        records = page.items
+        names = action.ActionObjects(records)
         l = [{'id': i.entity.id,
               'action_id': i.id,
               'name': i.entity.real_name if i.entity.real_name != '' else i.entity.name,
@@ -118,16 +125,16 @@ class FriendActionList(View):
               'action': i.action,
               'object_type': i.object_type,
               'object_id': i.object_id,
-              'object_name': action.get_object_name(i),
-              'icon_url': action.get_object_icon(i),
+              'object_name': names.object_name(i),
+              'icon_url': names.object_icon(i),
               'related_object_type': i.related_object_type,
               'related_object_id': i.related_object_id,
-              'related_object_name': action.get_related_object_name(i),
-              'liker_count': i.likers.count(),
-              'comment_count': i.comments.count(),
+              'related_object_name': names.related_object_name(i),
+              'liker_count': i.liker_count,
+              'comment_count': i.comment_count,
               'time_created': i.time_created,
               } for i in records]
-        return JsonResponse({'count': c, 'list': l, 'code': 0})
+        return JsonResponse({'count': page.count, 'next_cursor': page.next_cursor, 'list': l, 'code': 0})
 
 
 class UserActionList(ActionList):
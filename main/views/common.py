@@ -6,6 +6,7 @@ from main.views.follow import SomethingFollower
 from main.views.like import SomethingLikers, Liker
 from util.decorator.auth import app_auth
 from util.decorator.param import validate_args, fetch_object
+from util.paginator import CURSOR_FIELD, paginate
 from ..models import User, Lab, LabComment as LabCommentModel, \
     Activity, ActivityComment as ActivityCommentModel, \
     Competition, CompetitionComment as CompetitionCommentModel, \
@@ -48,14 +49,17 @@ class ActionList(View):
     @validate_args({
         'offset': forms.IntegerField(required=False, min_value=0),
         'limit': forms.IntegerField(required=False, min_value=0),
+        'cursor': CURSOR_FIELD,
     })
-    def get(self, request, entity=None, offset=0, limit=10):
+    def get(self, request, entity=None, offset=0, limit=10, cursor=None):
         """获取对象的动态列表
 
         :param offset: 偏移量
         :param limit: 数量上限
+        :param cursor: 上一页返回的 next_cursor，传入时忽略 offset
         :return:
             count: 动态总数（包括标记为disabled的内容）
+            next_cursor: 下一页的游标，没有下一页时为 null
             last_time_created: 最近更新时间
             list: 动态列表
                 action_id: 动态id
@@ -76,8 +80,9 @@ class ActionList(View):
         """
 
         # 获取与对象相关的动态
-        c = entity.actions.count()
-        records = (i for i in entity.actions.all()[offset:offset + limit])
+        page = paginate(entity.actions.all(), cursor, offset, limit)
+        records = page.items
+        names = action.ActionObjects(records)
         l = [{'id': i.entity.id,
               'action_id': i.id,
               'name': i.entity.name,
@@ -85,30 +90,33 @@ class ActionList(View):
               'action': i.action,
               'object_type': i.object_type,
               'object_id': i.object_id,
-              'object_name': action.get_object_name(i),
-              'icon_url': action.get_object_icon(i),
+              'object_name': names.object_name(i),
+              'icon_url': names.object_icon(i),
               'related_object_type': i.related_object_type,
               'related_object_id': i.related_object_id,
-              'related_object_name': action.get_related_object_name(i),
-              'liker_count': i.likers.count(),
-              'comment_count': i.comments.count(),
+              'related_object_name': names.related_object_name(i),
+              'liker_count': i.liker_count,
+              'comment_count': i.comment_count,
               'time_created': i.time_created,
               } for i in records]
-        return JsonResponse({'count': c, 'list': l, 'code': 0})
+        return JsonResponse({'count': page.count, 'next_cursor': page.next_cursor, 'list': l, 'code': 0})
 
 
 class SystemActionsList(View):
     @validate_args({
         'offset': forms.IntegerField(required=False, min_value=0),
         'limit': forms.IntegerField(required=False, min_value=0),
+        'cursor': CURSOR_FIELD,
     })
-    def get(self, request, entity=None, offset=0, limit=10):
+    def get(self, request, entity=None, offset=0, limit=10, cursor=None):
         """获取系统的动态列表
 
         :param offset: 偏移量
         :param limit: 数量上限
+        :param cursor: 上一页返回的 next_cursor，传入时忽略 offset
         :return:
             count: 动态总数（包括标记为disabled的内容）
+            next_cursor: 下一页的游标，没有下一页时为 null
             last_time_created: 最近更新时间
             list: 动态列表
                 id: 主语的id
@@ -129,8 +137,9 @@ class SystemActionsList(View):
         """
 
         # 获取主语是系统的动态
-        c = SystemAction.objects.count()
-        records = (i for i in SystemAction.objects.all()[offset:offset + limit])
+        page = paginate(SystemAction.objects.all(), cursor, offset, limit)
+        records = page.items
+        names = action.ActionObjects(records)
         l = [{'id': i.entity.id,
               'action_id': i.id,
               'name': i.entity.name,
@@ -138,16 +147,16 @@ class SystemActionsList(View):
               'action': i.action,
               'object_type': i.object_type,
               'object_id': i.object_id,
-              'object_name': action.get_object_name(i),
-              'icon_url': action.get_object_icon(i),
+              'object_name': names.object_name(i),
+              'icon_url': names.object_icon(i),
               'related_object_type': i.related_object_type,
               'related_object_id': i.related_object_id,
-              'related_object_name': action.get_related_object_name(i),
-              'liker_count': i.likers.count(),
-              'comment_count': i.comments.count(),
+              'related_object_name': names.related_object_name(i),
+              'liker_count': i.liker_count,
+              'comment_count': i.comment_count,
               'time_created': i.time_created,
               } for i in records]
-        return JsonResponse({'count': c, 'list': l, 'code': 0})
+        return JsonResponse({'count': page.count, 'next_cursor': page.next_cursor, 'list': l, 'code': 0})
 
 
 # noinspection PyMethodOverriding
@@ -338,7 +347,7 @@ class ActivityFollowerList(SomethingFollower):
 
 # noinspection PyMethodOverriding
 class CompetitionFollowerList(SomethingFollower):
-    @fetch_object(Competition, 'competition')
+    @fetch_object(Competition.enabled, 'competition')
     @app_auth
     def get(self, request, competition):
         return super().get(request, competition)
@@ -439,7 +448,7 @@ class VisitorList(View):
                 icon_url: 头像
                 time_updated: 来访时间
         """
-        c = entity.visitors.count()
+        c = entity.visitor_count
         qs = entity.visitors.all()[offset:offset + limit]
         l = [{'id': i.visitor.id,
               'username': i.visitor.username,
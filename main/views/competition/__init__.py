@@ -259,7 +259,7 @@ class CompetitionFile(View):
         return JsonResponse({'count': c, 'list': l})
 
     @fetch_object(Competition.enabled, 'competition')
-    @fetch_object(Team.enabled, 'team')
+    @fetch_object(Team.enabled, 'team', select_related=('owner',))
     @require_verification_token
     @validate_args({
         'type': forms.IntegerField(required=False),
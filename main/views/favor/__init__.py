@@ -48,8 +48,9 @@ class FavoredActionList(View):
         elif is_expert == 0:
             obj = obj.exclude(favored__entity__role__contains='专家')
         c = obj.count()
-        qs = obj.order_by(self.ORDERS[order])[offset:offset + limit]
+        qs = list(obj.order_by(self.ORDERS[order])[offset:offset + limit])
 
+        names = action.ActionObjects(i.favored for i in qs)
         l = [{'id': i.favored.entity.id,
               'action_id': i.favored.id,
               'name': i.favored.entity.name,
@@ -57,13 +58,13 @@ class FavoredActionList(View):
               'action': i.favored.action,
               'object_type': i.favored.object_type,
               'object_id': i.favored.object_id,
-              'object_name': action.get_object_name(i.favored),
-              'icon_url': action.get_object_icon(i.favored),
+              'object_name': names.object_name(i.favored),
+              'icon_url': names.object_icon(i.favored),
               'related_object_type': i.favored.related_object_type,
               'related_object_id': i.favored.related_object_id,
-              'related_object_name': action.get_related_object_name(i.favored),
-              'liker_count': i.favored.likers.count(),
-              'comment_count': i.favored.comments.count(),
+              'related_object_name': names.related_object_name(i.favored),
+              'liker_count': i.favored.liker_count,
+              'comment_count': i.favored.comment_count,
               'time_created': i.favored.time_created,
               } for i in qs]
         return JsonResponse({'count': c, 'list': l})
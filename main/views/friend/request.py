@@ -7,7 +7,7 @@ from django.views.generic import View
 from main.models import User
 from main.utils import abort
 from main.utils.decorators import require_verification_token
-from main.utils.http import notify_user
+from main.utils.notification import notify_user
 from util.decorator.auth import app_auth
 from util.decorator.param import validate_args, fetch_object
 
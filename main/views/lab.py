@@ -16,13 +16,15 @@ from main.utils import abort, action, save_uploaded_image, get_score_stage
 from main.utils.decorators import *
 from main.utils.decorators import require_verification_token
 from main.utils.dfa import check_bad_words
-from main.utils.http import notify_user
+from main.utils.notification import notify_user
 from main.utils.recommender import calculate_ranking_score
+from main.utils.timeline import lab_timeline
 from main.views.common import CommentList
 from main.views.favor import FavoredActionList, IFavorSomething
 from main.views.like import ILikeSomething
 from util.decorator.auth import app_auth
 from util.decorator.param import validate_args, fetch_object
+from util.paginator import CURSOR_FIELD, paginate
 
 __all__ = ('List', 'Screen', 'Profile', 'Icon', 'MemberList',
            'Member', 'MemberRequestList', 'MemberRequest', 'Invitation',
@@ -76,9 +78,9 @@ class List(View):
               'name': t.name,
               'icon_url': t.icon,
               'owner_id': t.owner.id,
-              'liker_count': t.likers.count(),
-              'visitor_count': t.visitors.count(),
-              'member_count': t.members.count(),
+              'liker_count': t.liker_count,
+              'visitor_count': t.visitor_count,
+              'member_count': t.member_count,
               'fields': [t.field1, t.field2],
               'tags': [tag.name for tag in t.tags.all()],
               'time_created': t.time_created} for t in labs]
@@ -236,9 +238,9 @@ class Screen(View):
               'name': t.name,
               'icon_url': t.icon,
               'owner_id': t.owner.id,
-              'liker_count': t.likers.count(),
-              'visitor_count': t.visitors.count(),
-              'member_count': t.members.count(),
+              'liker_count': t.liker_count,
+              'visitor_count': t.visitor_count,
+              'member_count': t.member_count,
               'fields': [t.field1, t.field2],
               'tags': [tag.name for tag in t.tags.all()],
               'time_created': t.time_created} for t in labs]
@@ -291,9 +293,9 @@ class Profile(View):
         r['is_recruiting'] = lab.is_recruiting
         r['description'] = lab.description
         r['url'] = lab.url
-        r['liker_count'] = lab.likers.count()
-        r['fan_count'] = lab.followers.count()
-        r['visitor_count'] = lab.visitors.count()
+        r['liker_count'] = lab.liker_count
+        r['fan_count'] = lab.follower_count
+        r['visitor_count'] = lab.visitor_count
         r['fields'] = [lab.field1, lab.field2]
         r['advantage'] = lab.advantage
         r['business_stage'] = lab.business_stage
@@ -459,7 +461,7 @@ class MemberList(View):
         """
 
         i, j, k = offset, offset + limit, self.ORDERS[order]
-        c = lab.members.count()
+        c = lab.member_count
         rs = lab.members.order_by(k)[i:j]
         l = [{'id': r.user.id,
               'username': r.user.username,
@@ -1259,7 +1261,7 @@ class Need(View):
         need.lab.save()
         abort(200)
 
-    @fetch_object(LabNeed, 'need')
+    @fetch_object(LabNeed.objects, 'need')
     @require_verification_token
     def delete(self, request, need):
         """将需求标记成已删除"""
@@ -1497,9 +1499,9 @@ class NeedUserList(View):
                   'icon_url': r.icon,
                   'tags': [tag.name for tag in r.tags.all()],
                   'gender': r.gender,
-                  'liker_count': r.likers.count(),
-                  'follower_count': r.followers.count(),
-                  'visitor_count': r.visitors.count(),
+                  'liker_count': r.liker_count,
+                  'follower_count': r.follower_count,
+                  'visitor_count': r.visitor_count,
                   'time_created': r.time_created} for r in rs]
         else:
             c = 0
@@ -1558,9 +1560,9 @@ class NeedLabList(View):
                   'name': r.name,
                   'icon_url': r.icon,
                   'owner_id': r.owner.id,
-                  'liker_count': r.likers.count(),
-                  'visitor_count': r.visitors.count(),
-                  'member_count': r.members.count(),
+                  'liker_count': r.liker_count,
+                  'visitor_count': r.visitor_count,
+                  'member_count': r.member_count,
                   'fields': [r.field1, r.field2],
                   'tags': [tag.name for tag in r.tags.all()],
                   'time_created': r.time_created} for r in rs]
@@ -2674,6 +2676,7 @@ class ScreenLabActionList(View):
     @validate_args({
         'offset': forms.IntegerField(required=False, min_value=0),
         'limit': forms.IntegerField(required=False, min_value=0),
+        'cursor': CURSOR_FIELD,
         'name': forms.CharField(required=False, max_length=20),
         'province': forms.CharField(required=False, max_length=20),
         'city': forms.CharField(required=False, max_length=20),
@@ -2681,11 +2684,12 @@ class ScreenLabActionList(View):
         'field': forms.CharField(required=False, max_length=10),
         'action': forms.CharField(required=False, max_length=20),
     })
-    def get(self, request, offset=0, limit=10, **kwargs):
+    def get(self, request, offset=0, limit=10, cursor=None, **kwargs):
         """筛选与团队名或者动态名相关的动态列表
 
         :param offset: 偏移量
         :param limit: 数量上限
+        :param cursor: 上一页返回的 next_cursor，传入时忽略 offset
         :param kwargs: 筛选条件
             name: 团队名或动态名包含字段
             province: 主体的省
@@ -2696,6 +2700,7 @@ class ScreenLabActionList(View):
 
         :return:
             count: 动态总数（包括标记为disabled的内容）
+            next_cursor: 下一页的游标，没有下一页时为 null
             last_time_created: 最近更新时间
             list: 动态列表
                 action_id: 动态id
@@ -2715,7 +2720,7 @@ class ScreenLabActionList(View):
                 time_created: 创建时间
         """
 
-        r = Labction.objects
+        r = LabAction.objects
         name = kwargs.pop('name', '')
         if name:
             # 按用户昵称或动态名检索
@@ -2743,8 +2748,9 @@ class ScreenLabActionList(View):
             r = r.filter(action__icontains=act)
 
         r = r.all()
-        c = r.count()
-        records = (i for i in r[offset:offset + limit])
+        page = paginate(r, cursor, offset, limit)
+        records = page.items
+        names = action.ActionObjects(records)
         l = [{'id': i.entity.id,
               'action_id': i.id,
               'name': i.entity.name,
@@ -2752,16 +2758,16 @@ class ScreenLabActionList(View):
               'action': i.action,
               'object_type': i.object_type,
               'object_id': i.object_id,
-              'object_name': action.get_object_name(i),
-              'icon_url': action.get_object_icon(i),
+              'object_name': names.object_name(i),
+              'icon_url': names.object_icon(i),
               'related_object_type': i.related_object_type,
               'related_object_id': i.related_object_id,
-              'related_object_name': action.get_related_object_name(i),
-              'liker_count': i.likers.count(),
-              'comment_count': i.comments.count(),
+              'related_object_name': names.related_object_name(i),
+              'liker_count': i.liker_count,
+              'comment_count': i.comment_count,
               'time_created': i.time_created,
               } for i in records]
-        return JsonResponse({'count': c, 'list': l, 'code': 0})
+        return JsonResponse({'count': page.count, 'next_cursor': page.next_cursor, 'list': l, 'code': 0})
 
 
 class FollowedLabActionList(View):
@@ -2769,14 +2775,17 @@ class FollowedLabActionList(View):
     @validate_args({
         'offset': forms.IntegerField(required=False, min_value=0),
         'limit': forms.IntegerField(required=False, min_value=0),
+        'cursor': CURSOR_FIELD,
     })
-    def get(self, request, offset=0, limit=10):
+    def get(self, request, offset=0, limit=10, cursor=None):
         """获取当前用户所关注的团队的动态列表
 
         :param offset: 偏移量
         :param limit: 数量上限
+        :param cursor: 上一页返回的 next_cursor，传入时忽略 offset
         :return:
             count: 动态总数（包括标记为disabled的内容）
+            next_cursor: 下一页的游标，没有下一页时为 null
             last_time_created: 最近更新时间
             list: 动态列表
                 action_id: 动态id
@@ -2796,10 +2805,9 @@ class FollowedLabActionList(View):
                 time_created: 创建时间
         """
 
-        r = LabAction.objects.filter(
-            Q(entity__followers__follower=request.user))
-        c = r.count()
-        records = (i for i in r[offset:offset + limit])
+        page = lab_timeline.page(request.user, cursor, offset, limit)
+        records = page.items
+        names = action.ActionObjects(records)
         l = [{'id': i.entity.id,
               'action_id': i.id,
               'name': i.entity.name,
@@ -2807,16 +2815,16 @@ class FollowedLabActionList(View):
               'action': i.action,
               'object_type': i.object_type,
               'object_id': i.object_id,
-              'object_name': action.get_object_name(i),
-              'icon_url': action.get_object_icon(i),
+              'object_name': names.object_name(i),
+              'icon_url': names.object_icon(i),
               'related_object_type': i.related_object_type,
               'related_object_id': i.related_object_id,
-              'related_object_name': action.get_related_object_name(i),
-              'liker_count': i.likers.count(),
-              'comment_count': i.comments.count(),
+              'related_object_name': names.related_object_name(i),
+              'liker_count': i.liker_count,
+              'comment_count': i.comment_count,
               'time_created': i.time_created,
               } for i in records]
-        return JsonResponse({'count': c, 'list': l, 'code': 0})
+        return JsonResponse({'count': page.count, 'next_cursor': page.next_cursor, 'list': l, 'code': 0})
 
 
 class FollowedLabList(View):
@@ -2989,9 +2997,9 @@ class RelatedLabList(View):
               'name': t.lab.name,
               'icon_url': t.lab.icon,
               'owner_id': t.lab.owner.id,
-              'liker_count': t.lab.likers.count(),
-              'visitor_count': t.lab.visitors.count(),
-              'member_count': t.lab.members.count(),
+              'liker_count': t.lab.liker_count,
+              'visitor_count': t.lab.visitor_count,
+              'member_count': t.lab.member_count,
               'fields': [t.lab.field1, t.lab.field2],
               'tags': [tag.name for tag in t.lab.tags.all()],
               'time_created': t.lab.time_created} for t in labs]
@@ -3039,9 +3047,9 @@ class OwnedLabList(View):
               'name': t.name,
               'icon_url': t.icon,
               'owner_id': t.owner.id,
-              'liker_count': t.likers.count(),
-              'visitor_count': t.visitors.count(),
-              'member_count': t.members.count(),
+              'liker_count': t.liker_count,
+              'visitor_count': t.visitor_count,
+              'member_count': t.member_count,
               'fields': [t.field1, t.field2],
               'tags': [tag.name for tag in t.tags.all()],
               'time_created': t.time_created} for t in labs]
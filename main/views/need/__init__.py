@@ -24,7 +24,7 @@ class Need(View):
                       'cost', 'cost_unit', 'time_started', 'time_ended',
                       'deadline', 'province', 'city', 'county')
 
-    @fetch_object(TeamNeed.objects, 'need')
+    @fetch_object(TeamNeed.objects, 'need', select_related=('team',))
     @app_auth
     def get(self, request, need):
         """获取需求详情
@@ -123,7 +123,7 @@ class Need(View):
         d['icon_url'] = need.team.icon
         return JsonResponse(d)
 
-    @fetch_object(TeamNeed.objects, 'need')
+    @fetch_object(TeamNeed.objects, 'need', select_related=('team__owner',))
     @require_verification_token
     def post(self, request, need):
         """将需求标记成已满足"""
@@ -144,7 +144,7 @@ class Need(View):
         need.team.save()
         abort(200)
 
-    @fetch_object(TeamNeed, 'need')
+    @fetch_object(TeamNeed.objects, 'need', select_related=('team__owner',))
     @require_verification_token
     def delete(self, request, need):
         """将需求标记成已删除"""
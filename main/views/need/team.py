@@ -75,8 +75,8 @@ class NeedTeamList(View):
 
 
 class NeedRequestList(View):
-    @fetch_object(TeamNeed.objects, 'need')
-    @fetch_object(Team.enabled, 'team')
+    @fetch_object(TeamNeed.objects, 'need', select_related=('team__owner',))
+    @fetch_object(Team.enabled, 'team', select_related=('owner',))
     @app_auth
     @validate_args({
         'offset': forms.IntegerField(required=False, min_value=0),
@@ -109,8 +109,8 @@ class NeedRequestList(View):
             return JsonResponse({'count': c, 'list': l, 'code': 0})
         abort(403, '只有队长可以操作')
 
-    @fetch_object(TeamNeed.objects, 'need')
-    @fetch_object(Team.enabled, 'team')
+    @fetch_object(TeamNeed.objects, 'need', select_related=('team__owner',))
+    @fetch_object(Team.enabled, 'team', select_related=('owner',))
     @require_verification_token
     def post(self, request, need, team):
         """向需求发出合作申请
@@ -128,8 +128,8 @@ class NeedRequestList(View):
 
 class NeedRequest(View):
 
-    @fetch_object(TeamNeed.objects, 'need')
-    @fetch_object(Team.enabled, 'team')
+    @fetch_object(TeamNeed.objects, 'need', select_related=('team__owner',))
+    @fetch_object(Team.enabled, 'team', select_related=('owner',))
     @require_verification_token
     def post(self, request, need, team):
         """同意加入申请并将创始人加入自己团队（对方需发送过合作申请）"""
@@ -165,8 +165,8 @@ class NeedRequest(View):
             abort(200)
         abort(403, '对方未发送过申请合作')
 
-    @fetch_object(TeamNeed.objects, 'need')
-    @fetch_object(Team.enabled, 'team')
+    @fetch_object(TeamNeed.objects, 'need', select_related=('team__owner',))
+    @fetch_object(Team.enabled, 'team', select_related=('owner',))
     @require_verification_token
     def delete(self, request, need, team):
         """忽略某团队的合作申请"""
@@ -182,7 +182,7 @@ class NeedRequest(View):
 
 
 class TeamApplyNeedList(View):
-    @fetch_object(Team.enabled, 'team')
+    @fetch_object(Team.enabled, 'team', select_related=('owner',))
     @app_auth
     @validate_args({
         'offset': forms.IntegerField(required=False, min_value=0),
@@ -1,13 +1,15 @@
 from django import forms
+from django.db.models import Sum
 from django.http import JsonResponse
 from django.utils import timezone
 from django.views.generic import View
 
 from main.models import Team, User
-from main.models.need import TeamNeed
+from main.models.need import TeamNeed, TeamNeedMatch
 from util.decorator.auth import app_auth
 from util.decorator.param import validate_args, fetch_object
 from ..utils import abort
+from ..utils.tag_index import tag_index
 from main.utils.decorators import *
 
 __all__ = ('UserRecommend', 'TeamRecommend', 'OutsourceNeedTeamRecommend',
@@ -49,31 +51,21 @@ class UserRecommend(View):
                 time_created: 注册时间
         """
         i, j, k = offset, offset + limit, self.ORDERS[order]
-        user_tags = request.user.tags
-        user_dic = {}
-        for tag in user_tags:
-            users_tmp = User.enabled.filter(tags__name=tag).order_by(k)
-            for user in users_tmp:
-                if user in user_dic:
-                    user_dic[user] += 1
-                else:
-                    user_dic[user] = 1
-
-        user_dic = sorted(user_dic.items(), key=lambda x: x[1], reverse=True)
-        users = []
-        for user_list in user_dic:
-            users.append(user_list[0])
-        c = len(users)
+        tags = request.user.tags.values_list('name', flat=True)
+        ids = tag_index.match('user', tags, k)
+        c = len(ids)
+        users = User.enabled.in_bulk(ids[i:j])
+        users = [users[u] for u in ids[i:j] if u in users]
         l = [{'id': u.id,
               'username': u.username,
               'name': u.name,
               'icon_url': u.icon,
-              'gender': u.profile.gender,
-              'like_count': u.like_count,
-              'fan_count': u.fan_count,
+              'gender': u.gender,
+              'like_count': u.liker_count,
+              'fan_count': u.follower_count,
               'visitor_count': u.visitor_count,
-              'tags': u.tags.values_list('name', flat=True),
-              'time_created': u.time_created} for u in users[i:j]]
+              'tags': [tag.name for tag in u.tags.all()],
+              'time_created': u.time_created} for u in users]
         return JsonResponse({'count': c, 'list': l, 'code': 0})
 
 
@@ -111,31 +103,21 @@ class TeamRecommend(View):
                 time_created: 注册时间
         """
         i, j, k = offset, offset + limit, self.ORDERS[order]
-        team_tags = request.user.tags
-        team_dic = {}
-        for tag in team_tags:
-            teams_tmp = Team.enabled.filter(tags__name=tag).order_by(k)
-            for team in teams_tmp:
-                if team in team_dic:
-                    team_dic[team] += 1
-                else:
-                    team_dic[team] = 1
-
-        team_dic = sorted(team_dic.items(), key=lambda x: x[1], reverse=True)
-        teams = []
-        for team_list in team_dic:
-            teams.append(team_list[0])
-        c = len(teams)
+        tags = request.user.tags.values_list('name', flat=True)
+        ids = tag_index.match('team', tags, k)
+        c = len(ids)
+        teams = Team.enabled.in_bulk(ids[i:j])
+        teams = [teams[t] for t in ids[i:j] if t in teams]
         l = [{'id': t.id,
               'name': t.name,
               'icon_url': t.icon,
-              'owner_id': t.owner.id,
-              'liker_count': t.likers.count(),
-              'visitor_count': t.visitors.count(),
-              'member_count': t.members.count(),
+              'owner_id': t.owner_id,
+              'liker_count': t.liker_count,
+              'visitor_count': t.visitor_count,
+              'member_count': t.member_count,
               'fields': [t.field1, t.field2],
-              'tags': t.tags.values_list('name', flat=True),
-              'time_created': t.time_created} for t in teams[i:j]]
+              'tags': [tag.name for tag in t.tags.all()],
+              'time_created': t.time_created} for t in teams]
         return JsonResponse({'count': c, 'list': l, 'code': 0})
 
 
@@ -176,43 +158,24 @@ class OutsourceNeedTeamRecommend(View):
         if need.team.owner != request.user:
             abort(403)
         i, j, k = offset, offset + limit, self.ORDERS[order]
-        field = need.field
-        # 找出符合条件的承接需求(领域、类型、截至日期和起止时间)
-        undertake_needs = TeamNeed.objects.filter(
-            field=field,
-            type=2,
-            status=0,
-            deadline__lt=timezone.now(),
-            time_ended__lt=need.time_started)
-
-        team_dic = {}
-        # 对团队按指定条件增加在队列中的权值
-        for undertake_need in undertake_needs:
-            team = undertake_need.team
-            if team in team_dic:
-                team_dic[team] += 1
-            else:
-                team_dic[team] = 1
-            if need.time_started >= undertake_need.time_started:
-                team_dic[team] += 1
-            if need.time_ended <= undertake_need.time_ended:
-                team.dic[team] += 1
-
-        team_dic = sorted(team_dic.items(), key=lambda x: x[1], reverse=True)
-        teams = []
-        for team_list in team_dic:
-            teams.append(team_list[0])
-        c = len(teams)
+        # 匹配记录在需求创建、修改时维护，这里只需按截止日期过滤
+        matches = TeamNeedMatch.objects.filter(
+            need=need, deadline__lt=timezone.now()).values('team_id').annotate(
+            score=Sum('score')).order_by('-score', 'team_id')
+        c = matches.count()
+        ids = [m['team_id'] for m in matches[i:j]]
+        teams = Team.objects.in_bulk(ids)
+        teams = [teams[t] for t in ids if t in teams]
         l = [{'id': t.id,
               'name': t.name,
               'icon_url': t.icon,
-              'owner_id': t.owner.id,
-              'liker_count': t.likers.count(),
-              'visitor_count': t.visitors.count(),
-              'member_count': t.members.count(),
+              'owner_id': t.owner_id,
+              'liker_count': t.liker_count,
+              'visitor_count': t.visitor_count,
+              'member_count': t.member_count,
               'fields': [t.field1, t.field2],
-              'tags': t.tags.values_list('name', flat=True),
-              'time_created': t.time_created} for t in teams[i:j]]
+              'tags': [tag.name for tag in t.tags.all()],
+              'time_created': t.time_created} for t in teams]
         return JsonResponse({'count': c, 'list': l, 'code': 0})
 
 
@@ -253,41 +216,22 @@ class UndertakeNeedTeamRecommend(View):
         if need.team.owner != request.user:
             abort(403)
         i, j, k = offset, offset + limit, self.ORDERS[order]
-        field = need.field
-        # 找出符合条件外包接需求(领域、类型、截至日期和起止时间)
-        outsource_needs = TeamNeed.objects.filter(
-            field=field,
-            status=0,
-            type=1,
-            deadline__lt=timezone.now(),
-            time_ended__lt=need.time_started)
-
-        team_dic = {}
-        # 对团队按指定条件增加在队列中的权值
-        for outsource_need in outsource_needs:
-            team = outsource_need.team
-            if team in team_dic:
-                team_dic[team] += 1
-            else:
-                team_dic[team] = 1
-            if need.time_started >= outsource_need.time_started:
-                team_dic[team] += 1
-            if need.time_ended <= outsource_need.time_ended:
-                team.dic[team] += 1
-
-        team_dic = sorted(team_dic.items(), key=lambda x: x[1], reverse=True)
-        teams = []
-        for team_list in team_dic:
-            teams.append(team_list[0])
-        c = len(teams)
+        # 匹配记录在需求创建、修改时维护，这里只需按截止日期过滤
+        matches = TeamNeedMatch.objects.filter(
+            need=need, deadline__lt=timezone.now()).values('team_id').annotate(
+            score=Sum('score')).order_by('-score', 'team_id')
+        c = matches.count()
+        ids = [m['team_id'] for m in matches[i:j]]
+        teams = Team.objects.in_bulk(ids)
+        teams = [teams[t] for t in ids if t in teams]
         l = [{'id': t.id,
               'name': t.name,
               'icon_url': t.icon,
-              'owner_id': t.owner.id,
-              'liker_count': t.likers.count(),
-              'visitor_count': t.visitors.count(),
-              'member_count': t.members.count(),
+              'owner_id': t.owner_id,
+              'liker_count': t.liker_count,
+              'visitor_count': t.visitor_count,
+              'member_count': t.member_count,
               'fields': [t.field1, t.field2],
-              'tags': t.tags.values_list('name', flat=True),
-              'time_created': t.time_created} for t in teams[i:j]]
+              'tags': [tag.name for tag in t.tags.all()],
+              'time_created': t.time_created} for t in teams]
         return JsonResponse({'count': c, 'list': l, 'code': 0})
@@ -9,6 +9,7 @@ from main.models.action import UserAction, TeamAction, LabAction
 from main.utils import action
 from util.decorator.param import validate_args
 from util.decorator.auth import app_auth
+from util.paginator import CURSOR_FIELD, paginate
 
 
 class SearchUserAction(View):
@@ -16,20 +17,23 @@ class SearchUserAction(View):
     @validate_args({
         'offset': forms.IntegerField(required=False, min_value=0),
         'limit': forms.IntegerField(required=False, min_value=0),
+        'cursor': CURSOR_FIELD,
         'is_expert': forms.BooleanField(required=False),
         'name': forms.CharField(required=False, max_length=20),
         'tag': forms.CharField(max_length=20, required=False),
         'province': forms.CharField(required=False, max_length=20),
         'field': forms.CharField(required=False, max_length=20),
     })
-    def get(self, request, offset=0, limit=10, is_expert=False, name=None, tag=None, province=None, field=None,
+    def get(self, request, offset=0, limit=10, cursor=None, is_expert=False, name=None, tag=None, province=None, field=None,
             **kwargs):
         """获取用户的动态列表
 
         :param offset: 偏移量
         :param limit: 数量上限
+        :param cursor: 上一页返回的 next_cursor，传入时忽略 offset
         :return:
             count: 动态总数（包括标记为disabled的内容）
+            next_cursor: 下一页的游标，没有下一页时为 null
             last_time_created: 最近更新时间
             list: 动态列表
                 action_id: 动态id
@@ -79,8 +83,9 @@ class SearchUserAction(View):
             obj = obj.filter(**condition_expert)
         else:
             obj = obj.exclude(**condition_expert)
-        c = obj.count()
-        records = (i for i in obj.all()[offset:offset + limit])
+        page = paginate(obj, cursor, offset, limit)
+        records = page.items
+        names = action.ActionObjects(records)
         l = [{'id': i.entity.id,
               'action_id': i.id,
               'name': i.entity.real_name if str(i.entity.id) in userIds and i.entity.real_name != '' else i.entity.name,
@@ -88,18 +93,18 @@ class SearchUserAction(View):
               'action': i.action,
               'object_type': i.object_type,
               'object_id': i.object_id,
-              'object_name': action.get_object_name(i),
-              'icon_url': action.get_object_icon(i),
+              'object_name': names.object_name(i),
+              'icon_url': names.object_icon(i),
               'related_object_type': i.related_object_type,
               'related_object_id': i.related_object_id,
-              'related_object_name': action.get_related_object_name(i),
-              'liker_count': i.likers.count(),
-              'comment_count': i.comments.count(),
+              'related_object_name': names.related_object_name(i),
+              'liker_count': i.liker_count,
+              'comment_count': i.comment_count,
               'time_created': i.time_created,
               'is_like': True if str(i.id) in likedIds else False,
               'is_favored':True if str(i.id) in favoredIds else False,
               } for i in records]
-        return JsonResponse({'count': c, 'list': l, 'code': 0})
+        return JsonResponse({'count': page.count, 'next_cursor': page.next_cursor, 'list': l, 'code': 0})
 
 
 class SearchTeamAction(View):
@@ -107,17 +112,20 @@ class SearchTeamAction(View):
     @validate_args({
         'offset': forms.IntegerField(required=False, min_value=0),
         'limit': forms.IntegerField(required=False, min_value=0),
+        'cursor': CURSOR_FIELD,
         'name': forms.CharField(required=False, max_length=20),
         'province': forms.CharField(required=False, max_length=20),
         'field': forms.CharField(required=False, max_length=20),
     })
-    def get(self, request, name=None, offset=0, limit=10, province=None, field=None, **kwargs):
+    def get(self, request, name=None, offset=0, limit=10, cursor=None, province=None, field=None, **kwargs):
         """获取团队的动态列表
 
         :param offset: 偏移量
         :param limit: 数量上限
+        :param cursor: 上一页返回的 next_cursor，传入时忽略 offset
         :return:
             count: 动态总数（包括标记为disabled的内容）
+            next_cursor: 下一页的游标，没有下一页时为 null
             last_time_created: 最近更新时间
             list: 动态列表
                 id: 主语的id
@@ -144,8 +152,8 @@ class SearchTeamAction(View):
         if field is not None:
             qs = qs.filter(entity__field1=field)
         # 获取主语是团队的动态
-        c = qs.count()
-        records = (i for i in qs[offset:offset + limit])
+        page = paginate(qs, cursor, offset, limit)
+        records = page.items
 
 
         likedIds = []
@@ -155,6 +163,7 @@ class SearchTeamAction(View):
         for item in request.user.favored_team_actions.all():
             favoredIds.append(str(item.favored.id))
 
+        names = action.ActionObjects(records)
         l = [{'id': i.entity.id,
               'action_id': i.id,
               'name': i.entity.name,
@@ -162,32 +171,35 @@ class SearchTeamAction(View):
               'action': i.action,
               'object_type': i.object_type,
               'object_id': i.object_id,
-              'object_name': action.get_object_name(i),
-              'icon_url': action.get_object_icon(i),
+              'object_name': names.object_name(i),
+              'icon_url': names.object_icon(i),
               'related_object_type': i.related_object_type,
               'related_object_id': i.related_object_id,
-              'related_object_name': action.get_related_object_name(i),
-              'liker_count': i.likers.count(),
-              'comment_count': i.comments.count(),
+              'related_object_name': names.related_object_name(i),
+              'liker_count': i.liker_count,
+              'comment_count': i.comment_count,
               'time_created': i.time_created,
               'is_like': True if str(i.id) in likedIds else False,
               'is_favored': True if str(i.id) in favoredIds else False,
               } for i in records]
-        return JsonResponse({'count': c, 'list': l, 'code': 0})
+        return JsonResponse({'count': page.count, 'next_cursor': page.next_cursor, 'list': l, 'code': 0})
 
 class SearchOwnTeamAction(View):
     @app_auth
     @validate_args({
         'offset': forms.IntegerField(required=False, min_value=0),
         'limit': forms.IntegerField(required=False, min_value=0),
+        'cursor': CURSOR_FIELD,
     })
-    def get(self, request, name=None, offset=0, limit=10):
+    def get(self, request, name=None, offset=0, limit=10, cursor=None):
         """获取团队的动态列表
 
         :param offset: 偏移量
         :param limit: 数量上限
+        :param cursor: 上一页返回的 next_cursor，传入时忽略 offset
         :return:
             count: 动态总数（包括标记为disabled的内容）
+            next_cursor: 下一页的游标，没有下一页时为 null
             last_time_created: 最近更新时间
             list: 动态列表
                 id: 主语的id
@@ -209,8 +221,9 @@ class SearchOwnTeamAction(View):
         qs = TeamAction.objects.filter(entity__owner=request.user)
 
         # 获取主语是团队的动态
-        c = qs.count()
-        records = (i for i in qs[offset:offset + limit])
+        page = paginate(qs, cursor, offset, limit)
+        records = page.items
+        names = action.ActionObjects(records)
         l = [{'id': i.entity.id,
               'action_id': i.id,
               'name': i.entity.name,
@@ -218,36 +231,39 @@ class SearchOwnTeamAction(View):
               'action': i.action,
               'object_type': i.object_type,
               'object_id': i.object_id,
-              'object_name': action.get_object_name(i),
-              'icon_url': action.get_object_icon(i),
+              'object_name': names.object_name(i),
+              'icon_url': names.object_icon(i),
               'related_object_type': i.related_object_type,
               'related_object_id': i.related_object_id,
-              'related_object_name': action.get_related_object_name(i),
-              'liker_count': i.likers.count(),
-              'comment_count': i.comments.count(),
+              'related_object_name': names.related_object_name(i),
+              'liker_count': i.liker_count,
+              'comment_count': i.comment_count,
               'time_created': i.time_created,
               } for i in records]
-        return JsonResponse({'count': c, 'list': l, 'code': 0})
+        return JsonResponse({'count': page.count, 'next_cursor': page.next_cursor, 'list': l, 'code': 0})
 
 
 class SearchLabAction(View):
     @validate_args({
         'offset': forms.IntegerField(required=False, min_value=0),
         'limit': forms.IntegerField(required=False, min_value=0),
+        'cursor': CURSOR_FIELD,
         'name': forms.CharField(required=False, max_length=20),
         'province': forms.CharField(required=False, max_length=20),
         'field': forms.CharField(required=False, max_length=20),
     })
-    def get(self, request, offset=0, limit=10, province=None, field=None, name=None, **kwargs):
+    def get(self, request, offset=0, limit=10, cursor=None, province=None, field=None, name=None, **kwargs):
         """搜索与团队名或者动态名相关的动态列表
 
         :param offset: 偏移量
         :param limit: 数量上限
+        :param cursor: 上一页返回的 next_cursor，传入时忽略 offset
         :param kwargs: 搜索条件
             name: 团队或动态名包含字段
 
         :return:
             count: 动态总数（包括标记为disabled的内容）
+            next_cursor: 下一页的游标，没有下一页时为 null
             last_time_created: 最近更新时间
             list: 动态列表
                 action_id: 动态id
@@ -273,8 +289,9 @@ class SearchLabAction(View):
             r = r.filter(entity__province=province)
         if field is not None:
             r = r.filter(entity__field1=field)
-        c = r.count()
-        records = (i for i in r[offset:offset + limit])
+        page = paginate(r, cursor, offset, limit)
+        records = page.items
+        names = action.ActionObjects(records)
         l = [{'id': i.entity.id,
               'action_id': i.id,
               'name': i.entity.name,
@@ -282,13 +299,13 @@ class SearchLabAction(View):
               'action': i.action,
               'object_type': i.object_type,
               'object_id': i.object_id,
-              'object_name': action.get_object_name(i),
-              'icon_url': action.get_object_icon(i),
+              'object_name': names.object_name(i),
+              'icon_url': names.object_icon(i),
               'related_object_type': i.related_object_type,
               'related_object_id': i.related_object_id,
-              'related_object_name': action.get_related_object_name(i),
-              'liker_count': i.likers.count(),
-              'comment_count': i.comments.count(),
+              'related_object_name': names.related_object_name(i),
+              'liker_count': i.liker_count,
+              'comment_count': i.comment_count,
               'time_created': i.time_created,
               } for i in records]
-        return JsonResponse({'count': c, 'list': l, 'code': 0})
+        return JsonResponse({'count': page.count, 'next_cursor': page.next_cursor, 'list': l, 'code': 0})
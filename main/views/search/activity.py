@@ -8,6 +8,7 @@ from django.views.generic.base import View
 
 from main.models import Activity
 from util.decorator.param import validate_args
+from util.paginator import CURSOR_FIELD, paginate
 
 
 class SearchActivity(View):
@@ -16,6 +17,7 @@ class SearchActivity(View):
     @validate_args({
         'offset': forms.IntegerField(required=False, min_value=0),
         'limit': forms.IntegerField(required=False, min_value=0),
+        'cursor': CURSOR_FIELD,
         'order': forms.IntegerField(required=False, min_value=0, max_value=3),
         'name': forms.CharField(max_length=20, required=False),
         'tag': forms.CharField(max_length=20, required=False),
@@ -23,12 +25,13 @@ class SearchActivity(View):
         'province': forms.CharField(required=False, max_length=20),
         'field': forms.CharField(required=False, max_length=20),
     })
-    def get(self, request, offset=0, limit=10, order=1, history=False, province=None, field=None, **kwargs):
+    def get(self, request, offset=0, limit=10, cursor=None, order=1, history=False, province=None, field=None, **kwargs):
         """
         搜索活动
 
         :param offset: 偏移量
         :param limit: 数量上限
+        :param cursor: 上一页返回的 next_cursor，传入时忽略 offset
         :param order: 排序方式
             0: 注册时间升序
             1: 注册时间降序（默认值）
@@ -39,6 +42,7 @@ class SearchActivity(View):
 
         :return:
             count: 活动总数
+            next_cursor: 下一页的游标，没有下一页时为 null
             list: 活动列表
                 id: 活动ID
                 name: 活动名
@@ -51,7 +55,6 @@ class SearchActivity(View):
                 status:
                 province:
         """
-        i, j, k = offset, offset + limit, self.ORDERS[order]
         # 只显示审核通过的
         condition = {
             'state': Activity.STATE_PASSED
@@ -68,15 +71,15 @@ class SearchActivity(View):
         if 'tag' in kwargs:
             condition['tags__icontains'] = kwargs['tag']
         qs = Activity.enabled.filter(**condition) if condition is not None else Activity.enabled.all()
-        c = qs.count()
+        page = paginate(qs, cursor, offset, limit, (self.ORDERS[order],))
         l = [{'id': a.id,
               'name': a.name,
-              'liker_count': a.likers.count(),
+              'liker_count': a.liker_count,
               'time_started': a.time_started,
               'time_ended': a.time_ended,
               'user_participator_count': a.user_participators.count(),
               'time_created': a.time_created,
               'status': a.get_current_state(),
               'field': a.field,
-              'province': a.province} for a in qs.order_by(k)[i:j]]
-        return JsonResponse({'count': c, 'list': l, 'code': 0})
+              'province': a.province} for a in page]
+        return JsonResponse({'count': page.count, 'next_cursor': page.next_cursor, 'list': l, 'code': 0})
@@ -7,6 +7,7 @@ from django.views.generic.base import View
 from main.models import Lab
 from main.utils.decorators import fetch_user_by_token
 from util.decorator.param import validate_args
+from util.paginator import CURSOR_FIELD, count_cache, paginate
 from main.utils.recommender import calculate_ranking_score
 
 
@@ -16,14 +17,16 @@ class SearchLab(View):
     @validate_args({
         'offset': forms.IntegerField(required=False, min_value=0),
         'limit': forms.IntegerField(required=False, min_value=0),
+        'cursor': CURSOR_FIELD,
         'order': forms.IntegerField(required=False, min_value=0, max_value=3),
         'by_tag': forms.IntegerField(required=False),
         'name': forms.CharField(max_length=20),
     })
-    def get(self, request, name, offset=0, limit=10, order=1, by_tag=0):
+    def get(self, request, name, offset=0, limit=10, cursor=None, order=1, by_tag=0):
         """搜索实验室
         :param offset: 偏移量
         :param limit: 数量上限
+        :param cursor: 上一页返回的 next_cursor，传入时忽略 offset
         :param order: 排序方式（若无则进行个性化排序）
             0: 注册时间升序
             1: 注册时间降序
@@ -34,6 +37,7 @@ class SearchLab(View):
 
         :return:
             count: 实验室总数
+            next_cursor: 下一页的游标，没有下一页时为 null
             list: 实验室列表
                 id: 实验室ID
                 name: 实验室名
@@ -53,9 +57,10 @@ class SearchLab(View):
         else:
             # 按标签检索
             labs = Lab.enabled.filter(tags__name=name)
-        c = labs.count()
+        c, next_cursor = count_cache.count(labs), None
         if order is not None:
-            labs = labs.order_by(self.ORDERS[order])[i:j]
+            page = paginate(labs, cursor, offset, limit, (self.ORDERS[order],))
+            labs, next_cursor = page.items, page.next_cursor
         else:
             # 将结果进行个性化排序
             lab_list = list()
@@ -70,10 +75,10 @@ class SearchLab(View):
               'name': t.name,
               'icon_url': t.icon,
               'owner_id': t.owner.id,
-              'liker_count': t.likers.count(),
-              'visitor_count': t.visitors.count(),
-              'member_count': t.members.count(),
+              'liker_count': t.liker_count,
+              'visitor_count': t.visitor_count,
+              'member_count': t.member_count,
               'fields': [t.field1, t.field2],
               'tags': [tag.name for tag in t.tags.all()],
               'time_created': t.time_created} for t in labs]
-        return JsonResponse({'count': c, 'list': l, 'code': 0})
+        return JsonResponse({'count': c, 'next_cursor': next_cursor, 'list': l, 'code': 0})
@@ -10,6 +10,7 @@ from main.models.team import TeamLiker
 
 from main.utils.decorators import fetch_user_by_token
 from util.decorator.param import validate_args
+from util.paginator import CURSOR_FIELD, count_cache, paginate
 from util.decorator.auth import app_auth
 from main.utils.recommender import calculate_ranking_score
 
@@ -21,16 +22,18 @@ class SearchTeam(View):
     @validate_args({
         'offset': forms.IntegerField(required=False, min_value=0),
         'limit': forms.IntegerField(required=False, min_value=0),
+        'cursor': CURSOR_FIELD,
         'order': forms.IntegerField(required=False, min_value=0, max_value=3),
         'name': forms.CharField(max_length=20, required=False),
         'tag': forms.CharField(max_length=20, required=False),
         'province': forms.CharField(required=False, max_length=20),
         'field': forms.CharField(required=False, max_length=20),
     })
-    def get(self, request, offset=0, limit=10, order=1, province=None, field=None,tag=None, **kwargs):
+    def get(self, request, offset=0, limit=10, cursor=None, order=1, province=None, field=None,tag=None, **kwargs):
         """搜索团队
         :param offset: 偏移量
         :param limit: 数量上限
+        :param cursor: 上一页返回的 next_cursor，传入时忽略 offset
         :param order: 排序方式（若无则进行个性化排序）
             0: 注册时间升序
             1: 注册时间降序
@@ -41,6 +44,7 @@ class SearchTeam(View):
 
         :return:
             count: 团队总数
+            next_cursor: 下一页的游标，没有下一页时为 null
             list: 团队列表
                 id: 团队ID
                 name: 团队名
@@ -67,9 +71,10 @@ class SearchTeam(View):
             condition['id__in'] = set([t['entity'] for t in TeamTag.objects.filter(name__icontains=tag).values('entity')])
         teams = Team.enabled.filter(**condition) if condition is not None else Team.enabled.all()
 
-        c = teams.count()
+        c, next_cursor = count_cache.count(teams), None
         if order is not None:
-            teams = teams.order_by(self.ORDERS[order])[i:j]
+            page = paginate(teams, cursor, offset, limit, (self.ORDERS[order],))
+            teams, next_cursor = page.items, page.next_cursor
         else:
             # 将结果进行个性化排序
             team_list = list()
@@ -84,12 +89,12 @@ class SearchTeam(View):
               'name': t.name,
               'icon_url': t.icon,
               'owner_id': t.owner.id,
-              'liker_count': t.likers.count(),
-              'visitor_count': t.visitors.count(),
-              'member_count': t.members.count(),
+              'liker_count': t.liker_count,
+              'visitor_count': t.visitor_count,
+              'member_count': t.member_count,
               'fields': [t.field1, t.field2],
               'tags': [tag.name for tag in t.tags.all()],
               'time_created': t.time_created,
               'is_like': TeamLiker.objects.filter(liked_id=t.id, liker_id=request.user.id).exists(),  # 是否点
             } for t in teams]
-        return JsonResponse({'count': c, 'list': l, 'code': 0})
+        return JsonResponse({'count': c, 'next_cursor': next_cursor, 'list': l, 'code': 0})
@@ -9,6 +9,7 @@ from recommend import user_sim
 from main.models import User, UserTag, UserLiker
 from util.decorator.auth import app_auth
 from util.decorator.param import validate_args
+from util.paginator import CURSOR_FIELD, paginate
 
 
 class SearchUser(View):
@@ -18,6 +19,7 @@ class SearchUser(View):
     @validate_args({
         'offset': forms.IntegerField(required=False, min_value=0),
         'limit': forms.IntegerField(required=False, min_value=0),
+        'cursor': CURSOR_FIELD,
         'order': forms.IntegerField(required=False, min_value=0, max_value=3),
         'province': forms.CharField(required=False, max_length=20),
         'field': forms.CharField(required=False, max_length=20),
@@ -26,11 +28,12 @@ class SearchUser(View):
         'tag': forms.CharField(max_length=20, required=False),
         'role': forms.CharField(max_length=20, required=False),
     })
-    def get(self, request, offset=0, limit=10, order=1, province=None, field=None, is_expert=False, name=None,
+    def get(self, request, offset=0, limit=10, cursor=None, order=1, province=None, field=None, is_expert=False, name=None,
             role=None, tag=None):
         """获取用户列表
 
         :param offset: 偏移量
+        :param cursor: 上一页返回的 next_cursor，传入时忽略 offset
         :param order: 排序方式
             0: 注册时间升序
             1: 注册时间降序（默认值）
@@ -38,6 +41,7 @@ class SearchUser(View):
             3: 昵称降序
         :return:
             count: 用户总数
+            next_cursor: 下一页的游标，没有下一页时为 null
             list: 用户列表
                 id: 用户ID
                 time_created: 注册时间
@@ -72,8 +76,8 @@ class SearchUser(View):
             qs = User.enabled.filter(**condition).filter(**condition_expert)
         else:
             qs = User.enabled.filter(**condition).exclude(**condition_expert)
-        c = qs.count()
-        users = qs.order_by(self.ORDERS[order])[offset:offset + limit]
+        page = paginate(qs, cursor, offset, limit, (self.ORDERS[order],))
+        users = page.items
 
         # 获取当前用户好友id.
         userIds = []
@@ -84,10 +88,10 @@ class SearchUser(View):
         l = [{'id': u.id,
               'name': u.real_name if str(u.id) in userIds and u.real_name != '' else u.name,
               'gender': u.gender,
-              'liker_count': u.likers.count(),
-              'follower_count': u.followers.count(),
+              'liker_count': u.liker_count,
+              'follower_count': u.follower_count,
               'followed_count': u.followed_users.count() + u.followed_teams.count(),
-              'visitor_count': u.visitors.count(),
+              'visitor_count': u.visitor_count,
               'icon_url': u.icon,
               'tags': [tag.name for tag in u.tags.all()],
               'is_verified': u.is_verified,
@@ -99,4 +103,4 @@ class SearchUser(View):
               'is_like': UserLiker.objects.filter(liked_id=u.id, liker_id=request.user.id).exists(),  # 是否点
               } for u in users]
         l = user_sim.sort(l, request.user)
-        return JsonResponse({'count': c, 'list': l, 'code': 0})
+        return JsonResponse({'count': page.count, 'next_cursor': page.next_cursor, 'list': l, 'code': 0})
@@ -169,9 +169,9 @@ class Screen(View):
               'name': t.name,
               'icon_url': t.icon,
               'owner_id': t.owner.id,
-              'liker_count': t.likers.count(),
-              'visitor_count': t.visitors.count(),
-              'member_count': t.members.count(),
+              'liker_count': t.liker_count,
+              'visitor_count': t.visitor_count,
+              'member_count': t.member_count,
               'fields': [t.field1, t.field2],
               'tags': [tag.name for tag in t.tags.all()],
               'time_created': t.time_created} for t in teams]
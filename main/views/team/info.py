@@ -60,9 +60,9 @@ class Profile(View):
         r['is_recruiting'] = team.is_recruiting
         r['description'] = team.description
         r['url'] = team.url
-        r['liker_count'] = team.likers.count()
-        r['fan_count'] = team.followers.count()
-        r['visitor_count'] = team.visitors.count()
+        r['liker_count'] = team.liker_count
+        r['fan_count'] = team.follower_count
+        r['visitor_count'] = team.visitor_count
         r['fields'] = [team.field1, team.field2]
         r['advantage'] = team.advantage
         r['business_stage'] = team.business_stage
@@ -8,7 +8,7 @@ from django.views.generic import View
 from main.models import Team, User
 from main.utils import abort, action
 from main.utils.decorators import require_verification_token
-from main.utils.http import notify_user
+from main.utils.notification import notify_user
 from util.decorator.auth import app_auth
 from util.decorator.param import fetch_object, validate_args
 
@@ -48,7 +48,7 @@ class MemberList(View):
         """
 
         i, j, k = offset, offset + limit, self.ORDERS[order]
-        c = team.members.count()
+        c = team.member_count
         rs = team.members.order_by(k)[i:j]
         l = [{'id': r.user.id,
               'username': r.user.username,
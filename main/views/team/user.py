@@ -48,9 +48,9 @@ class RelatedTeamList(View):
               'name': t.team.name,
               'icon_url': t.team.icon,
               'owner_id': t.team.owner.id,
-              'liker_count': t.team.likers.count(),
-              'visitor_count': t.team.visitors.count(),
-              'member_count': t.team.members.count(),
+              'liker_count': t.team.liker_count,
+              'visitor_count': t.team.visitor_count,
+              'member_count': t.team.member_count,
               'fields': [t.team.field1, t.team.field2],
               'tags': [tag.name for tag in t.team.tags.all()],
               'time_created': t.team.time_created} for t in teams]
@@ -98,9 +98,9 @@ class OwnedTeamList(View):
               'name': t.name,
               'icon_url': t.icon,
               'owner_id': t.owner.id,
-              'liker_count': t.likers.count(),
-              'visitor_count': t.visitors.count(),
-              'member_count': t.members.count(),
+              'liker_count': t.liker_count,
+              'visitor_count': t.visitor_count,
+              'member_count': t.member_count,
               'fields': [t.field1, t.field2],
               'tags': [tag.name for tag in t.tags.all()],
               'time_created': t.time_created} for t in teams]
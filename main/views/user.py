@@ -11,7 +11,7 @@ from ..models import *
 from ..utils import abort
 from util.message import send_message
 from ..utils.decorators import *
-from ..utils.recommender import calculate_ranking_score
+from ..utils.recommender import rank_by_feature
 from django.db.models import Q
 
 __all__ = ['Icon', 'Profile', 'Screen', 'TeamOwnedList', 'TeamJoinedList', 'ValidationCode',
@@ -222,14 +222,10 @@ class Screen(View):
             users = users.order_by(self.ORDERS[order])[i:j]
         else:
             # 将结果进行个性化排序
-            user_list = list()
-            for u in users:
-                if fetch_user_by_token(request):
-                    user_list.append((u, calculate_ranking_score(request.user, u)))
-                else:
-                    user_list.append((u, 0))
-            user_list = sorted(user_list, key=lambda x: x[1], reverse=True)
-            users = (u[0] for u in user_list[i:j])
+            if fetch_user_by_token(request):
+                users = rank_by_feature(users, 'user', request.user, i, j - i)
+            else:
+                users = users[i:j]
         l = [{'id': u.id,
               'name': u.name,
               'gender': u.gender,
@@ -9,6 +9,8 @@ class ServerConfig(models.Model):
 
     # 环信 access_token
     huanxin_token = models.CharField(max_length=200, default='')
+    # 环信 access_token 的过期时间，为空表示未知
+    huanxin_token_expires = models.DateTimeField(null=True, default=None)
 
     # 同 IP 两次访问的时间间隔，单位毫秒，即平均 qps
     ip_limit_time = models.IntegerField(default=500)
@@ -16,3 +18,14 @@ class ServerConfig(models.Model):
     ip_limit_count = models.IntegerField(default=10)
     # 同 IP 超速访问 容忍次数的时间，单位秒，即峰值 qps
     ip_limit_time_max = models.IntegerField(default=2)
+
+    # 特征模型上次构建开始的时间，增量构建只处理此后有变化的实体
+    feature_watermark = models.DateTimeField(null=True, default=None)
+    # 特征模型版本，每次写入新的特征模型后递增，用于使特征向量缓存失效
+    feature_version = models.IntegerField(default=0)
+    # 系统设定版本，系统设定或角色修改后递增，用于使系统设定快照失效
+    system_version = models.IntegerField(default=0)
+    # 管理端权限版本，角色、功能或授权关系修改后递增，用于使权限表失效
+    permission_version = models.IntegerField(default=0)
+    # 令牌版本，用户令牌、启用状态、认证状态或角色修改后递增，用于使令牌缓存失效
+    token_version = models.IntegerField(default=0)
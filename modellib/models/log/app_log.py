@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 from django.db import models
+from django.utils import timezone
 
 
 class AppLog(models.Model):
@@ -11,7 +12,8 @@ class AppLog(models.Model):
     url = models.CharField(max_length=256, default='')
     event = models.CharField(max_length=256, default='', null=True)
     user = models.ForeignKey('main.User', related_name='logs', null=True, default=None)
-    time = models.DateTimeField(auto_now_add=True)
+    # 日志批量写入，记录的是请求时间而不是写入时间
+    time = models.DateTimeField(default=timezone.now)
     ip = models.CharField(max_length=40, default='') # ip
     mac = models.CharField(max_length=40, default='') # mac
     manufacturers = models.CharField(max_length=40, default='') # 手机厂商
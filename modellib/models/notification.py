@@ -0,0 +1,30 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from django.db import models
+from django.utils import timezone
+
+
+class Notification(models.Model):
+    """待发送的个推通知，由 main.utils.notification 中的后台线程发送"""
+
+    STATUS_PENDING = 0
+    STATUS_SENDING = 1
+    STATUS_SENT = 2
+    STATUS_FAILED = 3
+
+    # 个推客户端 ID，入队时从用户读取
+    client = models.CharField(max_length=64)
+    msg = models.TextField()
+    status = models.IntegerField(default=STATUS_PENDING)
+    attempts = models.IntegerField(default=0)
+    # 认领本条通知的发送线程，防止多个进程重复发送
+    claim = models.CharField(max_length=32, default='')
+    time_created = models.DateTimeField(default=timezone.now)
+    # 下次发送时间，发送中的通知超过此时间未完成视为发送线程已退出
+    time_next = models.DateTimeField(default=timezone.now)
+    time_sent = models.DateTimeField(null=True, default=None)
+
+    class Meta:
+        db_table = 'notification'
+        index_together = [('status', 'time_next'), ('status', 'time_sent')]
@@ -2,8 +2,15 @@
 import recommend
 
 # 具体计算
-from main.models import User
+import mmap
+import os
+import struct
+
+from ChuangYi import settings
+from main.models import User, UserFriend
+import numpy as np
 import pandas as pd
+from scipy import sparse
 from sklearn.cluster import KMeans
 
 # 权重
@@ -13,93 +20,215 @@ WEIGHTS_SIM2 = 0.8
 # 统计的字段
 USER_PARAM_LIST = ['province', 'city', 'role', 'adept_field', 'profession']
 
-# 相似度结果
+# 聚类数量
+N_CLUSTERS = 10
+
+# 每个用户保留的最相似用户数量
+TOP_K = 100
+
+# 相似度结果文件的文件头：魔数、格式版本、用户数、相似记录数
+SIM_FILE_HEADER = struct.Struct('<4sIQQ')
+SIM_FILE_MAGIC = b'USIM'
+SIM_FILE_VERSION = 1
+
+# 相似度结果，UserSimilarity 实例
 result_user_sim = None
+# 已加载的相似度结果文件的修改时间
+result_mtime = None
+
+
+class UserSimilarity(object):
+    """每个用户的 top-K 相似用户表
+
+    按 CSR 方式存储：ids 为升序的用户 id，第 i 个用户的相似用户位于
+    neighbours[indptr[i]:indptr[i + 1]]（按 id 升序），对应分值位于 scores 的相同位置。
+    """
+
+    def __init__(self, ids, indptr, neighbours, scores):
+        self.ids = ids
+        self.indptr = indptr
+        self.neighbours = neighbours
+        self.scores = scores
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row(self, user_id):
+        """返回某用户的相似用户 id 及分值，不存在时返回 None"""
+
+        i = np.searchsorted(self.ids, user_id)
+        if i >= len(self.ids) or self.ids[i] != user_id:
+            return None
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.neighbours[start:end], self.scores[start:end]
+
+    def get(self, id_u1, id_u2):
+        """返回两个用户间的相似度，不在对方 top-K 中时返回 0"""
+
+        # 相似度是对称的，任一方的 top-K 中有另一方即可
+        for a, b in ((id_u2, id_u1), (id_u1, id_u2)):
+            r = self.row(a)
+            if r is None:
+                continue
+            neighbours, scores = r
+            j = np.searchsorted(neighbours, b)
+            if j < len(neighbours) and neighbours[j] == b:
+                return float(scores[j])
+        return 0
 
 
 def user_sim():
+    qs = get_user().values_list('id', *USER_PARAM_LIST)
+    ids = np.array([u[0] for u in qs], dtype=np.int64)
     # 聚类
-    result_cluster = dataframe()
-    # 计算相似度
-    global result_user_sim
-    result_user_sim = sim(result_cluster)
-    return result_user_sim
+    labels = cluster([u[1:] for u in qs])
+    # 计算相似度，写入文件后各进程共享同一份页缓存
+    save(sim(ids, labels), settings.USER_SIM_FILE)
+    return get_result()
+
+
+def cluster(rows):
+    """对用户进行聚类，rows 为 USER_PARAM_LIST 各字段的值，返回与 rows 对齐的类别数组"""
+
+    if len(rows) < 1:
+        return np.zeros(0, dtype=np.int32)
+    # 构造原始数据，空值统一记为“无”
+    origin_data = {p: [] for p in USER_PARAM_LIST}
+    for u in rows:
+        for i, p in enumerate(USER_PARAM_LIST):
+            origin_data[p].append(u[i] if u[i] else '无')
+    # 聚类
+    df = pd.DataFrame(origin_data)
+    dummies = pd.get_dummies(df, columns=USER_PARAM_LIST)
+    n_clusters = min(N_CLUSTERS, len(rows))
+    return KMeans(n_clusters=n_clusters, random_state=9).fit_predict(dummies)
 
 
-def sim1(u1, u2, result_cluster):
-    if result_cluster[u1.id] == result_cluster[u2.id]:
-        return 1
+'''
+共同好友越多，认为两个人越相似。
+好友关系构成邻接矩阵 A，A * A^T 即为任意两个用户的共同好友数，
+再除以两个用户好友数的乘积得到好友相似度。
+'''
+
+
+def friend_matrix(ids):
+    """一次性读取好友关系，构造以 ids 下标为行列的稀疏邻接矩阵"""
+
+    n = len(ids)
+    edges = np.array(UserFriend.objects.values_list('user_id', 'other_user_id'), dtype=np.int64)
+    if len(edges) == 0:
+        return sparse.csr_matrix((n, n), dtype=np.float64)
+    rows = np.searchsorted(ids, edges[:, 0])
+    cols = np.searchsorted(ids, edges[:, 1])
+    # 去掉不在用户列表中的记录
+    rows[rows >= n] = 0
+    cols[cols >= n] = 0
+    valid = (ids[rows] == edges[:, 0]) & (ids[cols] == edges[:, 1])
+    data = np.ones(valid.sum(), dtype=np.float64)
+    return sparse.csr_matrix((data, (rows[valid], cols[valid])), shape=(n, n))
+
+
+def sim(ids, labels):
+    n = len(ids)
+    adjacency = friend_matrix(ids)
+    degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    inverse = np.zeros(n)
+    inverse[degree > 0] = 1 / degree[degree > 0]
+    # 好友相似度：共同好友数 / 好友数之积
+    co_friend = (adjacency * adjacency.T).tocsr()
+    co_friend = sparse.diags(inverse) * co_friend * sparse.diags(inverse)
+    co_friend = co_friend.tocsr()
+
+    # 每一类的成员下标，用于补足没有共同好友的同类用户
+    members = {c: np.flatnonzero(labels == c) for c in np.unique(labels)}
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    neighbours = []
+    scores = []
+    for i in range(n):
+        start, end = co_friend.indptr[i], co_friend.indptr[i + 1]
+        candidates = co_friend.indices[start:end]
+        values = WEIGHTS_SIM2 * co_friend.data[start:end] + WEIGHTS_SIM1 * (labels[candidates] == labels[i])
+        # 同类但没有共同好友的用户分值均为 WEIGHTS_SIM1，取足 TOP_K 个即可
+        same = members[labels[i]][:TOP_K + len(candidates) + 1]
+        same = np.setdiff1d(same, candidates, assume_unique=True)[:TOP_K + 1]
+        candidates = np.concatenate((candidates, same))
+        values = np.concatenate((values, np.full(len(same), WEIGHTS_SIM1)))
+        # 排除自身和分值为 0 的用户
+        keep = (candidates != i) & (values > 0)
+        candidates, values = candidates[keep], values[keep]
+        if len(candidates) > TOP_K:
+            top = np.argpartition(-values, TOP_K - 1)[:TOP_K]
+            candidates, values = candidates[top], values[top]
+        order = np.argsort(candidates)
+        neighbours.append(ids[candidates[order]])
+        scores.append(values[order].astype(np.float32))
+        indptr[i + 1] = indptr[i] + len(candidates)
+
+    if n > 0:
+        neighbours = np.concatenate(neighbours)
+        scores = np.concatenate(scores)
     else:
-        return 0
+        neighbours = np.zeros(0, dtype=np.int64)
+        scores = np.zeros(0, dtype=np.float32)
+    return UserSimilarity(ids, indptr, neighbours, scores)
 
 
 '''
-提取某两个用户的所有朋友，计算这两个用户间的相似度，原理是共同的朋友越多，认为两个人越相似。
-计算方法是余弦公式
+相似度结果文件格式（小端）：
+    文件头 SIM_FILE_HEADER
+    indptr      int64[n + 1]
+    ids         int32[n]
+    neighbours  int32[nnz]
+    scores      float32[nnz]
+所有数组定长，各进程以 mmap 只读打开，无需解析即可直接查询。
 '''
 
 
-def sim2(u1, u2):
-    # friends_u1 是 u1 的好友的 id 的集合
-    friends_u1 = [f[0] for f in u1.friends.all().values_list('other_user')]
-    if len(friends_u1) == 0:
-        return 0
-    # part1 是两个向量的点积
-    part1 = u2.friends.filter(other_user_id__in=friends_u1).count()
-    if part1 == 0:
-        return 0
-    # part2 是两个向量的模积
-    part2 = len(friends_u1) * u2.friends.count()
-    if part2 == 0:
-        return 0
-    return part1 / part2
-
-
-def dataframe():
-    qs = get_user().values_list(*USER_PARAM_LIST, 'id')
-    len_qs = len(qs)
-    if len_qs < 1:
-        return []
-    # 构造原始数据
-    origin_data = {}
-    len_param = len(USER_PARAM_LIST)
-    for i in range(0, len_param):
-        origin_data[USER_PARAM_LIST[i]] = []
-    for u in qs:
-        for i in range(0, len_param):
-            d = u[i]
-            origin_data[USER_PARAM_LIST[i]].append(d if d else '无')
-    # 聚类
-    df = pd.DataFrame(origin_data)
-    dummies = pd.get_dummies(df, columns=USER_PARAM_LIST)
-    result_tmp = KMeans(n_clusters=10, random_state=9).fit_predict(dummies)
-    # 将结果规整化，返回一个数组，数组的 index 是用户 id，value 是分类
-    result = []
-    next_index = 0
-    for i in range(0, qs[len_qs - 1][len_param] + 1):
-        next_user_id = qs[next_index][len_param]
-        if next_user_id == i:
-            result.append(result_tmp[next_index])
-            next_index += 1
-        else:
-            result.append(None)
-    return result
-
-
-def sim(result_cluster):
-    users = get_user()
-    result = dict()
-    for u1 in users:
-        id_u1 = u1.id
-        for u2 in users:
-            id_u2 = u2.id
-            # 只用计算一半，因为 u1 和 u2 的相似度，与 u2 和 u1 的一样
-            if id_u2 >= id_u1:
-                continue
-            key = (id_u1, id_u2)
-            value = WEIGHTS_SIM1 * sim1(u1, u2, result_cluster) + WEIGHTS_SIM2 * sim2(u1, u2)
-            result[key] = value
-    return result
+def save(result, path):
+    """将相似度结果写入文件，先写临时文件再替换，保证读取方不会读到半个文件"""
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(SIM_FILE_HEADER.pack(SIM_FILE_MAGIC, SIM_FILE_VERSION,
+                                     len(result.ids), len(result.neighbours)))
+        f.write(np.asarray(result.indptr, dtype='<i8').tobytes())
+        f.write(np.asarray(result.ids, dtype='<i4').tobytes())
+        f.write(np.asarray(result.neighbours, dtype='<i4').tobytes())
+        f.write(np.asarray(result.scores, dtype='<f4').tobytes())
+    os.replace(tmp, path)
+
+
+def load(path):
+    """以 mmap 方式打开相似度结果文件"""
+
+    with open(path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, n, nnz = SIM_FILE_HEADER.unpack_from(buf)
+    if magic != SIM_FILE_MAGIC or version != SIM_FILE_VERSION:
+        raise ValueError('unknown user sim file: %s' % path)
+    offset = SIM_FILE_HEADER.size
+    arrays = []
+    for dtype, count in (('<i8', n + 1), ('<i4', n), ('<i4', nnz), ('<f4', nnz)):
+        arrays.append(np.frombuffer(buf, dtype=dtype, count=count, offset=offset))
+        offset += np.dtype(dtype).itemsize * count
+    indptr, ids, neighbours, scores = arrays
+    return UserSimilarity(ids, indptr, neighbours, scores)
+
+
+def get_result():
+    """返回当前的相似度结果，文件被重新生成后自动重新打开"""
+
+    global result_user_sim, result_mtime
+    try:
+        mtime = os.stat(settings.USER_SIM_FILE).st_mtime
+    except FileNotFoundError:
+        return result_user_sim
+    if mtime != result_mtime:
+        result_user_sim = load(settings.USER_SIM_FILE)
+        result_mtime = mtime
+    return result_user_sim
 
 
 def get_user():
@@ -107,17 +236,18 @@ def get_user():
 
 
 def sort(users, current):
-    global result_user_sim
-    if result_user_sim is None or current is None or len(users) < 2:
+    result = get_result()
+    if result is None or current is None or len(users) < 2:
         return users
-    users.sort(key=lambda u: sort_single(u['id'], current.id), reverse=True)
+    # 只检查一次结果文件，排序键中直接查询
+    current_id = current.id
+    users.sort(key=lambda u: 1 if u['id'] == current_id else result.get(u['id'], current_id),
+               reverse=True)
     return users
 
 
 def sort_single(id_u1, id_u2):
     if id_u1 == id_u2:
         return 1
-    key = (id_u1, id_u2) if id_u1 > id_u2 else (id_u2, id_u1)
-    global result_user_sim
-    result_sim = result_user_sim.get(key)
-    return result_sim if result_sim else 0
+    result = get_result()
+    return result.get(id_u1, id_u2) if result is not None else 0
@@ -5,8 +5,19 @@
 统一 token 规范
 '''
 
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.db.models import F
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 
+from ChuangYi import settings
+from main.models import User
+from modellib.models import ServerConfig
 from util.security import md5
 
 
@@ -17,3 +28,136 @@ def generate_token(msg):
 
 def generate_psd(psd):
     return md5(psd)
+
+
+# 令牌解析结果：用户 id、是否可用、认证状态、角色名
+TokenEntry = namedtuple('TokenEntry', ['user_id', 'is_enabled', 'is_verified',
+                                       'is_role_verified', 'role', 'time_loaded'])
+
+# 影响令牌解析结果的用户字段
+TOKEN_FIELDS = ('token', 'is_enabled', 'is_verified', 'is_role_verified', 'role')
+
+
+class TokenCache(object):
+    """进程内的 令牌 -> 用户 缓存
+
+    命中时不需要查询数据库。用户保存时清除当前进程中该用户的缓存；
+    令牌、启用状态、认证状态或角色变化时还会递增 ServerConfig.token_version，
+    各进程每隔 TOKEN_VERSION_CHECK_INTERVAL 秒检查一次版本，版本变化时清空缓存
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.version = None
+        self.time_checked = 0
+        self._entries = OrderedDict()
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def sync(self):
+        """检查令牌版本，版本变化时清空缓存"""
+
+        now = time.time()
+        if self.version is not None and \
+                now - self.time_checked < settings.TOKEN_VERSION_CHECK_INTERVAL:
+            return
+        version = ServerConfig.objects.values_list('token_version', flat=True).first() or 0
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self._tokens.clear()
+                self.version = version
+            self.time_checked = now
+
+    def get(self, token):
+        """返回令牌对应的 TokenEntry，令牌无效时返回 None"""
+
+        self.sync()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and now - entry.time_loaded < self.ttl:
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        user = find_user(token)
+        if user is None:
+            return None
+        entry = TokenEntry(user.id, user.is_enabled, user.is_verified,
+                           user.is_role_verified, user.role, now)
+        with self._lock:
+            self._entries[token] = entry
+            self._tokens.setdefault(user.id, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                old_token, old = self._entries.popitem(last=False)
+                self._tokens.get(old.user_id, set()).discard(old_token)
+        return entry
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for token in self._tokens.pop(user_id, ()):
+                self._entries.pop(token, None)
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+
+
+def find_user(token):
+    """按令牌查找用户，优先使用有索引的 token_hash 字段"""
+
+    token_hash = md5(token)
+    user = User.objects.filter(token_hash=token_hash).first()
+    if user is not None and user.token == token:
+        return user
+    # 尚未生成 token_hash 的旧用户
+    user = User.objects.filter(token=token).first()
+    if user is not None:
+        User.objects.filter(id=user.id).update(token_hash=token_hash)
+    return user
+
+
+class LazyUser(SimpleLazyObject):
+    """只有在被访问时才按主键读取用户，读取 id 不查询数据库"""
+
+    def __init__(self, user_id):
+        super(LazyUser, self).__init__(lambda: User.objects.get(id=user_id))
+        self.__dict__['_user_id'] = user_id
+
+    @property
+    def id(self):
+        return self.__dict__['_user_id']
+
+    pk = id
+
+
+def lazy_user(entry):
+    return LazyUser(entry.user_id)
+
+
+def bump_token_version():
+    """用户的令牌或认证相关状态有更新时调用，使各进程的令牌缓存失效"""
+
+    ServerConfig.objects.update(token_version=F('token_version') + 1)
+
+
+def token_state(user):
+    # 延迟加载的字段不在 __dict__ 中，不能为此触发查询
+    return tuple(user.__dict__.get(f) for f in TOKEN_FIELDS)
+
+
+@receiver(post_init, sender=User)
+def user_loaded(sender, instance, **kwargs):
+    instance._token_state = token_state(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    token_cache.invalidate_user(instance.id)
+    state = token_state(instance)
+    if not created and state != instance._token_state:
+        bump_token_version()
+    instance._token_state = state
@@ -7,6 +7,7 @@ from django.views.generic import View
 
 from util.decorator.auth import client_auth
 from util.decorator.param import validate_args
+from util.paginator import CURSOR_FIELD, paginate
 
 
 class BaseView(View):
@@ -20,11 +21,16 @@ class BaseView(View):
     @validate_args({
         'page': forms.IntegerField(min_value=0, required=False),
         'limit': forms.IntegerField(min_value=1, required=False),
+        'cursor': CURSOR_FIELD,
     })
-    def success_list(self, request, iter, obj_to_json, page=0, limit=10):
+    def success_list(self, request, iter, obj_to_json, page=0, limit=10, cursor=None):
+        """分页返回 iter，传入上一页返回的 nextCursor 时忽略 page"""
+
+        p = paginate(iter, cursor, page * limit, limit)
         return self.success({
-            'totalCount': len(iter),
-            'list': [obj_to_json(o) for o in iter[page * limit:(page + 1) * limit]]
+            'totalCount': p.count,
+            'nextCursor': p.next_cursor,
+            'list': [obj_to_json(o) for o in p]
         })
 
     def fail(self, code, msg=''):
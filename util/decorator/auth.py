@@ -7,9 +7,9 @@ from django.core.urlresolvers import reverse
 from django.http import JsonResponse, HttpResponseRedirect
 
 from admin.models import AdminUser
-from main.models import User, System
-from main.models.role import Role
 from main.utils import abort
+from main.utils.system import system_snapshot
+from util.auth import token_cache, lazy_user
 from util.code import error
 
 
@@ -72,16 +72,15 @@ def app_auth(function):
         token = request.META.get('HTTP_X_USER_TOKEN')
         if not token:
             abort(401, '缺少参数token')
-        try:
-            user = User.objects.get(token=token)
-            if user.is_enabled:
-                request.user = user
-                request.param = System.objects.get(
-                    role__name=user.role if user.role else Role.objects.get(name__isnull=True).name)
-                return function(self, request, *args, **kwargs)
-            abort(403, '用户已删除')
-        except User.DoesNotExist:
+        entry = token_cache.get(token)
+        if entry is None:
             abort(404, '用户不存在')
+        if not entry.is_enabled:
+            abort(403, '用户已删除')
+        request.user = lazy_user(entry)
+        request.user_id = entry.user_id
+        request.param = system_snapshot.role_param(entry.role)
+        return function(self, request, *args, **kwargs)
 
     return decorator
 
@@ -96,17 +95,18 @@ def client_auth(function):
         if getattr(request, 'user', None) is not None:
             return function(self, request, *args, **kwargs)
         token = request.META.get('HTTP_X_USER_TOKEN')
-        if not token or User.objects.filter(token=token).count() <= 0:
+        entry = token_cache.get(token) if token else None
+        if entry is None:
             return JsonResponse({
                 'code': error.NO_USER
             })
-        user = User.objects.get(token=token)
-        if not user.is_enabled:
+        if not entry.is_enabled:
             return JsonResponse({
                 'code': error.USER_DISABLED
             })
         # 用户正常
-        request.user = user
+        request.user = lazy_user(entry)
+        request.user_id = entry.user_id
         return function(self, request, *args, **kwargs)
 
     return decorator
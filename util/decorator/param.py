@@ -4,38 +4,133 @@
 '''
 参数处理
 '''
+from collections import OrderedDict
 from functools import wraps
 
 from django import forms
-from django.core.exceptions import ValidationError, ObjectDoesNotExist
-from django.http import QueryDict, JsonResponse
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator, MaxValueValidator, \
+    MinLengthValidator, MaxLengthValidator
+from django.http import QueryDict, JsonResponse, HttpRequest
 
 from main.utils import abort
 from util.code import error
 
 
+def int_cleaner(field):
+    """IntegerField 的快速校验，与 IntegerField.clean 结果一致"""
+
+    min_value, max_value = field.min_value, field.max_value
+
+    def clean(value):
+        if value in field.empty_values:
+            if field.required:
+                raise ValidationError(field.error_messages['required'], code='required')
+            return None
+        try:
+            value = int(field.re_decimal.sub('', str(value)))
+        except (ValueError, TypeError):
+            raise ValidationError(field.error_messages['invalid'], code='invalid')
+        if min_value is not None and value < min_value or \
+                max_value is not None and value > max_value:
+            # 超出范围时交给 Django 生成错误信息
+            field.run_validators(value)
+        return value
+
+    return clean
+
+
+def char_cleaner(field):
+    """CharField 的快速校验，与 CharField.clean 结果一致"""
+
+    min_length, max_length, strip = field.min_length, field.max_length, field.strip
+
+    def clean(value):
+        if value in field.empty_values:
+            value = ''
+        elif isinstance(value, str):
+            if strip:
+                value = value.strip()
+        else:
+            return field.clean(value)
+        if not value and field.required:
+            raise ValidationError(field.error_messages['required'], code='required')
+        if value and (min_length is not None and len(value) < min_length or
+                      max_length is not None and len(value) > max_length):
+            field.run_validators(value)
+        return value
+
+    return clean
+
+
+def bool_cleaner(field):
+    """BooleanField 的快速校验，与 BooleanField.clean 结果一致"""
+
+    def clean(value):
+        if isinstance(value, str) and value.lower() in ('false', '0'):
+            value = False
+        else:
+            value = bool(value)
+        if not value and field.required:
+            raise ValidationError(field.error_messages['required'], code='required')
+        return value
+
+    return clean
+
+
+# 表单字段类型 -> (快速校验函数的构造函数, 可以在快速校验中处理的校验器类型)
+FAST_CLEANERS = {
+    forms.IntegerField: (int_cleaner, (MinValueValidator, MaxValueValidator)),
+    forms.CharField: (char_cleaner, (MinLengthValidator, MaxLengthValidator)),
+    forms.BooleanField: (bool_cleaner, ()),
+}
+
+
+def compile_field(field):
+    """返回字段的校验函数，不满足快速校验条件的字段使用 field.clean"""
+
+    # 子类（如 NullBooleanField、EmailField）及带有其他校验器的字段行为不同，不能走快速校验
+    cleaner = FAST_CLEANERS.get(type(field))
+    if cleaner is None or getattr(field, 'localize', False) or \
+            not all(isinstance(v, cleaner[1]) for v in field.validators):
+        return field.clean
+    return cleaner[0](field)
+
+
+def compile_schema(d):
+    """将 "参数名/表单模型" 字典编译为 (参数名, 是否必须, 校验函数, 类型名) 列表"""
+
+    return [(k, v.required, compile_field(v), type(v).__name__) for k, v in d.items()]
+
+
 def validate_args(d):
     """对被装饰的方法利用 "参数名/表单模型" 字典进行输入数据验证，验证后的数据
     作为关键字参数传入view函数中，若部分数据非法则直接返回400 Bad Request
+
+    字典在装饰时编译为校验函数列表，常用字段类型不再经过 Django 表单的完整校验流程
     """
 
+    schema = compile_schema(d)
+
     def decorator(function):
         @wraps(function)
         def inner(self, request, *args, **kwargs):
-            if request.method == 'GET':
-                data = request.GET
-            elif request.method == 'POST':
-                data = request.POST
-            else:
-                data = QueryDict(request.body)
-            for k, v in d.items():
+            data = None
+            for k, required, clean, type_name in schema:
                 if k in kwargs:
                     request_value = kwargs.get(k)
                 else:
+                    if data is None:
+                        if request.method == 'GET':
+                            data = request.GET
+                        elif request.method == 'POST':
+                            data = request.POST
+                        else:
+                            data = QueryDict(request.body)
                     request_value = data.get(k) or request.FILES.get(k)
                 if request_value is None:
                     # 缺少必须参数
-                    if v.required:
+                    if required:
                         return JsonResponse({
                             'code': error.LACK_PARAM,
                             'msg': k
@@ -43,51 +138,103 @@ def validate_args(d):
                     else:
                         continue
                 try:
-                    kwargs[k] = v.clean(request_value)
+                    kwargs[k] = clean(request_value)
                 except ValidationError:
                     # 参数值错误
                     return JsonResponse({
                         'code': error.INVALIDE_VALUE,
-                        'msg': '不合法参数 {} 值 {}，正确类型为 {}'.format(k, request_value, type(v).__name__)
+                        'msg': '不合法参数 {} 值 {}，正确类型为 {}'.format(k, request_value, type_name)
                     })
             return function(self, request, *args, **kwargs)
 
+        # 供 bench_validate_args 命令查找各视图的参数定义
+        inner.arg_schema = d
         return inner
 
     return decorator
 
 
-def fetch_object(model, object_name, key_name=None, force=True):
+def fetch_queryset(model, select_related=(), prefetch_related=(), only=()):
+    qs = model.all()
+    if select_related:
+        qs = qs.select_related(*select_related)
+    if prefetch_related:
+        qs = qs.prefetch_related(*prefetch_related)
+    if only:
+        qs = qs.only(*only)
+    return qs
+
+
+def fetch_object(model, object_name, key_name=None, force=True,
+                 select_related=(), prefetch_related=(), only=()):
     """
     根据请求中的参数，查出相应对象
     model：数据模型的 Manager
     object_name：对象名称，默认参数名为 object_name_id
     key_name：如果不是默认参数名，请使用这个参数
     force：是否强制，如果强制，出现错误时会报错，否则会忽略
+    select_related、prefetch_related、only：查询对象时附加的查询条件，
+        用于一并读取视图中马上要用到的关联对象
+
+    相邻的多个 fetch_object 合并为一个装饰器，Manager 与查询条件相同的对象用一次查询读出，
+    节省的查询数累加在 request.fetch_queries_saved 中
     """
 
+    arg = object_name + '_id' if key_name is None else key_name
+    hints = (tuple(select_related), tuple(prefetch_related), tuple(only))
+    spec = (model, object_name, arg, force, hints)
+
     def decorator(function):
+        specs = [spec]
+        target = function
+        # 只合并紧挨着的 fetch_object；其他装饰器经 wraps 复制来的属性不算
+        if getattr(function, 'fetch_wrapper', None) is function:
+            specs += function.fetch_specs
+            target = function.fetch_target
+
         @wraps(function)
         def inner(*args, **kwargs):
-            arg = object_name + '_id' if key_name is None else key_name
-            # 参数不存在，属于代码逻辑错误，直接抛异常
-            if arg not in kwargs and force:
-                raise Exception('{} not exist'.format(arg))
-
-            if arg in kwargs:
-                try:
-                    obj_id = kwargs.pop(arg)
-                    obj = model.get(id=obj_id)
-                    kwargs[object_name] = obj
-                except ObjectDoesNotExist:
+            # (Manager, 查询条件) -> 要查询的 (参数名, 对象id)
+            groups = OrderedDict()
+            requested = set()
+            for model, object_name, arg, force, hints in specs:
+                # 参数不存在，属于代码逻辑错误，直接抛异常
+                if arg not in kwargs:
                     if force:
-                        return JsonResponse({
-                            'code': error.OBJECT_NOT_FOUNT
-                        })
-            # else:
-            # else 分支 force 一定为 FALSE，即忽略错误
-            return function(*args, **kwargs)
+                        raise Exception('{} not exist'.format(arg))
+                    continue
+                requested.add(arg)
+                group = groups.setdefault((id(model), hints), (model, hints, []))
+                group[2].append((arg, kwargs.pop(arg)))
+
+            objects = {}
+            for model, hints, ids in groups.values():
+                qs = fetch_queryset(model, *hints)
+                pk = qs.model._meta.pk
+                ids = [(arg, pk.to_python(obj_id)) for arg, obj_id in ids]
+                found = qs.in_bulk([obj_id for _, obj_id in ids])
+                for arg, obj_id in ids:
+                    if obj_id in found:
+                        objects[arg] = found[obj_id]
+
+            for model, object_name, arg, force, hints in specs:
+                if arg in objects:
+                    kwargs[object_name] = objects[arg]
+                elif force and arg in requested:
+                    return JsonResponse({
+                        'code': error.OBJECT_NOT_FOUNT
+                    })
+                # else 分支 force 一定为 FALSE，即忽略错误
+
+            request = next((a for a in args[:2] if isinstance(a, HttpRequest)), None)
+            if request is not None:
+                request.fetch_queries_saved = \
+                    getattr(request, 'fetch_queries_saved', 0) + len(requested) - len(groups)
+            return target(*args, **kwargs)
 
+        inner.fetch_specs = specs
+        inner.fetch_target = target
+        inner.fetch_wrapper = inner
         return inner
 
     return decorator
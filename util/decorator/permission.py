@@ -6,8 +6,8 @@ from functools import wraps
 from django.core.urlresolvers import reverse
 from django.http import JsonResponse, HttpResponseRedirect
 
-from modellib.models import CMSFunction
 from util.code import error
+from util.permission import permission_matrix
 
 
 def cms_permission(function_name):
@@ -16,18 +16,17 @@ def cms_permission(function_name):
         def inner(self, request, *args, **kwargs):
             # 超级管理员不限权限
             user = getattr(request, 'user')
-            role = getattr(user, 'system_role')
-            if user is not None and role is not None and role.is_admin():
+            role_id = getattr(user, 'system_role_id')
+            if user is not None and role_id is not None and permission_matrix.is_admin(role_id):
                 return function(self, request, *args, **kwargs)
             # 函数未上线，认为没有权限
-            functions = CMSFunction.objects.filter(id=function_name)
-            if not functions.exists():
+            cms_function = permission_matrix.function(function_name)
+            if cms_function is None:
                 return JsonResponse({
                     'code': error.NO_PERMISSION
                 })
-            cms_function = functions.first()
             # 不需要验证，直接访问
-            if not cms_function.needVerify:
+            if not cms_function[1]:
                 return function(self, request, *args, **kwargs)
             # 没登录
             if user is None:
@@ -35,7 +34,7 @@ def cms_permission(function_name):
                     'code': error.NO_USER
                 })
             # 未分配角色，或（不是超管且未授予权限），则没有权限
-            if not role or not role.functions.filter(id=cms_function.id).exists():
+            if not role_id or not permission_matrix.has(role_id, function_name):
                 return JsonResponse({
                     'code': error.NO_PERMISSION
                 })
@@ -53,22 +52,21 @@ def admin_permission(function_name):
         def inner(self, request, *args, **kwargs):
             # 超级管理员不限权限
             user = getattr(request, 'user')
-            role = getattr(user, 'system_role')
-            if user is not None and role is not None and role.is_admin():
+            role_id = getattr(user, 'system_role_id')
+            if user is not None and role_id is not None and permission_matrix.is_admin(role_id):
                 return function(self, request, *args, **kwargs)
             # 函数未上线，认为没有权限
-            fs = CMSFunction.objects.filter(id=function_name)
-            if not fs.exists():
+            cms_function = permission_matrix.function(function_name)
+            if cms_function is None:
                 return HttpResponseRedirect('/static/permission_deny.html')
-            cms_function = fs.first()
             # 不需要验证，直接访问
-            if not cms_function.needVerify:
+            if not cms_function[1]:
                 return function(self, request, *args, **kwargs)
             # 没登录
             if user is None:
                 return HttpResponseRedirect(reverse("admin:login"))
             # 未分配角色，或（不是超管且未授予权限），则没有权限
-            if not role or not role.functions.filter(id=cms_function.id).exists():
+            if not role_id or not permission_matrix.has(role_id, function_name):
                 return HttpResponseRedirect('/static/permission_deny.html')
             # 不需要验证，或有权限，允许访问
             return function(self, request, *args, **kwargs)
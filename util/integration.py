@@ -0,0 +1,165 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+第三方接口调用
+
+所有第三方 HTTP 接口共用一个 requests.Session，每个主机保持一个长连接池；
+每个上游有独立的超时、熔断器和耗时分布，上游变慢或故障时快速失败，不会占满工作进程
+'''
+
+import bisect
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ChuangYi import settings
+
+# 耗时分布的桶上界（毫秒）
+LATENCY_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class UpstreamUnavailable(Exception):
+    """上游熔断中或请求失败（连接错误、超时）"""
+
+    def __init__(self, upstream, message):
+        super(UpstreamUnavailable, self).__init__('%s: %s' % (upstream, message))
+        self.upstream = upstream
+
+
+class CircuitBreaker(object):
+    """连续失败 threshold 次后熔断 cooldown 秒，之后放行一个试探请求，成功则恢复"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.time_opened = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.time()
+            if now - self.time_opened >= self.cooldown:
+                # 每 cooldown 秒只放行一个试探请求
+                self.state = self.HALF_OPEN
+                self.time_opened = now
+                return True
+            return False
+
+    def record(self, ok):
+        with self._lock:
+            if ok:
+                self.state = self.CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                self.state = self.OPEN
+                self.time_opened = time.time()
+
+
+class LatencyHistogram(object):
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms):
+        with self._lock:
+            self.buckets[bisect.bisect_left(LATENCY_BUCKETS, ms)] += 1
+            self.count += 1
+            self.total += ms
+
+    def stats(self):
+        labels = ['<=%d' % b for b in LATENCY_BUCKETS] + ['>%d' % LATENCY_BUCKETS[-1]]
+        return {'count': self.count,
+                'avg': self.total / self.count if self.count else 0,
+                'buckets': dict(zip(labels, self.buckets))}
+
+
+class Upstream(object):
+    def __init__(self, name, timeout):
+        self.name = name
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(settings.INTEGRATION_BREAKER_THRESHOLD,
+                                      settings.INTEGRATION_BREAKER_COOLDOWN)
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self.rejected = 0
+
+
+class IntegrationClient(object):
+    """第三方接口客户端
+
+    request 返回 requests.Response；熔断中或请求失败时抛出 UpstreamUnavailable，
+    上游返回 5xx 时计为一次失败但仍返回响应，由调用方按原有逻辑处理
+    """
+
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=settings.INTEGRATION_POOL_HOSTS,
+                              pool_maxsize=settings.INTEGRATION_POOL_SIZE)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._upstreams = {}
+        self._lock = threading.Lock()
+
+    def upstream(self, name):
+        u = self._upstreams.get(name)
+        if u is None:
+            with self._lock:
+                u = self._upstreams.get(name)
+                if u is None:
+                    timeout = settings.INTEGRATION_TIMEOUTS.get(name, (
+                        settings.INTEGRATION_CONNECT_TIMEOUT, settings.INTEGRATION_READ_TIMEOUT))
+                    u = self._upstreams[name] = Upstream(name, timeout)
+        return u
+
+    def stats(self):
+        return {name: {'state': u.breaker.state, 'errors': u.errors, 'rejected': u.rejected,
+                       'latency': u.latency.stats()}
+                for name, u in self._upstreams.items()}
+
+    def request(self, name, method, url, **kwargs):
+        u = self.upstream(name)
+        if not u.breaker.allow():
+            u.rejected += 1
+            raise UpstreamUnavailable(name, 'circuit open')
+        kwargs.setdefault('timeout', u.timeout)
+        started = time.time()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            u.errors += 1
+            u.breaker.record(False)
+            raise UpstreamUnavailable(name, e)
+        finally:
+            u.latency.observe((time.time() - started) * 1000)
+        u.breaker.record(response.status_code < 500)
+        return response
+
+    def get(self, name, url, **kwargs):
+        return self.request(name, 'GET', url, **kwargs)
+
+    def post(self, name, url, **kwargs):
+        return self.request(name, 'POST', url, **kwargs)
+
+    def put(self, name, url, **kwargs):
+        return self.request(name, 'PUT', url, **kwargs)
+
+    def delete(self, name, url, **kwargs):
+        return self.request(name, 'DELETE', url, **kwargs)
+
+
+integration = IntegrationClient()
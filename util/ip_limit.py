@@ -0,0 +1,156 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+同 IP 访问频率限制
+
+按 IP 与类型计数，计数只保存在限流后端中，不写数据库；
+只有 IP 被锁定时才写入 IPLimit，锁定名单定期从数据库同步
+'''
+
+import threading
+import time
+from collections import OrderedDict
+
+from ChuangYi import settings
+from modellib.models import ServerConfig
+from modellib.models.ip_limit import IPLimit
+
+
+class MemoryLimiterBackend(object):
+    """进程内的滑动窗口计数器
+
+    每个键保存当前窗口与上一个窗口的请求数，最多保存 maxsize 个键，超出时淘汰最久未访问的键
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._counters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, now, window):
+        """记录一次请求，返回 (当前窗口请求数, 上一个窗口请求数)"""
+
+        bucket = int(now // window)
+        with self._lock:
+            counter = self._counters.pop(key, None)
+            if counter is None or counter[0] < bucket - 1:
+                counter = [bucket, 0, 0]
+            elif counter[0] == bucket - 1:
+                counter = [bucket, 0, counter[1]]
+            counter[1] += 1
+            self._counters[key] = counter
+            while len(self._counters) > self.maxsize:
+                self._counters.popitem(last=False)
+            return counter[1], counter[2]
+
+
+class RedisLimiterBackend(object):
+    """基于 Redis 协议的滑动窗口计数器，多个进程共享同一份计数
+
+    client 只需支持 incr、expire、get 三个命令，可以是 redis.StrictRedis，
+    也可以是实现了这三个方法的本地替代品
+    """
+
+    def __init__(self, client, prefix='ip_limit'):
+        self.client = client
+        self.prefix = prefix
+
+    def hit(self, key, now, window):
+        bucket = int(now // window)
+        current_key = '%s:%s:%d' % (self.prefix, key, bucket)
+        current = self.client.incr(current_key)
+        if current == 1:
+            # 下一个窗口还要用到本窗口的计数
+            self.client.expire(current_key, int(window * 2) + 1)
+        previous = self.client.get('%s:%s:%d' % (self.prefix, key, bucket - 1))
+        return current, int(previous or 0)
+
+
+DEFAULT_CONFIG = (500, 10, 2)
+
+
+class IPLimiter(object):
+    """滑动窗口限流
+
+    窗口长度为 ip_limit_time_max 秒，窗口内允许的请求数为
+    平均速率（每 ip_limit_time 毫秒一次）下的请求数加上容忍的超速次数 ip_limit_count，
+    上一个窗口的计数按其与滑动窗口的重叠比例计入
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        # 限流判断次数，其中未访问数据库的次数
+        self.checks = 0
+        self.memory_checks = 0
+        self.time_synced = 0
+        self._config = None
+        self._locked = {}
+        self._lock = threading.Lock()
+
+    def stats(self):
+        return {'checks': self.checks, 'memory_checks': self.memory_checks,
+                'locked': len(self._locked)}
+
+    def sync(self):
+        """定期读取限流参数和锁定名单，返回本次是否访问了数据库"""
+
+        now = time.time()
+        if self._config is not None and now - self.time_synced < settings.IP_LIMIT_SYNC_INTERVAL:
+            return False
+        config = ServerConfig.objects.values_list(
+            'ip_limit_time', 'ip_limit_count', 'ip_limit_time_max').first()
+        locked = {(t, ip): code for t, ip, code in
+                  IPLimit.objects.filter(is_lock=True).values_list('type', 'ip', 'code')}
+        # 间隔或窗口不是正数时无法计算阈值，使用默认参数
+        if not config or config[0] <= 0 or config[2] <= 0:
+            config = DEFAULT_CONFIG
+        with self._lock:
+            self._config = config
+            self._locked = locked
+            self.time_synced = now
+        return True
+
+    def check(self, ip, type):
+        """返回 None 表示允许访问，否则返回验证码"""
+
+        synced = self.sync()
+        with self._lock:
+            self.checks += 1
+        code = self._locked.get((type, ip))
+        if code is not None:
+            with self._lock:
+                self.memory_checks += not synced
+            return code
+
+        interval, tolerance, window = self._config
+        now = time.time()
+        current, previous = self.backend.hit('%d:%s' % (type, ip), now, window)
+        weight = 1 - (now % window) / window
+        limit = window * 1000 / interval + tolerance
+        if current + previous * weight <= limit:
+            with self._lock:
+                self.memory_checks += not synced
+            return None
+        # 达到阈值，锁定
+        code = generate_code()
+        updated = IPLimit.objects.filter(ip=ip, type=type).update(is_lock=True, code=code)
+        if not updated:
+            IPLimit.objects.create(ip=ip, type=type, is_lock=True, code=code)
+        with self._lock:
+            self._locked[(type, ip)] = code
+        return code
+
+
+def get_backend():
+    if settings.IP_LIMIT_REDIS_URL:
+        import redis
+        return RedisLimiterBackend(redis.StrictRedis.from_url(settings.IP_LIMIT_REDIS_URL))
+    return MemoryLimiterBackend(settings.IP_LIMIT_CACHE_SIZE)
+
+
+ip_limiter = IPLimiter(get_backend())
+
+
+def generate_code():
+    return '1234'
@@ -1,8 +1,7 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import urllib.parse
-import urllib.request
+from util.integration import integration
 
 
 def send_message(mobile, tpl_value, m="GET"):
@@ -12,9 +11,8 @@ def send_message(mobile, tpl_value, m="GET"):
     data['key'] = 'c2b426f88a99c9fdf9a2a55d617e4f0d'
     data['mobile'] = mobile
     data['tpl_value'] = tpl_value
-    params = urllib.parse.urlencode(data)
     url = "http://v.juhe.cn/sms/send"
     if m == "GET":
-        urllib.request.urlopen("%s?%s" % (url, params))
+        integration.get('juhe_sms', url, params=data)
     else:
-        urllib.request.urlopen(url, params)
+        integration.post('juhe_sms', url, data=data)
@@ -0,0 +1,152 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+游标分页
+
+offset 分页在偏移量较大时需要扫描并丢弃前面的所有记录，每页还要额外执行一次 COUNT。
+游标记录上一页最后一条记录的排序键 (如 time_created, id)，下一页从该位置之后开始读取；
+总数由进程内缓存提供，在 COUNT_CACHE_TTL 秒内可能略有偏差
+'''
+
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from django import forms
+from django.db.models import Q
+
+from ChuangYi import settings
+from main.utils import abort
+
+# 列表视图接受的游标参数
+CURSOR_FIELD = forms.CharField(required=False, max_length=200)
+
+
+def encode_cursor(values):
+    """把排序键的值编码为不透明的游标字符串"""
+
+    data = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values],
+                      separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """游标字符串 -> 排序键的值（未转换类型），格式错误时抛出 ValueError"""
+
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(data.decode())
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError('invalid cursor')
+    if not isinstance(values, list):
+        raise ValueError('invalid cursor')
+    return values
+
+
+class CountCache(object):
+    """查询 -> 记录总数，按 SQL 与参数缓存，超过 maxsize 时淘汰最久未访问的条目"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, queryset):
+        queryset = queryset.order_by()
+        try:
+            sql, params = queryset.query.sql_with_params()
+            key = (queryset.db, sql, tuple(params))
+            hash(key)
+        except (TypeError, ValueError):
+            return queryset.count()
+
+        now = time.time()
+        with self._lock:
+            entry = self._counts.pop(key, None)
+            if entry is not None and now - entry[1] < settings.COUNT_CACHE_TTL:
+                self._counts[key] = entry
+                return entry[0]
+        count = queryset.count()
+        with self._lock:
+            self._counts[key] = (count, now)
+            while len(self._counts) > self.maxsize:
+                self._counts.popitem(last=False)
+        return count
+
+
+count_cache = CountCache(settings.COUNT_CACHE_SIZE)
+
+
+class Page(object):
+    """一页记录，next_cursor 为 None 表示没有下一页，count 在读取时才计算"""
+
+    def __init__(self, items, next_cursor, queryset):
+        self.items = items
+        self.next_cursor = next_cursor
+        self._queryset = queryset
+
+    def __iter__(self):
+        return iter(self.items)
+
+    @property
+    def count(self):
+        return count_cache.count(self._queryset)
+
+
+class CursorPaginator(object):
+    """按排序键分页
+
+    order 默认为 queryset 当前的排序或模型 Meta.ordering，末尾自动补上 id 保证顺序唯一；
+    排序键只能是模型自身的字段
+    """
+
+    def __init__(self, queryset, order=None):
+        order = list(order or queryset.query.order_by or queryset.model._meta.ordering)
+        names = [o.lstrip('-') for o in order]
+        if 'id' not in names and 'pk' not in names:
+            order.append('-id' if order and order[-1].startswith('-') else 'id')
+        self.order = [(o.lstrip('-'), o.startswith('-')) for o in order]
+        self.order = [('id' if n == 'pk' else n, d) for n, d in self.order]
+        self.queryset = queryset.order_by(*order)
+
+    def _after(self, values):
+        """排在 values 之后的记录的查询条件"""
+
+        meta = self.queryset.model._meta
+        values = [meta.get_field(n).to_python(v) for (n, _), v in zip(self.order, values)]
+        condition = Q()
+        for i, (name, descending) in enumerate(self.order):
+            q = Q(**{name + ('__lt' if descending else '__gt'): values[i]})
+            for (n, _), v in zip(self.order[:i], values):
+                q &= Q(**{n: v})
+            condition |= q
+        return condition
+
+    def page(self, cursor=None, offset=0, limit=10):
+        """cursor 不为空时忽略 offset，从游标位置之后读取"""
+
+        qs = self.queryset
+        if cursor:
+            try:
+                values = decode_cursor(cursor)
+                if len(values) != len(self.order):
+                    raise ValueError('invalid cursor')
+                qs = qs.filter(self._after(values))
+            except (ValueError, forms.ValidationError):
+                abort(400, 'invalid cursor')
+            offset = 0
+        items = list(qs[offset:offset + limit + 1])
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            if items:
+                next_cursor = encode_cursor([getattr(items[-1], n) for n, _ in self.order])
+        return Page(items, next_cursor, self.queryset)
+
+
+def paginate(queryset, cursor=None, offset=0, limit=10, order=None):
+    return CursorPaginator(queryset, order).page(cursor, offset, limit)
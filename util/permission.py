@@ -0,0 +1,115 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+管理端权限矩阵
+'''
+
+import threading
+import time
+
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from ChuangYi import settings
+from modellib.models import CMSRole, CMSFunction, ServerConfig
+
+
+class PermissionMatrix(object):
+    """进程内的 角色 -> 功能 权限表
+
+    每个功能分配一个二进制位，每个角色的已授权功能压缩为一个整数，
+    权限检查只需一次位运算。角色、功能或授权关系变化时递增 ServerConfig.permission_version，
+    各进程每隔 PERMISSION_VERSION_CHECK_INTERVAL 秒检查一次版本，版本变化时重新读取
+    """
+
+    def __init__(self):
+        self.version = None
+        self.time_checked = 0
+        # 功能id -> (二进制位, 是否需要验证)
+        self._functions = {}
+        # 角色id -> (已授权功能的位集合, 是否超级管理员)
+        self._roles = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self.version = None
+            self.time_checked = 0
+
+    def sync(self):
+        """检查权限版本，版本变化时重新读取"""
+
+        now = time.time()
+        if self.version is not None and \
+                now - self.time_checked < settings.PERMISSION_VERSION_CHECK_INTERVAL:
+            return
+        version = ServerConfig.objects.values_list('permission_version', flat=True).first() or 0
+        with self._lock:
+            if version != self.version:
+                self._load()
+                self.version = version
+            self.time_checked = now
+
+    def _load(self):
+        functions = {}
+        for bit, (function_id, need_verify) in enumerate(
+                CMSFunction.objects.order_by('id').values_list('id', 'needVerify')):
+            functions[function_id] = (1 << bit, need_verify)
+        masks = {}
+        through = CMSRole.functions.through
+        for role_id, function_id in through.objects.values_list('cmsrole_id', 'cmsfunction_id'):
+            # 两次查询之间功能可能被删除
+            if function_id not in functions:
+                continue
+            masks[role_id] = masks.get(role_id, 0) | functions[function_id][0]
+        roles = {}
+        for role_id, level, parent_role_id in CMSRole.objects.values_list(
+                'id', 'level', 'parent_role_id'):
+            is_admin = role_id == CMSRole.ID_ADMIN and level == 0 and parent_role_id is None
+            roles[role_id] = (masks.get(role_id, 0), is_admin)
+        self._functions = functions
+        self._roles = roles
+
+    def function(self, function_id):
+        """返回 (二进制位, 是否需要验证)，功能不存在时返回 None"""
+
+        self.sync()
+        return self._functions.get(function_id)
+
+    def is_admin(self, role_id):
+        self.sync()
+        return self._roles.get(role_id, (0, False))[1]
+
+    def has(self, role_id, function_id):
+        """角色是否被授予了该功能"""
+
+        self.sync()
+        f = self._functions.get(function_id)
+        if f is None:
+            return False
+        return bool(self._roles.get(role_id, (0, False))[0] & f[0])
+
+
+permission_matrix = PermissionMatrix()
+
+
+def bump_permission_version():
+    """角色、功能或授权关系有更新时调用，使各进程的权限表失效
+
+    通过 QuerySet.update 修改时不会触发信号，需要手动调用
+    """
+
+    ServerConfig.objects.update(permission_version=F('permission_version') + 1)
+    permission_matrix.invalidate()
+
+
+@receiver(post_save, sender=CMSRole)
+@receiver(post_delete, sender=CMSRole)
+@receiver(post_save, sender=CMSFunction)
+@receiver(post_delete, sender=CMSFunction)
+@receiver(m2m_changed, sender=CMSRole.functions.through)
+def permission_changed(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):
+        bump_permission_version()
@@ -3,7 +3,7 @@ import json
 from django import forms
 
 from main.models import User
-from main.utils.http import notify_user
+from main.utils.notification import notify_user
 from util.base.view import BaseView
 from util.decorator.auth import client_auth
 from util.decorator.param import validate_args, fetch_object